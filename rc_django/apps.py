@@ -0,0 +1,16 @@
+# Copyright 2025 UW-IT, University of Washington
+# SPDX-License-Identifier: Apache-2.0
+
+
+from django.apps import AppConfig
+
+
+class RestClientsConfig(AppConfig):
+    name = "rc_django"
+
+    def ready(self):
+        from rc_django import checks  # noqa: F401
+        from rc_django.degradation import install_degradation_hook
+        from rc_django.template_index import template_index
+        install_degradation_hook()
+        template_index.build()
@@ -0,0 +1,28 @@
+# Copyright 2025 UW-IT, University of Washington
+# SPDX-License-Identifier: Apache-2.0
+
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.checks import Warning, register
+
+
+@register()
+def check_degradation_cache(app_configs, **kwargs):
+    """
+    Degradation profiles, when enabled, are only shared between nodes
+    through a shared cache; a local-memory cache keeps them in each process.
+    """
+    alias = getattr(settings, "RESTCLIENTS_DEGRADATION_CACHE_ALIAS", None)
+    if alias is None:
+        return []
+    if isinstance(caches[alias], LocMemCache):
+        return [Warning(
+            "Degradation profiles are stored in the local-memory cache "
+            "'{}', so they only apply in the process that saved them."
+            .format(alias),
+            hint="Set RESTCLIENTS_DEGRADATION_CACHE_ALIAS to a cache "
+                 "shared by your servers, or remove it to disable profiles.",
+            id="rc_django.W001")]
+    return []
@@ -0,0 +1,79 @@
+# Copyright 2025 UW-IT, University of Washington
+# SPDX-License-Identifier: Apache-2.0
+
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from logging import getLogger
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = getLogger(__name__)
+
+
+class JSONCodec(object):
+    """
+    JSON encoding and decoding using the standard library.
+    """
+    name = "json"
+
+    def loads(self, data):
+        return json.loads(data)
+
+    def dumps(self, obj, sort_keys=False):
+        return json.dumps(obj, sort_keys=sort_keys)
+
+
+class ORJSONCodec(JSONCodec):
+    """
+    JSON decoding using orjson.  Documents orjson doesn't support, such as
+    NaN literals or integers wider than 64 bits, are handed to the
+    standard library instead.  Encoding stays with the standard library,
+    as orjson's output differs: it's compact UTF-8 rather than ASCII with
+    spaces after separators, and encodes non-finite floats as null.
+    """
+    name = "orjson"
+
+    def loads(self, data):
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            return super().loads(data)
+
+
+CODECS = {
+    JSONCodec.name: JSONCodec,
+    ORJSONCodec.name: ORJSONCodec,
+}
+
+_codec = None
+
+
+def get_codec():
+    """
+    Returns the codec named by RESTCLIENTS_JSON_CODEC.  When the setting is
+    missing, orjson is used if it is installed.
+    """
+    global _codec
+    if _codec is None:
+        name = getattr(settings, "RESTCLIENTS_JSON_CODEC", None)
+        if name is None:
+            name = ORJSONCodec.name if orjson is not None else JSONCodec.name
+        elif name == ORJSONCodec.name and orjson is None:
+            logger.warning("orjson is not installed, using json")
+            name = JSONCodec.name
+
+        if name not in CODECS:
+            raise ImproperlyConfigured(
+                "Unknown RESTCLIENTS_JSON_CODEC: {}".format(name))
+        _codec = CODECS[name]()
+    return _codec
+
+
+def clear_codec():
+    global _codec
+    _codec = None
@@ -4,30 +4,206 @@
 
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
+from django.contrib.auth.views import redirect_to_login
+from django.core.cache import caches
 from django.utils.module_loading import import_string
 from django.shortcuts import render
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from functools import wraps
+from threading import Lock
+from time import monotonic
+
+_auth_func = (None, None)
+_auth_cache = (None, None)
+
+
+class AuthDecisionCache(object):
+    """
+    In-process cache of authorization decisions, per user and service.
+    """
+    max_entries = 10000
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._lock = Lock()
+        self._decisions = {}
+
+    def get(self, user, service):
+        decision = self._decisions.get((user, service))
+        if decision is not None and decision[0] > monotonic():
+            return decision[1]
+
+    def set(self, user, service, allowed):
+        with self._lock:
+            if len(self._decisions) >= self.max_entries:
+                self._decisions = {}
+            self._decisions[(user, service)] = (
+                monotonic() + self.ttl, allowed)
+
+    def clear(self, user=None):
+        with self._lock:
+            if user is None:
+                self._decisions = {}
+            else:
+                self._decisions = {k: v for k, v in self._decisions.items()
+                                   if k[0] != user}
+
+
+class DjangoAuthDecisionCache(object):
+    """
+    Authorization decisions stored in one of Django's caches, so they are
+    shared between processes.  Keys carry a global and a per-user version,
+    so decisions can be invalidated without knowing every key.
+    """
+    prefix = "restclients_auth"
+
+    def __init__(self, ttl, alias):
+        self.ttl = ttl
+        self.cache = caches[alias]
+
+    def get(self, user, service):
+        return self.cache.get(self._key(user, service))
+
+    def set(self, user, service, allowed):
+        self.cache.set(self._key(user, service), allowed, self.ttl)
+
+    def clear(self, user=None):
+        key = self._version_key(user)
+        try:
+            self.cache.incr(key)
+        except ValueError:
+            self.cache.set(key, 1, None)
+
+    def _version_key(self, user=None):
+        if user is None:
+            return "{}:version".format(self.prefix)
+        return "{}:version:{}".format(self.prefix, user)
+
+    def _key(self, user, service):
+        versions = self.cache.get_many([
+            self._version_key(), self._version_key(user)])
+        return "{}:{}:{}:{}:{}".format(
+            self.prefix, versions.get(self._version_key(), 0),
+            versions.get(self._version_key(user), 0), user, service)
+
+
+def get_auth_func():
+    """
+    Returns the function named by RESTCLIENTS_ADMIN_AUTH_MODULE, importing
+    it only when the setting changes.
+    """
+    global _auth_func
+    path = getattr(settings, 'RESTCLIENTS_ADMIN_AUTH_MODULE', None)
+    if path is None:
+        return None
+    if _auth_func[0] != path:
+        _auth_func = (path, import_string(path))
+    return _auth_func[1]
+
+
+def get_auth_cache():
+    """
+    Returns the authorization decision cache, or None if
+    RESTCLIENTS_ADMIN_AUTH_CACHE_TTL isn't set.  Decisions are kept in
+    memory, or in the Django cache named by
+    RESTCLIENTS_ADMIN_AUTH_CACHE_ALIAS.  They're cached per user and
+    service, so only enable caching for auth functions that don't depend
+    on the url.
+    """
+    global _auth_cache
+    config = (getattr(settings, 'RESTCLIENTS_ADMIN_AUTH_CACHE_TTL', None),
+              getattr(settings, 'RESTCLIENTS_ADMIN_AUTH_CACHE_ALIAS', None))
+    if _auth_cache[0] != config:
+        ttl, alias = config
+        if not ttl:
+            cache = None
+        elif alias:
+            cache = DjangoAuthDecisionCache(ttl, alias)
+        else:
+            cache = AuthDecisionCache(ttl)
+        _auth_cache = (config, cache)
+    return _auth_cache[1]
+
+
+def clear_auth_cache(user=None):
+    """
+    Discards cached authorization decisions, for one user or for everyone.
+    Takes a user instance or primary key.
+    """
+    cache = get_auth_cache()
+    if cache is not None:
+        cache.clear(getattr(user, 'pk', user))
+
+
+def is_authorized(request, service, url, auth_func=None):
+    """
+    Whether the user may proxy the service, using any cached decision.
+    Cached decisions apply to every url of the service.
+    """
+    if auth_func is None:
+        auth_func = get_auth_func()
+
+    cache = get_auth_cache()
+    allowed = None
+    if cache is not None:
+        allowed = cache.get(request.user.pk, service)
+    if allowed is None:
+        allowed = bool(auth_func(request, service, url))
+        if cache is not None:
+            cache.set(request.user.pk, service, allowed)
+    return allowed
+
+
+def get_denied_response(request, service, url):
+    """
+    Returns the response refusing a request to proxy the service, or None
+    if the user may proxy it.
+    """
+    template = 'access_denied.html'
+    auth_func = get_auth_func()
+    if auth_func is None:
+        context = {'error_msg': (
+            "Your application must define an authorization function as "
+            "RESTCLIENTS_ADMIN_AUTH_MODULE in settings.py.")}
+        return render(request, template, context=context, status=401)
+
+    if is_authorized(request, service, url, auth_func):
+        return None
+
+    return render(request, template, status=401)
 
 
 def restclient_admin_required(view_func):
     """
     View decorator that checks whether the user is permitted to view proxy
     restclients. Calls login_required in case the user is not authenticated.
+    Async views are checked in a worker thread, as the checks may use the
+    database.
     """
-    def wrapper(request, *args, **kwargs):
-        template = 'access_denied.html'
-        if hasattr(settings, 'RESTCLIENTS_ADMIN_AUTH_MODULE'):
-            auth_func = import_string(settings.RESTCLIENTS_ADMIN_AUTH_MODULE)
-        else:
-            context = {'error_msg': (
-                "Your application must define an authorization function as "
-                "RESTCLIENTS_ADMIN_AUTH_MODULE in settings.py.")}
-            return render(request, template, context=context, status=401)
+    if iscoroutinefunction(view_func):
+        def check(request, service, url):
+            if not request.user.is_authenticated:
+                return redirect_to_login(request.get_full_path())
+            return get_denied_response(request, service, url)
+
+        async def async_wrapper(request, *args, **kwargs):
+            service = args[0] if len(args) > 0 else None
+            url = args[1] if len(args) > 1 else None
 
+            denied = await sync_to_async(check)(request, service, url)
+            if denied is not None:
+                return denied
+            return await view_func(request, *args, **kwargs)
+
+        return wraps(view_func)(async_wrapper)
+
+    def wrapper(request, *args, **kwargs):
         service = args[0] if len(args) > 0 else None
         url = args[1] if len(args) > 1 else None
-        if auth_func(request, service, url):
-            return view_func(request, *args, **kwargs)
 
-        return render(request, template, status=401)
+        denied = get_denied_response(request, service, url)
+        if denied is not None:
+            return denied
+        return view_func(request, *args, **kwargs)
 
     return login_required(function=wrapper)
@@ -0,0 +1,140 @@
+# Copyright 2025 UW-IT, University of Washington
+# SPDX-License-Identifier: Apache-2.0
+
+
+from django.core.exceptions import ImproperlyConfigured
+from restclients_core.dao import DAO
+from restclients_core.thread import Thread
+from restclients_core.util.performance import PerformanceDegradation
+from contextvars import ContextVar
+from inspect import signature
+from threading import current_thread
+
+# The restclients_core internals install_degradation_hook replaces, with
+# the parameters the replacements expect, or None to accept any
+PATCHED = (
+    (PerformanceDegradation, "get_problems", ()),
+    (PerformanceDegradation, "set_problems", ("problems",)),
+    (PerformanceDegradation, "clear_problems", ()),
+    (PerformanceDegradation, "get_response", ("service", "url")),
+    (DAO, "_load_resource", ("self", "method", "url", "headers", "body")),
+    (Thread, "__init__", None),
+)
+
+_originals = {(owner, name): getattr(owner, name, None)
+              for owner, name, params in PATCHED}
+_default_get_response = _originals[(PerformanceDegradation, "get_response")]
+_default_load_resource = _originals[(DAO, "_load_resource")]
+_default_thread_init = _originals[(Thread, "__init__")]
+
+_UNSET = object()
+
+# The problem set for the current request.  Each thread and asyncio task
+# sees its own value, unlike restclients_core's per-thread dict.
+_problems = ContextVar("restclients_problems", default=_UNSET)
+
+
+def get_problems(cls):
+    problems = _problems.get()
+    if problems is _UNSET:
+        # New threads start with an empty context.  restclients_core's
+        # threads use the problems of the context that created them.
+        return getattr(current_thread(), "restclients_problems", None)
+    return problems
+
+
+def set_problems(cls, problems):
+    _problems.set(problems)
+
+
+def clear_problems(cls):
+    _problems.set(None)
+
+
+def push_problems(problems):
+    """
+    Sets the problem set for the current context, returning a token for
+    pop_problems to restore the previous one.
+    """
+    return _problems.set(problems)
+
+
+def pop_problems(token):
+    _problems.reset(token)
+
+
+def thread_init(thread, *args, **kwargs):
+    """
+    Replacement for restclients_core's Thread.__init__ that records the
+    creating context's problem set, as its per-thread dict's parent
+    lookup did.
+    """
+    _default_thread_init(thread, *args, **kwargs)
+    thread.restclients_problems = get_problems(None)
+
+
+def get_response(cls, service, url):
+    """
+    Replacement for PerformanceDegradation.get_response that passes the
+    request URL to problem sets that accept it, so degradations can be
+    scoped to individual resources.
+    """
+    problems = cls.get_problems()
+    if not problems:
+        return None
+
+    if hasattr(problems, "get_response"):
+        return problems.get_response(service, url)
+    return _default_get_response(service, url)
+
+
+def load_resource(dao, method, url, headers, body):
+    """
+    Replacement for DAO._load_resource that lets problem sets limit
+    concurrent connections, and degrade responses after they are loaded.
+    """
+    problems = PerformanceDegradation.get_problems()
+    if not hasattr(problems, "degrade_response"):
+        return _default_load_resource(dao, method, url, headers, body)
+
+    service = dao.service_name()
+    timeout = float(dao.get_service_setting(
+        "CONNECT_TIMEOUT", dao.get_setting("DEFAULT_CONNECT_TIMEOUT", 3)))
+    with problems.connection(service, url, timeout):
+        response = _default_load_resource(dao, method, url, headers, body)
+    return problems.degrade_response(service, url, response)
+
+
+def check_restclients_core():
+    """
+    Raises ImproperlyConfigured if any of the internals to be replaced are
+    missing, or take different parameters, in the installed restclients_core.
+    """
+    for owner, name, params in PATCHED:
+        original = _originals[(owner, name)]
+        if not callable(original):
+            raise ImproperlyConfigured(
+                "Unsupported restclients_core: {}.{} is missing".format(
+                    owner.__name__, name))
+        if params is not None and tuple(
+                signature(original).parameters) != params:
+            raise ImproperlyConfigured(
+                "Unsupported restclients_core: {}.{}{} should take {}".format(
+                    owner.__name__, name, signature(original),
+                    ", ".join(params) or "no arguments"))
+
+
+def install_degradation_hook():
+    """
+    Routes restclients_core's degradation hooks through get_response and
+    load_resource, and keeps its problem sets in a context variable,
+    inherited by restclients_core's threads.  Nothing is replaced if the
+    installed restclients_core doesn't match.
+    """
+    check_restclients_core()
+    PerformanceDegradation.get_problems = classmethod(get_problems)
+    PerformanceDegradation.set_problems = classmethod(set_problems)
+    PerformanceDegradation.clear_problems = classmethod(clear_problems)
+    PerformanceDegradation.get_response = classmethod(get_response)
+    DAO._load_resource = load_resource
+    Thread.__init__ = thread_init
@@ -0,0 +1,25 @@
+# Copyright 2025 UW-IT, University of Washington
+# SPDX-License-Identifier: Apache-2.0
+
+
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+_executors = {}
+_lock = Lock()
+
+
+def get_executor(name, workers):
+    """
+    Returns the named thread pool, shared by all requests.  The pool is
+    replaced if its size changes.
+    """
+    with _lock:
+        current = _executors.get(name)
+        if current is None or current[0] != workers:
+            if current is not None:
+                current[1].shutdown(wait=False)
+            _executors[name] = (workers, ThreadPoolExecutor(
+                max_workers=workers,
+                thread_name_prefix="restclients-{}".format(name)))
+        return _executors[name][1]
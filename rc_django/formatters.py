@@ -0,0 +1,350 @@
+# Copyright 2025 UW-IT, University of Washington
+# SPDX-License-Identifier: Apache-2.0
+
+
+from json.encoder import encode_basestring_ascii
+from html import escape
+import re
+
+INDENT = "&nbsp;" * 4
+NEWLINE = "<br/>\n"
+LINK_RE = re.compile(r"\"/(.*?)\"")
+
+HTML_TOKEN_RE = re.compile(r"(?i:href\s*=\s*[\"']/|<style)|<div")
+HREF_RE = re.compile(r"(?i:href)\s*=\s*[\"']/([^\"'\n]*)[\"']")
+STYLE_CLOSE_RE = re.compile(r"/style>", re.I)
+
+
+def join_chunks(fragments, chunk_parts=4096):
+    """
+    Regroups an iterable of small strings into strings joined from about
+    chunk_parts fragments each.
+    """
+    out = []
+    for fragment in fragments:
+        out.append(fragment)
+        if len(out) >= chunk_parts:
+            yield "".join(out)
+            out.clear()
+    if out:
+        yield "".join(out)
+
+
+class JSONFormatter(object):
+    """
+    Renders a parsed JSON document as browsable HTML in a single walk.
+
+    The output is identical to pretty-printing the document with
+    json.dumps(sort_keys=True, indent=4), HTML-escaping the result, and
+    turning quoted "/..." strings into links under link_prefix.
+    """
+    # Rendered strings are memoized per document, since keys repeat heavily
+    max_cached_strings = 10000
+
+    def __init__(self, link_prefix):
+        self.link_prefix = link_prefix
+        self._strings = {}
+
+    def render(self, document):
+        return "".join(self.iterrender(document, chunk_parts=None))
+
+    def iterrender(self, document, chunk_parts=4096):
+        """
+        Yields the rendered document as a series of strings, each joined
+        from about chunk_parts fragments.  The walk is iterative, so deeply
+        nested documents don't exhaust the stack.
+        """
+        self._strings = {}
+        string = self._string
+        scalar = self._scalar
+        out = []
+        write = out.append
+        stack = []
+
+        self._open(document, 0, "", write, stack)
+        while stack:
+            frame = stack[-1]
+            items, is_dict, level, prefix, separator = frame
+            for item in items:
+                if is_dict:
+                    key, item = item
+                    head = prefix + string(key) + ":&nbsp;"
+                else:
+                    head = prefix
+                prefix = separator
+
+                kind = type(item)
+                if kind is str:
+                    write(head + string(item))
+                elif (kind is dict or kind is list or
+                        isinstance(item, (dict, list))):
+                    frame[3] = prefix
+                    if self._open(item, level + 1, head, write, stack):
+                        break
+                else:
+                    write(head + scalar(item))
+                if chunk_parts and len(out) >= chunk_parts:
+                    # Yield within wide containers, resuming from here
+                    frame[3] = prefix
+                    break
+            else:
+                stack.pop()
+                write(NEWLINE + INDENT * level + ("}" if is_dict else "]"))
+
+            if chunk_parts and len(out) >= chunk_parts:
+                yield "".join(out)
+                out.clear()
+
+        if out:
+            yield "".join(out)
+
+    def _open(self, value, level, head, write, stack):
+        """
+        Writes the opening of value.  Non-empty containers are pushed onto
+        the stack, and True is returned so the caller descends into them.
+        """
+        if isinstance(value, dict):
+            if value:
+                write(head + "{")
+                inner = NEWLINE + INDENT * (level + 1)
+                stack.append([iter(sorted(value.items())), True, level,
+                              inner, "," + inner])
+                return True
+            write(head + "{}")
+        elif isinstance(value, list):
+            if value:
+                write(head + "[")
+                inner = NEWLINE + INDENT * (level + 1)
+                stack.append([iter(value), False, level, inner, "," + inner])
+                return True
+            write(head + "[]")
+        else:
+            write(head + self._scalar(value))
+        return False
+
+    def _scalar(self, value):
+        if isinstance(value, str):
+            return self._string(value)
+        if value is None:
+            return "null"
+        if value is True:
+            return "true"
+        if value is False:
+            return "false"
+        if isinstance(value, int):
+            return int.__repr__(value)
+        if isinstance(value, float):
+            return self._float(value)
+        raise TypeError("Object of type {} is not JSON serializable".format(
+            value.__class__.__name__))
+
+    @staticmethod
+    def _float(value):
+        if value != value:
+            return "NaN"
+        if value == float("inf"):
+            return "Infinity"
+        if value == -float("inf"):
+            return "-Infinity"
+        return float.__repr__(value)
+
+    def _string(self, value):
+        try:
+            return self._strings[value]
+        except KeyError:
+            pass
+
+        # str.replace returns the same string when there is nothing to do
+        encoded = encode_basestring_ascii(value).replace(
+            "&", "&amp;").replace("<", "&lt;").replace(
+            ">", "&gt;").replace(" ", "&nbsp;")
+        if '"/' in encoded:
+            encoded = LINK_RE.sub(self._link, encoded)
+
+        if len(self._strings) < self.max_cached_strings:
+            self._strings[value] = encoded
+        return encoded
+
+    def _link(self, match):
+        path = match.group(1)
+        return '"<a href="{}/{}">/{}</a>"'.format(
+            self.link_prefix, path, path)
+
+
+class HTMLFormatter(object):
+    """
+    Rewrites a proxied HTML page for display in one left-to-right pass:
+    root-relative hrefs are pointed at link_prefix, <style> blocks are
+    dropped, and self-closing divs are expanded.  Each input character is
+    examined a bounded number of times, so malformed pages (unclosed style
+    tags, runaway attributes) can't trigger regex backtracking.
+    """
+    def __init__(self, link_prefix):
+        self.link_prefix = link_prefix
+
+    def render(self, content):
+        out = []
+        cursor = 0
+        style_closed = True
+        next_gt = 0
+
+        for match in HTML_TOKEN_RE.finditer(content):
+            start = match.start()
+            if start < cursor:
+                continue
+
+            token = match.group(0)
+            if token == "<div":
+                if next_gt is not None and next_gt <= start:
+                    next_gt = content.find(">", start)
+                    if next_gt == -1:
+                        next_gt = None
+                if (next_gt is None or next_gt - 1 < start + 4 or
+                        content[next_gt - 1] != "/"):
+                    continue
+                tag = HREF_RE.sub(self._href, content[start:next_gt + 1])
+                end = next_gt + 1
+                replacement = "<!-- {} -->{}></div>".format(tag, tag[:-2])
+            elif token[0] == "<":
+                if not style_closed:
+                    continue
+                close = STYLE_CLOSE_RE.search(content, start + 6)
+                if close is None:
+                    # No later style block can be closed either
+                    style_closed = False
+                    continue
+                end = close.end()
+                replacement = ""
+            else:
+                href = HREF_RE.match(content, start)
+                if href is None:
+                    continue
+                end = href.end()
+                replacement = self._href(href)
+
+            out.append(content[cursor:start])
+            out.append(replacement)
+            cursor = end
+
+        out.append(content[cursor:])
+        return "".join(out)
+
+    def _href(self, match):
+        return 'href="{}/{}"'.format(self.link_prefix, match.group(1))
+
+
+def resolve_pointer(document, pointer):
+    """
+    Returns the value at a JSON pointer (RFC 6901) in document.  Raises
+    KeyError if there is no such value.
+    """
+    if pointer == "":
+        return document
+    if not pointer.startswith("/"):
+        raise KeyError(pointer)
+
+    value = document
+    for token in pointer[1:].split("/"):
+        token = token.replace("~1", "/").replace("~0", "~")
+        if isinstance(value, dict):
+            value = value[token]
+        elif isinstance(value, list) and (
+                token.isdigit() and (token == "0" or token[0] != "0")):
+            try:
+                value = value[int(token)]
+            except IndexError:
+                raise KeyError(pointer)
+        else:
+            raise KeyError(pointer)
+    return value
+
+
+def escape_pointer_token(token):
+    return str(token).replace("~", "~0").replace("/", "~1")
+
+
+class JSONTreeFormatter(JSONFormatter):
+    """
+    Renders the top levels of a parsed JSON document as a collapsible HTML
+    tree.  Containers below depth, and children beyond max_children of
+    any container, are left as placeholders holding the JSON pointer to
+    load them from, so the output size doesn't depend on the document's.
+    The sorted keys of paged objects are kept in sorted_keys, by pointer,
+    which can be shared by renders of the same document.
+    """
+    def __init__(self, link_prefix, depth=2, max_children=100,
+                 sorted_keys=None):
+        super().__init__(link_prefix)
+        self.depth = depth
+        self.max_children = max_children
+        self.sorted_keys = {} if sorted_keys is None else sorted_keys
+
+    def render(self, document, pointer=""):
+        self._strings = {}
+        return ('<ul class="restclients-tree">' +
+                self._node(None, document, pointer, 0) + "</ul>")
+
+    def render_children(self, container, pointer, start=0):
+        """
+        Renders list items for a container's children, from start.
+        """
+        self._strings = {}
+        return self._children(container, pointer, 1, start)
+
+    def _node(self, key, value, pointer, level):
+        head = "" if key is None else self._string(str(key)) + ":&nbsp;"
+        if not isinstance(value, (dict, list)) or not value:
+            if isinstance(value, dict):
+                return "<li>" + head + "{}</li>"
+            if isinstance(value, list):
+                return "<li>" + head + "[]</li>"
+            return "<li>" + head + self._scalar(value) + "</li>"
+
+        summary = "<summary>{}{}</summary>".format(head, self._summary(value))
+        if level >= self.depth:
+            return ('<li><details class="restclients-lazy" '
+                    'data-pointer="{}">{}</details></li>').format(
+                        escape(pointer), summary)
+        return "<li><details open>{}<ul>{}</ul></details></li>".format(
+            summary, self._children(value, pointer, level + 1, 0))
+
+    def _children(self, container, pointer, level, start):
+        end = start + self.max_children
+        if isinstance(container, dict):
+            keys = self._sorted_keys(container, pointer)[start:end]
+            items = ((key, container[key]) for key in keys)
+        else:
+            # Slicing copies only the page, not the whole list
+            items = enumerate(container[start:end], start)
+
+        out = []
+        for key, value in items:
+            out.append(self._node(
+                key if isinstance(container, dict) else None, value,
+                pointer + "/" + escape_pointer_token(key), level))
+        if len(container) > end:
+            out.append(
+                '<li><a href="#" class="restclients-more" data-pointer="{}" '
+                'data-start="{}">{} more</a></li>'.format(
+                    escape(pointer), end, len(container) - end))
+        return "".join(out)
+
+    def _sorted_keys(self, container, pointer):
+        """
+        Returns an object's keys in order.  Objects with more than one page
+        of children keep them, so later pages don't sort them again.
+        """
+        keys = self.sorted_keys.get(pointer)
+        if keys is None:
+            keys = sorted(container)
+            if len(keys) > self.max_children:
+                self.sorted_keys[pointer] = keys
+        return keys
+
+    @staticmethod
+    def _summary(value):
+        if isinstance(value, dict):
+            return "{{&hellip;}} {} key{}".format(
+                len(value), "" if len(value) == 1 else "s")
+        return "[&hellip;] {} item{}".format(
+            len(value), "" if len(value) == 1 else "s")
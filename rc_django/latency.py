@@ -0,0 +1,192 @@
+# Copyright 2025 UW-IT, University of Washington
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+Latency distributions for simulated slow services.
+
+Distributions are written as a name followed by its parameters, in
+seconds, e.g.
+
+    2.5                         fixed delay
+    uniform 0.1 2               between min and max
+    normal 1 0.2                mean and standard deviation
+    lognormal 0.5 0.8           median, and sigma of the log
+    percentiles 50:0.1 95:0.8 99:2.5
+
+Samples are never negative.
+"""
+
+from bisect import bisect_right
+import math
+
+
+class LatencyDistribution(object):
+    name = None
+    params = ()
+
+    def __init__(self, *values):
+        if len(values) != len(self.params):
+            raise ValueError("{} takes {} parameter(s): {}".format(
+                self.name, len(self.params), " ".join(self.params)))
+        self.values = tuple(self._number(v) for v in values)
+        self.validate()
+
+    def validate(self):
+        if any(v < 0 for v in self.values):
+            raise ValueError("{} parameters can't be negative".format(
+                self.name))
+
+    def sample(self, rng):
+        raise NotImplementedError()
+
+    def __str__(self):
+        return " ".join([self.name] + [_format(v) for v in self.values])
+
+    @staticmethod
+    def _number(value):
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            raise ValueError("Not a number: {}".format(value))
+        if math.isnan(value) or math.isinf(value):
+            raise ValueError("Not a finite number: {}".format(value))
+        return value
+
+
+class Fixed(LatencyDistribution):
+    name = "fixed"
+    params = ("seconds",)
+
+    def sample(self, rng):
+        return self.values[0]
+
+    def __str__(self):
+        return _format(self.values[0])
+
+
+class Uniform(LatencyDistribution):
+    name = "uniform"
+    params = ("min", "max")
+
+    def validate(self):
+        super().validate()
+        if self.values[0] > self.values[1]:
+            raise ValueError("uniform min can't be larger than max")
+
+    def sample(self, rng):
+        return rng.uniform(*self.values)
+
+
+class Normal(LatencyDistribution):
+    name = "normal"
+    params = ("mean", "stddev")
+
+    def sample(self, rng):
+        return max(0.0, rng.gauss(*self.values))
+
+
+class LogNormal(LatencyDistribution):
+    name = "lognormal"
+    params = ("median", "sigma")
+
+    def validate(self):
+        super().validate()
+        if self.values[0] == 0:
+            raise ValueError("lognormal median must be positive")
+
+    def sample(self, rng):
+        median, sigma = self.values
+        return rng.lognormvariate(math.log(median), sigma)
+
+
+class Percentiles(LatencyDistribution):
+    """
+    Samples from a latency table, such as one measured from production,
+    interpolating linearly between percentiles.  Samples below the lowest
+    percentile use its value, as do those above the highest.
+    """
+    name = "percentiles"
+
+    def __init__(self, *points):
+        if not points:
+            raise ValueError("percentiles needs at least one pct:seconds")
+
+        table = {}
+        for point in points:
+            try:
+                pct, seconds = point.split(":")
+            except (AttributeError, ValueError):
+                raise ValueError("Not a pct:seconds pair: {}".format(point))
+            pct = self._number(pct)
+            if not 0 <= pct <= 100:
+                raise ValueError("Not a percentile: {}".format(point))
+            table[pct] = self._number(seconds)
+
+        self.pcts = sorted(table)
+        self.values = tuple(table[p] for p in self.pcts)
+        self.validate()
+        if list(self.values) != sorted(self.values):
+            raise ValueError("percentile latencies must not decrease")
+
+    def sample(self, rng):
+        pct = rng.random() * 100
+        index = bisect_right(self.pcts, pct)
+        if index == 0:
+            return self.values[0]
+        if index == len(self.pcts):
+            return self.values[-1]
+
+        low, high = self.pcts[index - 1], self.pcts[index]
+        fraction = (pct - low) / (high - low)
+        return self.values[index - 1] + fraction * (
+            self.values[index] - self.values[index - 1])
+
+    def __str__(self):
+        return " ".join([self.name] + ["{}:{}".format(
+            _format(p), _format(v)) for p, v in zip(self.pcts, self.values)])
+
+
+DISTRIBUTIONS = {d.name: d for d in (
+    Fixed, Uniform, Normal, LogNormal, Percentiles)}
+
+
+def parse_latency(value):
+    """
+    Returns the distribution described by value, or None if value is
+    empty.  Plain numbers are fixed delays.  Raises ValueError if value
+    isn't a valid description.
+    """
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return Fixed(value)
+
+    parts = str(value).split()
+    if not parts:
+        return None
+    if len(parts) == 1 and parts[0] not in DISTRIBUTIONS:
+        return Fixed(parts[0])
+
+    try:
+        distribution = DISTRIBUTIONS[parts[0]]
+    except KeyError:
+        raise ValueError("Unknown latency distribution: {}".format(parts[0]))
+    return distribution(*parts[1:])
+
+
+def parse_probability(value):
+    """
+    Returns value as a probability between 0 and 1, or None if value is
+    empty.  Raises ValueError otherwise.
+    """
+    if value is None or str(value).strip() == "":
+        return None
+    probability = LatencyDistribution._number(value)
+    if not 0 <= probability <= 1:
+        raise ValueError("Not a probability between 0 and 1: {}".format(
+            value))
+    return probability
+
+
+def _format(number):
+    return str(int(number)) if number.is_integer() else repr(number)
@@ -0,0 +1,256 @@
+# Copyright 2025 UW-IT, University of Washington
+# SPDX-License-Identifier: Apache-2.0
+
+
+from django.conf import settings
+from collections import Counter, deque
+from threading import Lock
+import math
+import re
+
+_metrics = (None, None)
+
+# Path segments holding ids, dates or terms, rather than resource names
+ID_SEGMENT_RE = re.compile(r"^(?!v\d+$)[^/]*\d[^/]*$")
+
+# Resources whose ids, such as UW NetIDs, may not hold a digit
+DEFAULT_ID_COLLECTIONS = ("person", "entity")
+
+OTHER_ENDPOINT = "{other}"
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def endpoint_template(url, collections=()):
+    """
+    Groups URLs by their path, with id-like segments replaced by {id}.
+    File extensions are kept, e.g. /student/v5/person/{id}.json.  Segments
+    holding a digit are ids, as are segments following one named in
+    collections, e.g. javerage in /identity/v2/person/javerage/full.json.
+    """
+    path = url.split("?", 1)[0]
+    segments = []
+    previous = None
+    for segment in path.split("/"):
+        name, dot, extension = segment.rpartition(".")
+        if not dot or not extension.isalpha():
+            name, dot, extension = segment, "", ""
+        if previous in collections or ID_SEGMENT_RE.match(name):
+            segments.append("{id}" + dot + extension)
+        else:
+            segments.append(segment)
+        previous = name
+    return "/".join(segments)
+
+
+def percentile(ordered, fraction):
+    """
+    The nearest-rank percentile of a sorted list, or None if it's empty.
+    """
+    if not ordered:
+        return None
+    rank = math.ceil(fraction * len(ordered))
+    return ordered[min(max(rank, 1), len(ordered)) - 1]
+
+
+class Series(object):
+    """
+    Counts of every response for an endpoint, and a ring buffer of recent
+    durations and sizes for its percentiles.
+    """
+    def __init__(self, samples):
+        self._lock = Lock()
+        self.recent = deque(maxlen=samples)
+        self.count = 0
+        self.duration = 0.0
+        self.size = 0
+        self.statuses = Counter()
+
+    def record(self, duration, status, size):
+        with self._lock:
+            self.recent.append((duration, size))
+            self.count += 1
+            self.duration += duration
+            self.size += size
+            self.statuses[status] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return (list(self.recent), self.count, self.duration, self.size,
+                    dict(self.statuses))
+
+
+class ProxyMetrics(object):
+    """
+    In-process metrics for proxied requests, by service and endpoint
+    template.  Each endpoint keeps its most recent samples durations for
+    percentiles; a service's endpoints beyond max_endpoints are counted
+    together as {other}.  collections are passed to endpoint_template.
+    """
+    def __init__(self, samples, max_endpoints, collections=()):
+        self.samples = samples
+        self.max_endpoints = max_endpoints
+        self.collections = frozenset(collections)
+        self._lock = Lock()
+        self._series = {}
+        self._endpoints = Counter()
+        # Services with max_endpoints, mapped to their {other} series
+        self._overflow = {}
+
+    def record(self, service, url, duration, status, size):
+        endpoint = endpoint_template(url, self.collections)
+        series = self._series.get((service, endpoint))
+        if series is None:
+            series = self._overflow.get(service)
+        if series is None:
+            series = self._add_series(service, endpoint)
+        series.record(duration, status, size)
+
+    def _add_series(self, service, endpoint):
+        with self._lock:
+            series = self._series.get((service, endpoint))
+            if series is not None:
+                return series
+            if self._endpoints[service] < self.max_endpoints:
+                self._endpoints[service] += 1
+                series = self._series[(service, endpoint)] = Series(
+                    self.samples)
+                return series
+            series = self._series.setdefault(
+                (service, OTHER_ENDPOINT), Series(self.samples))
+            self._overflow[service] = series
+            return series
+
+    def clear(self):
+        with self._lock:
+            self._series = {}
+            self._endpoints = Counter()
+            self._overflow = {}
+
+    def get_stats(self):
+        """
+        Returns a list of services, each with its totals, percentiles and
+        endpoints, which have the same statistics.
+        """
+        with self._lock:
+            series = sorted(self._series.items())
+
+        services = {}
+        for (service, endpoint), data in series:
+            stats = self._stats(*data.snapshot())
+            stats["endpoint"] = endpoint
+            services.setdefault(service, []).append(stats)
+
+        results = []
+        for service, endpoints in sorted(services.items()):
+            recent = []
+            statuses = Counter()
+            for stats in endpoints:
+                recent.extend(stats.pop("recent"))
+                statuses.update(dict(stats["statuses"]))
+            stats = self._stats(
+                recent, sum(s["count"] for s in endpoints),
+                sum(s["duration"] for s in endpoints),
+                sum(s["size"] for s in endpoints), statuses)
+            del stats["recent"]
+            stats.update({"service": service, "endpoints": endpoints})
+            results.append(stats)
+        return results
+
+    @staticmethod
+    def _stats(recent, count, duration, size, statuses):
+        durations = sorted(sample[0] for sample in recent)
+        sizes = sorted(sample[1] for sample in recent)
+        return {
+            "recent": recent,
+            "count": count,
+            "duration": duration,
+            "size": size,
+            "statuses": sorted(statuses.items(), key=lambda s: str(s[0])),
+            "quantiles": [(q, percentile(durations, q)) for q in QUANTILES],
+            "p50": percentile(durations, 0.5),
+            "p95": percentile(durations, 0.95),
+            "p99": percentile(durations, 0.99),
+            "median_size": percentile(sizes, 0.5),
+        }
+
+    def prometheus(self):
+        """
+        The metrics in the Prometheus text exposition format.
+        """
+        lines = [
+            "# HELP restclients_request_duration_seconds Time taken by "
+            "proxied requests, over each endpoint's recent requests.",
+            "# TYPE restclients_request_duration_seconds summary",
+        ]
+        stats = self.get_stats()
+        for service in stats:
+            for endpoint in service["endpoints"]:
+                labels = _labels(service=service["service"],
+                                 endpoint=endpoint["endpoint"])
+                for quantile, value in endpoint["quantiles"]:
+                    if value is not None:
+                        lines.append(
+                            "restclients_request_duration_seconds{{{},"
+                            "quantile=\"{}\"}} {!r}".format(
+                                labels, quantile, value))
+                lines.append("restclients_request_duration_seconds_sum"
+                             "{{{}}} {!r}".format(labels,
+                                                  endpoint["duration"]))
+                lines.append("restclients_request_duration_seconds_count"
+                             "{{{}}} {}".format(labels, endpoint["count"]))
+
+        lines.extend([
+            "# HELP restclients_responses_total Proxied responses, by "
+            "status.  Status 0 is a connection failure.",
+            "# TYPE restclients_responses_total counter",
+        ])
+        for service in stats:
+            for endpoint in service["endpoints"]:
+                for status, count in endpoint["statuses"]:
+                    lines.append("restclients_responses_total{{{}}} {}".format(
+                        _labels(service=service["service"],
+                                endpoint=endpoint["endpoint"],
+                                status=status), count))
+
+        lines.extend([
+            "# HELP restclients_response_bytes_total Size of proxied "
+            "response bodies.",
+            "# TYPE restclients_response_bytes_total counter",
+        ])
+        for service in stats:
+            for endpoint in service["endpoints"]:
+                lines.append("restclients_response_bytes_total"
+                             "{{{}}} {}".format(_labels(
+                                 service=service["service"],
+                                 endpoint=endpoint["endpoint"]),
+                                 endpoint["size"]))
+        return "\n".join(lines) + "\n"
+
+
+def _labels(**labels):
+    return ",".join('{}="{}"'.format(key, str(value).replace(
+        "\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for key, value in sorted(labels.items()))
+
+
+def get_metrics():
+    """
+    Returns the proxy metrics, or None if RESTCLIENTS_PROXY_METRICS_SAMPLES
+    is 0.  Each endpoint keeps that many recent samples, and each service
+    has at most RESTCLIENTS_PROXY_METRICS_MAX_ENDPOINTS endpoints.  Path
+    segments following one of RESTCLIENTS_PROXY_METRICS_ID_COLLECTIONS
+    are grouped as ids.
+    """
+    global _metrics
+    config = (getattr(settings, "RESTCLIENTS_PROXY_METRICS_SAMPLES", 1000),
+              getattr(settings, "RESTCLIENTS_PROXY_METRICS_MAX_ENDPOINTS",
+                      100),
+              tuple(getattr(settings,
+                            "RESTCLIENTS_PROXY_METRICS_ID_COLLECTIONS",
+                            DEFAULT_ID_COLLECTIONS)))
+    if _metrics[0] != config:
+        samples, max_endpoints, collections = config
+        metrics = ProxyMetrics(
+            samples, max_endpoints, collections) if samples else None
+        _metrics = (config, metrics)
+    return _metrics[1]
@@ -2,26 +2,153 @@
 # SPDX-License-Identifier: Apache-2.0
 
 
-from django.utils.deprecation import MiddlewareMixin
+from asgiref.sync import (
+    iscoroutinefunction, markcoroutinefunction, sync_to_async)
 from restclients_core.util.performance import PerformanceDegradation
+from rc_django.degradation import push_problems, pop_problems
 from rc_django.models import DegradePerformance
+from rc_django.profiles import get_profiles
+from functools import lru_cache
 
+# Signed cookie marking browsers whose session may hold degradations
+DEGRADATION_COOKIE = "restclients_errors"
+DEGRADATION_COOKIE_SALT = "rc_django.degradation"
 
-class EnableServiceDegradationMiddleware(MiddlewareMixin):
+
+@lru_cache(maxsize=64)
+def load_problems(*problem_strs):
+    """
+    Parses and combines serialized problem sets, reusing the result for
+    identical strings.  Later sets replace services degraded by earlier
+    ones.  The returned object is shared, and must not be modified.
+    """
+    problems = DegradePerformance(problem_strs[0])
+    for problem_str in problem_strs[1:]:
+        problems.update(DegradePerformance(problem_str))
+    return problems
+
+
+def may_have_problems(request):
+    """
+    Whether the session needs to be checked for degradations.  Sessions
+    are only loaded for browsers carrying the marker cookie, unless
+    something else already loaded them.
+    """
+    session = getattr(request, "session", None)
+    if session is None:
+        return False
+    if getattr(session, "accessed", False):
+        return True
+    return request.get_signed_cookie(
+        DEGRADATION_COOKIE, default=None,
+        salt=DEGRADATION_COOKIE_SALT) is not None
+
+
+def get_session_problems(request):
+    return request.session.get("RESTCLIENTS_ERRORS")
+
+
+def set_marker_cookie(response, session):
+    """
+    Marks the browser as having degradations in its session, for as long
+    as the session lasts.
+    """
+    max_age = (None if session.get_expire_at_browser_close()
+               else session.get_expiry_age())
+    response.set_signed_cookie(
+        DEGRADATION_COOKIE, "1", salt=DEGRADATION_COOKIE_SALT,
+        max_age=max_age, httponly=True, samesite="Lax")
+
+
+def mark_response(request, response):
+    """
+    Sets the marker cookie for sessions loaded during the request that
+    hold degradations without it, such as those saved before the marker
+    was introduced.  Their degradations apply from the next request.
+    """
+    session = getattr(request, "session", None)
+    if (session is None or not getattr(session, "accessed", False) or
+            DEGRADATION_COOKIE in response.cookies or
+            not session.get("RESTCLIENTS_ERRORS") or
+            request.get_signed_cookie(
+                DEGRADATION_COOKIE, default=None,
+                salt=DEGRADATION_COOKIE_SALT) is not None):
+        return response
+    set_marker_cookie(response, session)
+    return response
+
+
+class EnableServiceDegradationMiddleware(object):
     """
     Makes it so an admin tool can set specific services to either be slower,
     have an error response code, or custom content.
+
+    Active shared profiles apply to every request, and a browser's own
+    settings from the errors page take precedence over them.  Problems
+    are held in a context variable for the duration of the request, so
+    concurrent requests, in threads or under ASGI, never see each other's.
     """
-    def process_request(self, request):
-        PerformanceDegradation.clear_problems()
-        if "RESTCLIENTS_ERRORS" not in request.session:
-            return
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
 
-        problem_str = request.session["RESTCLIENTS_ERRORS"]
-        problems = DegradePerformance(problem_str)
-        PerformanceDegradation.set_problems(problems)
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        token = push_problems(self.get_problems(request))
+        try:
+            return mark_response(request, self.get_response(request))
+        finally:
+            pop_problems(token)
+
+    async def __acall__(self, request):
+        token = push_problems(await self.aget_problems(request))
+        try:
+            # A loaded session's data is cached, so this doesn't block
+            return mark_response(request, await self.get_response(request))
+        finally:
+            pop_problems(token)
+
+    def get_problems(self, request):
+        """
+        Returns the problem set for a request, or None.
+        """
+        profiles = get_profiles()
+        problem_strs = [profiles.get_active() if profiles else None]
+        if may_have_problems(request):
+            problem_strs.append(get_session_problems(request))
+        return self._load(problem_strs)
+
+    async def aget_problems(self, request):
+        """
+        Async version of get_problems, which only leaves the event loop to
+        poll for profile changes or load a marked session.
+        """
+        profiles = get_profiles()
+        problem_strs = [await profiles.aget_active() if profiles else None]
+        if may_have_problems(request):
+            problem_strs.append(
+                await sync_to_async(get_session_problems)(request))
+        return self._load(problem_strs)
+
+    def process_request(self, request):
+        """
+        Sets the request's problems outside of a middleware chain, until
+        process_response is called.
+        """
+        PerformanceDegradation.set_problems(self.get_problems(request))
 
     def process_response(self, request, response):
         PerformanceDegradation.clear_problems()
+        return mark_response(request, response)
 
-        return response
+    @staticmethod
+    def _load(problem_strs):
+        problem_strs = [s for s in problem_strs if s]
+        if problem_strs:
+            return load_problems(*problem_strs)
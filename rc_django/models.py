@@ -2,83 +2,404 @@
 # SPDX-License-Identifier: Apache-2.0
 
 
+from django.conf import settings
 from django.db import models
-from django.urls import reverse
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.urls import reverse, get_script_prefix, get_urlconf
 from restclients_core.dao import DAO
 from restclients_core.models import MockHTTP
 from restclients_core.exceptions import DataFailureException
-from time import time
+from restclients_core.util.performance import PerformanceDegradation
+from rc_django.codec import get_codec, clear_codec
+from rc_django.formatters import (
+    JSONFormatter, JSONTreeFormatter, HTMLFormatter, join_chunks)
+from rc_django.latency import parse_latency, parse_probability
+from rc_django.response_cache import get_response_cache
+from rc_django.metrics import get_metrics
+from rc_django.recorder import get_recorder
+from urllib3.exceptions import (
+    ConnectTimeoutError, EmptyPoolError, MaxRetryError, ReadTimeoutError)
+from contextlib import contextmanager
+from random import Random
+from threading import Lock, BoundedSemaphore
+from time import perf_counter, sleep
 import json
 import re
 
+SELF_CLOSING_DIV_RE = re.compile(r"((<div[^>]*?)/>)")
+
+# Numbered backreferences and conditionals, which refer to groups by
+# position and so can't be combined with other rules' patterns
+NUMBERED_GROUP_REF_RE = re.compile(r"\\[1-9]|\(\?\(\d")
+
+# Content types that are passed through rather than formatted
+BINARY_CONTENT_TYPES = ("image/", "audio/", "video/", "application/pdf",
+                        "application/octet-stream", "application/zip")
+
+# Signatures for recognizing binary bodies that arrive without a type
+BINARY_SIGNATURES = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"%PDF-", "application/pdf"),
+)
+
+
+def get_header(response, name, default=None):
+    """
+    Case-insensitive header lookup that works for both live and mock
+    responses.
+    """
+    name = name.lower()
+    for key, value in (response.headers or {}).items():
+        if key.lower() == name:
+            return value
+    return default
+
+
+class DAORegistry(object):
+    """
+    Maps service names to DAO instances.  Each DAO subclass is instantiated
+    at most once; the subclass tree is only rescanned when a lookup misses
+    and subclasses have been defined since the last scan, so unknown
+    services fail without a scan or the lock.
+    """
+    _lock = Lock()
+    _daos = {}
+    _seen = set()
+    _generation = None
+
+    @classmethod
+    def get_dao(cls, service):
+        dao = cls._daos.get(service)
+        if dao is None and cls._get_generation() != cls._generation:
+            with cls._lock:
+                if cls._scan():
+                    dao = cls._daos.get(service)
+        if dao is None:
+            raise ImportError("No DAO for service: {}".format(service))
+        return dao
+
+    @classmethod
+    def clear(cls):
+        """
+        Drops all DAO instances, forcing them to be rebuilt on next lookup.
+        DAOs read their settings at construction, so this is needed when
+        settings change.
+        """
+        with cls._lock:
+            cls._daos = {}
+            cls._seen = set()
+            cls._generation = None
+
+    @classmethod
+    def _get_generation(cls):
+        """
+        Counts the direct subclasses of DAO and of every class seen so
+        far.  Any new subclass has DAO or a seen class as its parent, or
+        a new parent with one, so defining one changes the count.
+        """
+        return len(DAO.__subclasses__()) + sum(
+            len(subclass.__subclasses__()) for subclass in tuple(cls._seen))
+
+    @classmethod
+    def _scan(cls):
+        """
+        Registers any DAO subclasses not seen by a previous scan.  Returns
+        True if new subclasses were found.
+        """
+        def get_all_subclasses(base):
+            return base.__subclasses__() + [g for s in base.__subclasses__()
+                                            for g in get_all_subclasses(s)]
+
+        found = False
+        for subclass in get_all_subclasses(DAO):
+            if subclass in cls._seen:
+                continue
+            cls._seen.add(subclass)
+            found = True
+            try:
+                dao = subclass()
+                service = dao.service_name()
+            except Exception:
+                # Abstract intermediate classes don't define a service
+                continue
+            if service not in cls._daos:
+                cls._daos[service] = dao
+        cls._generation = cls._get_generation()
+        return found
+
+
+@receiver(setting_changed)
+def clear_proxy_caches(sender, setting, **kwargs):
+    if setting == "RESTCLIENTS_JSON_CODEC":
+        clear_codec()
+    elif setting.startswith("RESTCLIENTS_"):
+        DAORegistry.clear()
+    elif setting == "ROOT_URLCONF":
+        RestProxy._base_urls.clear()
+
 
 class RestProxy():
+    # JSON documents must begin with one of these, after optional whitespace
+    _json_start = re.compile(r'\s*[{\["\-0-9tfn]')
+    _json_start_bytes = re.compile(rb'\s*[{\["\-0-9tfn]')
+    _base_urls = {}
+
+    # Timed phases of a proxy request, in order, with their descriptions
+    phases = (("dao", "DAO lookup"), ("fetch", "Upstream fetch"),
+              ("parse", "JSON parse"), ("format", "Formatting"),
+              ("template", "Template resolution"), ("render", "Render"))
+
     def __init__(self, service):
         self.service = service
         self.response = None
+        self.cache_status = None
+        self.timings = {}
         self._request_start = 0
         self._request_end = 0
+        self._document_source = None
+        self._document = None
 
     @property
     def dao(self):
-        def get_all_subclasses(base):
-            return base.__subclasses__() + [g for s in base.__subclasses__()
-                                            for g in get_all_subclasses(s)]
-
-        for subclass in get_all_subclasses(DAO):
-            dao = subclass()
-            if dao.service_name() == self.service:
-                return dao
-        raise ImportError()
+        return DAORegistry.get_dao(self.service)
 
     @property
     def duration(self):
         return self._request_end - self._request_start
 
+    @property
+    def document(self):
+        """
+        The response body parsed as JSON.  The body is decoded at most once
+        per response, and the result is shared by json and format_json.
+        Raises ValueError if the body is not JSON.
+        """
+        data = self.response.data
+        if data is not self._document_source:
+            with self.timing("parse"):
+                self._document_source = data
+                self._document = self._parse_document(data)
+        if self._document is None:
+            raise ValueError("Response is not JSON")
+        return self._document[0]
+
+    @property
+    def binary_content_type(self):
+        """
+        The content type of a binary response body, or None if the body is
+        text.  Bodies without a Content-Type header are recognized by their
+        leading bytes.
+        """
+        content_type = get_header(self.response, "Content-Type")
+        if content_type:
+            if content_type.lower().startswith(BINARY_CONTENT_TYPES):
+                return content_type
+            return None
+
+        data = self.response.data
+        if isinstance(data, bytes):
+            for signature, content_type in BINARY_SIGNATURES:
+                if data.startswith(signature):
+                    return content_type
+        return None
+
     @property
     def json(self):
         try:
-            return json.dumps(json.loads(self.response.data), sort_keys=True)
+            document = self.document
         except ValueError:
-            pass
+            return None
+        with self.timing("format"):
+            return get_codec().dumps(document, sort_keys=True)
 
     @property
     def formatted(self):
         try:
             # Assume json, and try to format it.
-            return self.format_json()
+            self.document
+            is_json = True
         except ValueError:
-            return self.format_html()
+            is_json = False
+
+        with self.timing("format"):
+            return self.format_json() if is_json else self.format_html()
 
-    def get_api_response(self, url, headers={}):
-        self._request_start = time()
+    @contextmanager
+    def timing(self, phase):
+        """
+        Adds the time taken by the block to a phase's timing.
+        """
+        start = perf_counter()
         try:
-            response = self.dao.getURL(url, headers)
+            yield
+        finally:
+            self.add_timing(phase, perf_counter() - start)
+
+    def add_timing(self, phase, seconds):
+        self.timings[phase] = self.timings.get(phase, 0) + seconds
+
+    def get_timings(self):
+        """
+        Returns (phase, description, milliseconds) for each timed phase.
+        """
+        return [(phase, desc, self.timings[phase] * 1000)
+                for phase, desc in self.phases if phase in self.timings]
+
+    def server_timing(self):
+        """
+        The timings, formatted for a Server-Timing header.
+        """
+        return ", ".join('{};desc="{}";dur={:.3f}'.format(*timing)
+                         for timing in self.get_timings())
+
+    def get_api_response(self, url, headers={}, bypass_cache=False):
+        """
+        Fetches url from the service, through the response cache if
+        RESTCLIENTS_PROXY_CACHE_TTL is set.  cache_status is then "hit",
+        "revalidated", "miss" or "bypass".  The cache is skipped while
+        degradations are active.
+        """
+        self._request_start = perf_counter()
+        self.cache_status = None
+        cache = get_response_cache()
+        ttl = cache.get_ttl(self.service) if cache else None
+        if not ttl or PerformanceDegradation.get_problems() is not None:
+            self.response = self._fetch(url, headers)
+            self._request_end = perf_counter()
+            self._record_metrics(url)
+            return self.response
+
+        key = cache.key(self.service, url, headers)
+        cached = None if bypass_cache else cache.get(key)
+        if cached is not None and cached[1]:
+            self.cache_status = "hit"
+            response = cached[0]
+        else:
+            request_headers = dict(headers)
+            if cached is not None:
+                request_headers.update(self._conditional_headers(cached[0]))
+            response = self._fetch(url, request_headers)
+
+            if cached is not None and response.status == 304:
+                self.cache_status = "revalidated"
+                response = cached[0]
+                cache.set(key, response, ttl)
+            else:
+                self.cache_status = "bypass" if bypass_cache else "miss"
+                if response.status == 200:
+                    cache.set(key, response, ttl)
+
+        self._request_end = perf_counter()
+        self.response = response
+        self._record_metrics(url)
+        return self.response
+
+    def _record_metrics(self, url):
+        metrics = get_metrics()
+        if metrics is not None:
+            metrics.record(self.service, url, self.duration,
+                           self.response.status,
+                           len(self.response.data or ""))
+
+    def _fetch(self, url, headers):
+        with self.timing("dao"):
+            dao = self.dao
+        try:
+            with self.timing("fetch"):
+                response = dao.getURL(url, headers)
         except DataFailureException as ex:
             response = MockHTTP()
             response.status = ex.status
-            response.data = ex.msg
-        self._request_end = time()
-        self.response = response
-        return self.response
+            # Connection failures carry the urllib3 exception
+            response.data = ex.msg if isinstance(
+                ex.msg, (str, bytes)) else str(ex.msg)
+            return response
+
+        recorder = get_recorder()
+        if recorder is not None and (
+                PerformanceDegradation.get_problems() is None):
+            # Degraded responses aren't real ones
+            recorder.record(self.service, url, response)
+        return response
+
+    @staticmethod
+    def _conditional_headers(response):
+        headers = {}
+        etag = get_header(response, "ETag")
+        if etag:
+            headers["If-None-Match"] = etag
+        last_modified = get_header(response, "Last-Modified")
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+        return headers
+
+    def _parse_document(self, data):
+        """
+        Returns a 1-tuple holding the parsed document, or None if data is
+        not JSON.  Bodies that can't start a JSON document, such as HTML,
+        are rejected without attempting a parse.
+        """
+        pattern = (self._json_start_bytes if isinstance(data, bytes) else
+                   self._json_start)
+        try:
+            if pattern.match(data):
+                return (get_codec().loads(data),)
+        except (TypeError, ValueError):
+            pass
 
     def format_json(self):
-        data = json.loads(self.response.data)
-        formatted = json.dumps(data, sort_keys=True, indent=4)
-        formatted = formatted.replace("&", "&amp;")
-        formatted = formatted.replace("<", "&lt;")
-        formatted = formatted.replace(">", "&gt;")
-        formatted = formatted.replace(" ", "&nbsp;")
-        formatted = formatted.replace("\n", "<br/>\n")
-
-        base_url = reverse("restclients_proxy", args=["xx", "xx"])
-        base_url = base_url.replace('/xx/xx', '')
-
-        formatted = re.sub(r"\"/(.*?)\"",
-                           r'"<a href="{}/{}/\1">/\1</a>"'.format(
-                               base_url, self.service),
-                           formatted)
-        return formatted
+        return JSONFormatter(self._link_prefix()).render(self.document)
+
+    def tree_formatter(self, sorted_keys=None):
+        """
+        A JSONTreeFormatter expanding RESTCLIENTS_PROXY_TREE_DEPTH levels,
+        and RESTCLIENTS_PROXY_TREE_CHILDREN children of each container.
+        """
+        return JSONTreeFormatter(
+            self._link_prefix(),
+            depth=getattr(settings, "RESTCLIENTS_PROXY_TREE_DEPTH", 2),
+            max_children=getattr(
+                settings, "RESTCLIENTS_PROXY_TREE_CHILDREN", 100),
+            sorted_keys=sorted_keys)
+
+    def format_tree(self, sorted_keys=None):
+        return self.tree_formatter(sorted_keys).render(self.document)
+
+    def iter_formatted_json(self):
+        """
+        Yields format_json() output in chunks, for streaming responses.
+        """
+        return JSONFormatter(self._link_prefix()).iterrender(self.document)
+
+    def iter_json(self):
+        """
+        Yields a JSON encoding of the document in chunks, for streaming
+        responses.
+        """
+        return join_chunks(
+            json.JSONEncoder(sort_keys=True).iterencode(self.document))
+
+    def _link_prefix(self):
+        return "{}/{}".format(self.base_url(), self.service)
+
+    @classmethod
+    def base_url(cls):
+        """
+        The proxy view's URL prefix, resolved once per script prefix and
+        urlconf.
+        """
+        key = (get_script_prefix(), get_urlconf())
+        try:
+            return cls._base_urls[key]
+        except KeyError:
+            base_url = reverse("restclients_proxy", args=["xx", "xx"])
+            base_url = base_url.replace('/xx/xx', '')
+            cls._base_urls[key] = base_url
+            return base_url
 
     def format_html(self):
         try:
@@ -86,33 +407,66 @@ class RestProxy():
         except AttributeError:
             content = self.response.data
 
-        base_url = reverse("restclients_proxy", args=["xx", "xx"])
-        base_url = base_url.replace('/xx/xx', '')
-
-        formatted = re.sub(r"href\s*=\s*[\"\']/(.*?)[\"\']",
-                           r'href="{}/{}/\1"'.format(base_url, self.service),
-                           content, flags=re.I)
-        formatted = re.sub(
-            re.compile(r"<style.*/style>", flags=re.S | re.I), "", formatted)
-        formatted = self.clean_self_closing_divs(formatted)
-        return formatted
+        return HTMLFormatter(self._link_prefix()).render(content)
 
     @staticmethod
     def clean_self_closing_divs(content):
-        return re.sub(r"((<div[^>]*?)/>)",
-                      r"<!-- \g<1> -->\g<2>></div>",
-                      content)
+        return SELF_CLOSING_DIV_RE.sub(r"<!-- \g<1> -->\g<2>></div>", content)
 
 
 class DegradePerformance(object):
+    """
+    A set of simulated problems, per service.  Each service can have
+    values (status, content, load_time, error_rate) that apply to all of
+    its URLs, plus rules that override them for URLs matching a prefix or
+    regular expression.  Rules are matched from the start of the URL, in
+    the order they were added.
+
+    Load times are latency distributions (see rc_django.latency).  When
+    an error rate is set, the status, content, timeout and truncation are
+    only applied to that fraction of requests.  Setting a seed makes a
+    service's samples reproducible: the nth request for a URL draws from
+    a generator seeded with the seed, URL and n, however requests for
+    other URLs interleave with it.  Counts are kept per problem set, in
+    this process.
+
+    Faults that restclients_core would report as a failed connection:
+    timeout ("connect" or "read") fails requests after their load time,
+    and pool_size limits a service to that many concurrent requests, in
+    this process.  Both raise DataFailureException with status 0, like a
+    live DAO.  Response bodies can be cut to truncate bytes (or a
+    percentage, e.g. "50%"), and delivered at throughput bytes per second.
+    """
+    rule_match_types = ("prefix", "regex")
+    rule_keys = ("status", "content", "load_time", "error_rate",
+                 "throughput", "truncate", "timeout", "pool_size")
+    timeouts = ("connect", "read")
+
     def __init__(self, serialized=None):
         self.problems = {}
+        self._matchers = {}
+        self._latencies = {}
+        self._random = Random()
+        self._counts = {}
+        self._pools = {}
+        self._lock = Lock()
 
         if serialized:
-            self.problems = json.loads(serialized)
+            self.problems = get_codec().loads(serialized)
 
     def remove_service(self, service):
         del self.problems[service]
+        self._matchers.pop(service, None)
+
+    def update(self, other):
+        """
+        Adds the services of another problem set, replacing any services
+        both sets degrade.
+        """
+        for service in other.services():
+            self.problems[service] = other.problems[service]
+            self._matchers.pop(service, None)
+            self._reset_counts(service)
 
     def set_status(self, service, value):
         self._set(service, "status", value)
@@ -121,26 +475,254 @@ class DegradePerformance(object):
         self._set(service, "content", value)
 
     def set_load_time(self, service, value):
-        self._set(service, "load_time", value)
+        """
+        Raises ValueError if value isn't a latency distribution.
+        """
+        self._set(service, "load_time", self._clean_load_time(value))
+
+    def set_error_rate(self, service, value):
+        """
+        Raises ValueError if value isn't a probability.
+        """
+        self._set(service, "error_rate", parse_probability(value))
+
+    def set_throughput(self, service, value):
+        """
+        Raises ValueError if value isn't a positive number of bytes.
+        """
+        self._set(service, "throughput", self._clean_throughput(value))
+
+    def set_truncate(self, service, value):
+        """
+        Raises ValueError if value isn't a byte count or percentage.
+        """
+        self._set(service, "truncate", self._clean_truncate(value))
+
+    def set_timeout(self, service, value):
+        """
+        Raises ValueError if value isn't "connect" or "read".
+        """
+        self._set(service, "timeout", self._clean_timeout(value))
+
+    def set_pool_size(self, service, value):
+        """
+        Raises ValueError if value isn't a count of connections.
+        """
+        self._set(service, "pool_size", self._clean_pool_size(value))
+
+    def set_seed(self, service, value):
+        if value is not None and str(value).strip() != "":
+            try:
+                value = int(value)
+            except ValueError:
+                raise ValueError("Not an integer seed: {}".format(value))
+        else:
+            value = None
+        self._set(service, "seed", value)
+        self._reset_counts(service)
+
+    def get_status(self, service, url=None):
+        return self._get(service, "status", url)
+
+    def get_content(self, service, url=None):
+        return self._get(service, "content", url)
+
+    def get_load_time(self, service, url=None):
+        return self._get(service, "load_time", url)
+
+    def get_error_rate(self, service, url=None):
+        return self._get(service, "error_rate", url)
+
+    def get_throughput(self, service, url=None):
+        return self._get(service, "throughput", url)
+
+    def get_truncate(self, service, url=None):
+        return self._get(service, "truncate", url)
+
+    def get_timeout(self, service, url=None):
+        return self._get(service, "timeout", url)
+
+    def get_pool_size(self, service, url=None):
+        return self._get(service, "pool_size", url)
+
+    def get_seed(self, service):
+        return self._get(service, "seed")
+
+    def get_latency(self, service, url=None):
+        """
+        The latency distribution for a request, or None.
+        """
+        value = self.get_load_time(service, url)
+        try:
+            return self._latencies[value]
+        except KeyError:
+            latency = self._latencies[value] = parse_latency(value)
+            return latency
+
+    def add_rule(self, service, pattern, match="prefix", **values):
+        """
+        Adds a rule overriding the service's values for matching URLs.
+        Raises ValueError for an unknown match type or invalid regex.
+        """
+        if match not in self.rule_match_types:
+            raise ValueError("Unknown match type: {}".format(match))
+        if match == "regex":
+            try:
+                re.compile(pattern)
+            except re.error as ex:
+                raise ValueError("Invalid pattern {}: {}".format(pattern, ex))
+
+        rule = {"pattern": pattern, "match": match}
+        rule.update({k: v for k, v in values.items() if k in self.rule_keys})
+        for key, clean in (("load_time", self._clean_load_time),
+                           ("error_rate", parse_probability),
+                           ("throughput", self._clean_throughput),
+                           ("truncate", self._clean_truncate),
+                           ("timeout", self._clean_timeout),
+                           ("pool_size", self._clean_pool_size)):
+            rule[key] = clean(rule.get(key))
+        self._add_service(service)
+        self.problems[service].setdefault("rules", []).append(rule)
+        self._matchers.pop(service, None)
 
-    def get_status(self, service):
-        return self._get(service, "status")
+    def remove_rule(self, service, index):
+        del self.problems[service]["rules"][index]
+        self._matchers.pop(service, None)
 
-    def get_content(self, service):
-        return self._get(service, "content")
+    def get_rules(self, service):
+        return self.problems.get(service, {}).get("rules", [])
 
-    def get_load_time(self, service):
-        return self._get(service, "load_time")
+    def get_rule(self, service, url):
+        """
+        Returns the first of the service's rules matching url, or None.
+        """
+        try:
+            matcher = self._matchers[service]
+        except KeyError:
+            matcher = self._matchers[service] = self._compile_rules(service)
+
+        if matcher is not None:
+            return matcher(url)
+
+    def get_response(self, service, url):
+        """
+        Applies any delay configured for the request, and returns the
+        degraded response, or None to let the request through.  Raises
+        DataFailureException for a simulated timeout.
+        """
+        if service not in self.problems:
+            return None
+
+        rng = self._get_rng(service, url, "request")
+        latency = self.get_latency(service, url)
+        if latency:
+            sleep(latency.sample(rng))
+
+        if not self._fails(service, url, rng):
+            return None
+
+        timeout = self.get_timeout(service, url)
+        if timeout == "connect":
+            raise DataFailureException(url, 0, MaxRetryError(
+                None, url, ConnectTimeoutError(
+                    None, "Connection to the server timed out.")))
+        if timeout == "read":
+            raise DataFailureException(url, 0, MaxRetryError(
+                None, url, ReadTimeoutError(None, url, "Read timed out.")))
+
+        status = self.get_status(service, url)
+        content = self.get_content(service, url)
+
+        if content and not status:
+            status = 200
+
+        if status:
+            response = MockHTTP()
+            response.status = int(status)
+
+            if content:
+                response.data = content
+
+            return response
+        return None
+
+    def degrade_response(self, service, url, response):
+        """
+        Applies any truncation and throughput limit to a loaded response,
+        returning the response to use.
+        """
+        if service not in self.problems or response is None:
+            return response
+
+        truncate = self.get_truncate(service, url)
+        if truncate is not None and self._fails(
+                service, url, self._get_rng(service, url, "response")):
+            response = self._truncate(response, truncate)
+
+        throughput = self.get_throughput(service, url)
+        if throughput:
+            sleep(len(response.data or "") / throughput)
+        return response
+
+    @contextmanager
+    def connection(self, service, url, timeout):
+        """
+        Holds one of the service's simulated connections for the duration
+        of a request, if its pool size is limited.  Raises
+        DataFailureException if none is free within timeout seconds.
+        """
+        size = self.get_pool_size(service, url)
+        if size is None or service not in self.problems:
+            yield
+            return
+
+        with self._lock:
+            try:
+                pool = self._pools[(service, size)]
+            except KeyError:
+                pool = self._pools[(service, size)] = BoundedSemaphore(
+                    size) if size else None
+
+        if pool is None or not pool.acquire(timeout=timeout):
+            raise DataFailureException(url, 0, EmptyPoolError(
+                None, "Pool reached maximum size and no more connections "
+                "are allowed."))
+        try:
+            yield
+        finally:
+            pool.release()
 
     def services(self):
         return self.problems.keys()
 
+    def _fails(self, service, url, rng):
+        error_rate = self.get_error_rate(service, url)
+        return error_rate is None or rng.random() < error_rate
+
+    @staticmethod
+    def _truncate(response, truncate):
+        data = response.data or ""
+        if truncate.endswith("%"):
+            length = int(len(data) * float(truncate[:-1]) / 100)
+        else:
+            length = int(truncate)
+
+        truncated = MockHTTP()
+        truncated.status = response.status
+        truncated.headers = dict(response.headers or {})
+        truncated.data = data[:length]
+        return truncated
+
     def _set(self, service, key, value):
         self._add_service(service)
         self.problems[service][key] = value
 
-    def _get(self, service, key):
+    def _get(self, service, key, url=None):
         if service in self.problems:
+            if url is not None:
+                rule = self.get_rule(service, url)
+                if rule and rule.get(key) not in (None, ""):
+                    return rule[key]
             if key in self.problems[service]:
                 return self.problems[service][key]
         return None
@@ -149,5 +731,114 @@ class DegradePerformance(object):
         if service not in self.problems:
             self.problems[service] = {}
 
+    def _get_rng(self, service, url, stream):
+        """
+        A generator for one request's samples.  With a seed, it's seeded
+        from the number of earlier requests for the URL, so runs repeat
+        regardless of how concurrent requests are ordered.
+        """
+        seed = self.get_seed(service)
+        if seed is None:
+            return self._random
+
+        key = (service, url, stream)
+        with self._lock:
+            count = self._counts.get(key, 0)
+            self._counts[key] = count + 1
+        return Random("{}:{}:{}:{}:{}".format(
+            seed, service, url, stream, count))
+
+    def _reset_counts(self, service):
+        with self._lock:
+            self._counts = {key: count for key, count in self._counts.items()
+                            if key[0] != service}
+
+    @staticmethod
+    def _clean_load_time(value):
+        latency = parse_latency(value)
+        return str(latency) if latency is not None else None
+
+    @staticmethod
+    def _clean_throughput(value):
+        if value is None or str(value).strip() == "":
+            return None
+        try:
+            throughput = float(value)
+        except ValueError:
+            throughput = 0
+        if not 0 < throughput < float("inf"):
+            raise ValueError("Not a number of bytes per second: {}".format(
+                value))
+        return throughput
+
+    @staticmethod
+    def _clean_truncate(value):
+        if value is None or str(value).strip() == "":
+            return None
+        value = str(value).strip()
+        try:
+            if value.endswith("%"):
+                if 0 <= float(value[:-1]) <= 100:
+                    return value
+            elif int(value) >= 0:
+                return value
+        except ValueError:
+            pass
+        raise ValueError("Not a byte count or percentage: {}".format(value))
+
+    @classmethod
+    def _clean_timeout(cls, value):
+        if value is None or value == "":
+            return None
+        if value not in cls.timeouts:
+            raise ValueError("Unknown timeout: {}".format(value))
+        return value
+
+    @staticmethod
+    def _clean_pool_size(value):
+        if value is None or str(value).strip() == "":
+            return None
+        try:
+            size = int(value)
+        except ValueError:
+            size = -1
+        if size < 0:
+            raise ValueError("Not a number of connections: {}".format(value))
+        return size
+
+    def _compile_rules(self, service):
+        """
+        Builds a function returning the first rule that matches a URL.
+        All of a service's rules are combined into one regex, so a URL is
+        checked against every rule in a single match.
+        """
+        rules = self.get_rules(service)
+        if not rules:
+            return None
+
+        patterns = [
+            re.escape(rule["pattern"]) if rule.get("match") != "regex" else
+            "(?:{})".format(rule["pattern"]) for rule in rules]
+        try:
+            if any(NUMBERED_GROUP_REF_RE.search(pattern)
+                   for pattern in patterns):
+                raise re.error("Numbered group reference")
+            combined = re.compile("|".join(
+                "(?P<r{}>{})".format(i, pattern)
+                for i, pattern in enumerate(patterns)))
+        except re.error:
+            # Patterns that can't be combined, such as ones with clashing
+            # group names or numbered backreferences, are matched one at
+            # a time
+            compiled = [re.compile(pattern) for pattern in patterns]
+            return lambda url: next((rules[i] for i, regex in enumerate(
+                compiled) if regex.match(url)), None)
+
+        def matcher(url):
+            match = combined.match(url)
+            if match:
+                return rules[int(match.lastgroup[1:])]
+        return matcher
+
     def serialize(self):
-        return json.dumps(self.problems)
+        return get_codec().dumps(self.problems)
@@ -0,0 +1,173 @@
+# Copyright 2025 UW-IT, University of Washington
+# SPDX-License-Identifier: Apache-2.0
+
+
+from django.conf import settings
+from django.core.cache import caches
+from rc_django.models import DegradePerformance
+from contextlib import contextmanager
+from threading import Lock
+from time import monotonic, sleep
+from uuid import uuid4
+import re
+
+PROFILE_NAME_RE = re.compile(r"^[\w.-]+$")
+
+_profiles = (None, None)
+
+
+class DegradationProfiles(object):
+    """
+    Named degradation profiles, stored in one of Django's caches so every
+    node serving the app applies the same active profiles.
+
+    A version key is bumped on every change.  Nodes check it at most once
+    per poll interval, and only reload the profiles when it has changed.
+    Changes are made under a lock key in the cache, so admins on
+    different nodes don't overwrite each other's changes.
+    """
+    prefix = "restclients_degradation"
+    # Seconds a node can hold the lock, should it die while holding it
+    lock_timeout = 10
+
+    def __init__(self, alias, poll_interval):
+        self.cache = caches[alias]
+        self.poll_interval = poll_interval
+        self._lock = Lock()
+        self._state = None
+
+    def get_profiles(self):
+        """
+        Returns a dict of profile name to {"problems": serialized problem
+        set, "active": bool}.
+        """
+        return self.cache.get(self._key("profiles")) or {}
+
+    def save(self, name, problems, active=False):
+        """
+        Stores a problem set as the named profile, replacing any profile
+        of that name.  Raises ValueError for an invalid name.
+        """
+        if not PROFILE_NAME_RE.match(name or ""):
+            raise ValueError("Invalid profile name: {}".format(name))
+        profile = {"problems": problems.serialize(), "active": bool(active)}
+        self._update(name, lambda current: profile)
+
+    def delete(self, name):
+        self._update(name, lambda current: None)
+
+    def activate(self, name):
+        self._set_active(name, True)
+
+    def deactivate(self, name):
+        self._set_active(name, False)
+
+    def get_active(self):
+        """
+        Returns the serialized problem set of all active profiles, or None.
+        Where profiles degrade the same service, the one whose name sorts
+        last is used.
+        """
+        state = self._state
+        now = monotonic()
+        if state is not None and now - state[0] < self.poll_interval:
+            return state[2]
+
+        version = self.cache.get(self._key("version"), 0)
+        if state is not None and state[1] == version:
+            return self._set_state(now, version, state[2])
+        return self._set_state(
+            now, version, self._merge_active(self.get_profiles()))
+
+    async def aget_active(self):
+        """
+        Async version of get_active.
+        """
+        state = self._state
+        now = monotonic()
+        if state is not None and now - state[0] < self.poll_interval:
+            return state[2]
+
+        version = await self.cache.aget(self._key("version"), 0)
+        if state is not None and state[1] == version:
+            return self._set_state(now, version, state[2])
+        profiles = await self.cache.aget(self._key("profiles"))
+        return self._set_state(now, version, self._merge_active(
+            profiles or {}))
+
+    def _set_active(self, name, active):
+        def change(profile):
+            if profile is None:
+                raise ValueError("Unknown profile: {}".format(name))
+            return dict(profile, active=active)
+        self._update(name, change)
+
+    def _update(self, name, change):
+        """
+        Replaces the named profile with change(profile), or removes it if
+        that returns None.
+        """
+        with self._lock, self._cache_lock():
+            profiles = self.get_profiles()
+            profile = change(profiles.get(name))
+            if profile is None:
+                profiles.pop(name, None)
+            else:
+                profiles[name] = profile
+            self.cache.set(self._key("profiles"), profiles, None)
+
+            key = self._key("version")
+            try:
+                self.cache.incr(key)
+            except ValueError:
+                self.cache.set(key, 1, None)
+            self._state = None
+
+    @contextmanager
+    def _cache_lock(self):
+        key = self._key("lock")
+        token = uuid4().hex
+        deadline = monotonic() + self.lock_timeout * 2
+        while not self.cache.add(key, token, self.lock_timeout):
+            if monotonic() > deadline:
+                raise RuntimeError("Timed out waiting for the profile lock")
+            sleep(0.01)
+        try:
+            yield
+        finally:
+            if self.cache.get(key) == token:
+                self.cache.delete(key)
+
+    def _set_state(self, checked, version, active):
+        self._state = (checked, version, active)
+        return active
+
+    @staticmethod
+    def _merge_active(profiles):
+        merged = DegradePerformance()
+        for name in sorted(profiles):
+            if profiles[name].get("active"):
+                merged.update(DegradePerformance(profiles[name]["problems"]))
+        return merged.serialize() if merged.problems else None
+
+    def _key(self, name):
+        return "{}:{}".format(self.prefix, name)
+
+
+def get_profiles():
+    """
+    Returns the shared degradation profiles, stored in the cache named by
+    RESTCLIENTS_DEGRADATION_CACHE_ALIAS, or None if that isn't set.
+    Nodes check for changes every RESTCLIENTS_DEGRADATION_POLL_INTERVAL
+    seconds.
+    """
+    global _profiles
+    config = (getattr(settings, "RESTCLIENTS_DEGRADATION_CACHE_ALIAS", None),
+              getattr(settings, "RESTCLIENTS_DEGRADATION_POLL_INTERVAL", 5))
+    if _profiles[0] != config:
+        alias, poll_interval = config
+        profiles = None
+        if alias:
+            profiles = DegradationProfiles(alias, poll_interval)
+        _profiles = (config, profiles)
+    return _profiles[1]
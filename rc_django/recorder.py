@@ -0,0 +1,171 @@
+# Copyright 2025 UW-IT, University of Washington
+# SPDX-License-Identifier: Apache-2.0
+
+
+from django.conf import settings
+from restclients_core.util.mock import convert_to_platform_safe
+from hashlib import sha256
+from threading import Lock
+from logging import getLogger
+import json
+import os
+
+logger = getLogger(__name__)
+
+_recorder = (None, None)
+
+# Upstream headers that don't describe the recorded body
+SKIPPED_HEADERS = ("connection", "content-encoding", "content-length",
+                   "keep-alive", "set-cookie", "transfer-encoding")
+
+
+class ResponseRecorder(object):
+    """
+    Writes upstream responses where restclients_core's MockDAO reads them,
+    as <path>/<service>/file/<url>, with the status and headers in a
+    .http-headers file alongside.  Identical bodies are stored once, and
+    linked to from each URL returning them.  Bodies over max_size bytes
+    aren't recorded, nor is anything once max_total bytes have been.
+    """
+    def __init__(self, path, max_size, max_total):
+        self.path = os.path.abspath(path)
+        self.max_size = max_size
+        self.max_total = max_total
+        self.total = 0
+        self._lock = Lock()
+        self._hashes = {}
+        self._paths = {}
+
+    def get_file_path(self, service, url):
+        """
+        The mock resource file for a URL, or None if the URL would be
+        outside the service's resources.
+        """
+        root = os.path.join(self.path, service, "file")
+        path = os.path.normpath(root + convert_to_platform_safe(
+            url if url.startswith("/") else "/" + url))
+        if path == root:
+            return os.path.join(root, "index.html")
+        if not path.startswith(root + os.sep):
+            return None
+        if os.path.isdir(path):
+            return os.path.join(path, "index.html")
+        return path
+
+    def record(self, service, url, response):
+        """
+        Records a successful response, returning its file path, or None if
+        it wasn't recorded.
+        """
+        if not 200 <= (response.status or 0) < 300:
+            return None
+
+        data = response.data or b""
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        if len(data) > self.max_size:
+            return None
+
+        path = self.get_file_path(service, url)
+        if path is None:
+            logger.warning("Not recording %s %s: outside the resources",
+                           service, url)
+            return None
+
+        digest = sha256(data).hexdigest()
+        headers = {k: v for k, v in (response.headers or {}).items()
+                   if k.lower() not in SKIPPED_HEADERS}
+        with self._lock:
+            if self._hashes.get(path) == digest:
+                return path
+
+            current = self._hashes.get(path) or self._file_hash(path)
+            if current == digest:
+                # Recorded before this process started
+                try:
+                    self._write_headers(path, response.status, headers)
+                except OSError as ex:
+                    logger.warning("Not recording %s %s: %s",
+                                   service, url, ex)
+                    return None
+                self._hashes[path] = digest
+                return path
+
+            source = self._paths.get(digest)
+            if source is None and self.total + len(data) > self.max_total:
+                return None
+
+            try:
+                self._write(path, data, source)
+                self._write_headers(path, response.status, headers)
+            except OSError as ex:
+                logger.warning("Not recording %s %s: %s", service, url, ex)
+                return None
+
+            if source is None:
+                self.total += len(data)
+                self._paths[digest] = path
+            if self._paths.get(current) == path:
+                # Later copies of the old body can't link to this file
+                del self._paths[current]
+            self._hashes[path] = digest
+        return path
+
+    @staticmethod
+    def _file_hash(path):
+        try:
+            with open(path, "rb") as f:
+                return sha256(f.read()).hexdigest()
+        except OSError:
+            return None
+
+    @staticmethod
+    def _write(path, data, source=None):
+        """
+        Replaces the file at path, with a link to source if given.
+        """
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = path + ".recording"
+        if source is not None:
+            try:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                os.link(source, temp_path)
+                os.replace(temp_path, path)
+                return
+            except OSError:
+                # Links aren't supported everywhere; write a copy instead
+                pass
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+
+    @staticmethod
+    def _write_headers(path, status, headers):
+        temp_path = path + ".http-headers.recording"
+        with open(temp_path, "w") as f:
+            json.dump({"status": status, "headers": headers}, f,
+                      indent=4, sort_keys=True)
+        os.replace(temp_path, path + ".http-headers")
+
+
+def get_recorder():
+    """
+    Returns the response recorder, or None if RESTCLIENTS_RECORD_PATH
+    isn't set.  The path is a mock resources directory, holding a
+    <service>/file directory for each service.  Bodies over
+    RESTCLIENTS_RECORD_MAX_SIZE bytes aren't recorded, and recording stops
+    after RESTCLIENTS_RECORD_MAX_TOTAL bytes.
+    """
+    global _recorder
+    config = (getattr(settings, "RESTCLIENTS_RECORD_PATH", None),
+              getattr(settings, "RESTCLIENTS_RECORD_MAX_SIZE",
+                      5 * 1024 * 1024),
+              getattr(settings, "RESTCLIENTS_RECORD_MAX_TOTAL",
+                      500 * 1024 * 1024))
+    if _recorder[0] != config:
+        path, max_size, max_total = config
+        recorder = (ResponseRecorder(path, max_size, max_total) if path
+                    else None)
+        _recorder = (config, recorder)
+    return _recorder[1]
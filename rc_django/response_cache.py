@@ -0,0 +1,90 @@
+# Copyright 2025 UW-IT, University of Washington
+# SPDX-License-Identifier: Apache-2.0
+
+
+from django.conf import settings
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+
+_response_cache = (None, None)
+
+
+class ResponseCache(object):
+    """
+    In-process LRU cache of proxied upstream responses.  Entries are fresh
+    for their service's TTL, and expired entries are kept (until evicted)
+    so they can be revalidated with their ETag or Last-Modified value.
+    """
+    def __init__(self, ttls, max_entries):
+        if not isinstance(ttls, dict):
+            ttls = {"default": ttls}
+        self.ttls = ttls
+        self.max_entries = max_entries
+        self._lock = Lock()
+        self._entries = OrderedDict()
+
+    def get_ttl(self, service):
+        return self.ttls.get(service, self.ttls.get("default"))
+
+    @staticmethod
+    def key(service, url, headers):
+        return (service, url, tuple(sorted(
+            (k.lower(), str(v)) for k, v in (headers or {}).items())))
+
+    def get(self, key):
+        """
+        Returns (response, fresh) for a cached response, or None.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+        return entry[1], entry[0] > monotonic()
+
+    def set(self, key, response, ttl):
+        with self._lock:
+            self._entries[key] = (monotonic() + ttl, response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def get_response_cache():
+    """
+    Returns the proxy response cache, or None if RESTCLIENTS_PROXY_CACHE_TTL
+    isn't set.  The TTL is in seconds, or a dict of service name to
+    seconds, with an optional "default".  The cache holds at most
+    RESTCLIENTS_PROXY_CACHE_SIZE responses.
+    """
+    global _response_cache
+    config = (getattr(settings, "RESTCLIENTS_PROXY_CACHE_TTL", None),
+              getattr(settings, "RESTCLIENTS_PROXY_CACHE_SIZE", 500))
+    if _response_cache[0] != config:
+        ttls, max_entries = config
+        cache = ResponseCache(ttls, max_entries) if ttls else None
+        _response_cache = (config, cache)
+    return _response_cache[1]
+
+
+_document_cache = (None, None)
+
+
+def get_document_cache():
+    """
+    Returns the cache of parsed documents shown as trees, from which
+    subtrees are loaded.  Documents are kept for
+    RESTCLIENTS_PROXY_TREE_TTL seconds, and at most
+    RESTCLIENTS_PROXY_TREE_CACHE_SIZE are kept.
+    """
+    global _document_cache
+    config = (getattr(settings, "RESTCLIENTS_PROXY_TREE_TTL", 300),
+              getattr(settings, "RESTCLIENTS_PROXY_TREE_CACHE_SIZE", 10))
+    if _document_cache[0] != config:
+        _document_cache = (config, ResponseCache(*config))
+    return _document_cache[1]
@@ -0,0 +1,123 @@
+# Copyright 2025 UW-IT, University of Washington
+# SPDX-License-Identifier: Apache-2.0
+
+
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.template import engines, loader, TemplateDoesNotExist
+from django.utils.autoreload import file_changed
+from threading import Lock
+import os
+
+
+class TemplateIndex(object):
+    """
+    Answers "does this template exist?" for the optional templates the
+    proxy views look for, without a failed loader search per request.
+
+    Templates under the indexed prefixes are found by listing the
+    directories of every configured loader once.  If any loader can't be
+    listed, lookups fall back to a loader search, and the result is cached
+    either way.
+    """
+    prefixes = ("restclients/", "proxy/", "customform/")
+    max_probed = 10000
+
+    def __init__(self):
+        self._lock = Lock()
+        self._index = None
+
+    def exists(self, name):
+        index = self._index
+        if index is None:
+            index = self.build()
+        names, complete, probed = index
+
+        if name in names:
+            return True
+        if complete and name.startswith(self.prefixes):
+            return False
+
+        try:
+            return probed[name]
+        except KeyError:
+            pass
+
+        try:
+            loader.get_template(name)
+            found = True
+        except TemplateDoesNotExist:
+            found = False
+        if len(probed) < self.max_probed:
+            probed[name] = found
+        return found
+
+    def build(self):
+        """
+        Lists the indexed templates of every configured loader.
+        """
+        with self._lock:
+            names = set()
+            complete = True
+            for engine in engines.all():
+                template_loaders = getattr(
+                    getattr(engine, "engine", None), "template_loaders", None)
+                if template_loaders is None:
+                    complete = False
+                    continue
+                for template_loader in template_loaders:
+                    complete &= self._add_loader(template_loader, names)
+
+            self._index = (frozenset(names), complete, {})
+            return self._index
+
+    def reload(self):
+        """
+        Discards the index, so it is rebuilt on the next lookup.  Called
+        automatically when settings or watched files change in development.
+        """
+        self._index = None
+
+    def _add_loader(self, template_loader, names):
+        """
+        Adds the indexed templates a loader can supply to names.  Returns
+        False if the loader's templates can't be listed.
+        """
+        if hasattr(template_loader, "loaders"):
+            complete = True
+            for child in template_loader.loaders:
+                complete &= self._add_loader(child, names)
+            return complete
+
+        if hasattr(template_loader, "templates"):
+            names.update(name for name in template_loader.templates
+                         if name.startswith(self.prefixes))
+            return True
+
+        if not hasattr(template_loader, "get_dirs"):
+            return False
+
+        for directory in template_loader.get_dirs():
+            directory = str(directory)
+            for prefix in self.prefixes:
+                root = os.path.join(directory, prefix)
+                for path, dirs, files in os.walk(root):
+                    for filename in files:
+                        names.add(os.path.relpath(
+                            os.path.join(path, filename),
+                            directory).replace(os.sep, "/"))
+        return True
+
+
+template_index = TemplateIndex()
+
+
+@receiver(setting_changed)
+def reload_template_index(sender, setting, **kwargs):
+    if setting in ("TEMPLATES", "INSTALLED_APPS"):
+        template_index.reload()
+
+
+@receiver(file_changed)
+def template_file_changed(sender, file_path, **kwargs):
+    template_index.reload()
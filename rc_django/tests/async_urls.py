@@ -0,0 +1,11 @@
+# Copyright 2025 UW-IT, University of Washington
+# SPDX-License-Identifier: Apache-2.0
+
+from django.urls import re_path
+from rc_django.views.rest_proxy import AsyncRestProxyView
+from rc_django.urls import urlpatterns
+
+urlpatterns = [
+    re_path(r'^view/(\w+)/(.*)$',
+            AsyncRestProxyView.as_view(), name="restclients_proxy"),
+] + urlpatterns
@@ -0,0 +1,449 @@
+# Copyright 2025 UW-IT, University of Washington
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+Benchmarks for the proxy formatting, middleware and view hot paths.
+
+    python -m rc_django.tests.performance.benchmark [size ...]
+        [--iterations N] [--only NAME] [--json FILE]
+
+Sizes are bytes, with an optional k or m suffix (e.g. 1k 10m 50m); bare
+numbers are megabytes.  Everything runs offline, against a mock DAO, and
+without a settings module a minimal Django configuration is used.
+
+Reports wall time, throughput and peak traced allocation for each case.
+With --json, results are also written as JSON ("-" for stdout), for
+comparing releases.
+"""
+
+from django.conf import settings
+from restclients_core.dao import DAO, MockDAO
+from restclients_core.models import MockHTTP
+from rc_django.codec import CODECS, orjson
+from rc_django.formatters import JSONFormatter
+from rc_django.tests.test_formatters import legacy_format_json
+from time import perf_counter
+import argparse
+import json
+import os
+import platform
+import sys
+import tracemalloc
+
+SERVICE = "benchmark"
+DEFAULT_SIZES = ("1k", "100k", "1m", "10m", "50m")
+
+# Timed runs of each case; the best is reported
+ROUNDS = 3
+
+# Objects deep, within the json module's recursion limit
+NESTING_DEPTH = 200
+
+# Bodies served by the mock DAO, by URL
+PAYLOADS = {}
+
+# Modules that need Django set up are imported by the benchmarks using them
+
+
+class BENCHMARK_DAO(DAO):
+    def service_name(self):
+        return SERVICE
+
+    def get_default_service_setting(self, key):
+        if "DAO_CLASS" == key:
+            return "rc_django.tests.performance.benchmark.Backend"
+
+
+class Backend(MockDAO):
+    def load(self, method, url, headers, body):
+        response = MockHTTP()
+        response.status = 200 if url in PAYLOADS else 404
+        response.data = PAYLOADS.get(url, "")
+        return response
+
+
+def configure():
+    """
+    Configures Django for running outside of a project.
+    """
+    if settings.configured:
+        return
+    settings.configure(
+        SECRET_KEY="benchmark",
+        ROOT_URLCONF="rc_django.urls",
+        INSTALLED_APPS=[
+            "django.contrib.auth", "django.contrib.contenttypes",
+            "django.contrib.sessions", "userservice", "rc_django"],
+        CACHES={"default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+        SESSION_ENGINE="django.contrib.sessions.backends.cache",
+        TEMPLATES=[{
+            "BACKEND": "django.template.backends.django.DjangoTemplates",
+            "APP_DIRS": True,
+            "OPTIONS": {"context_processors": [
+                "django.template.context_processors.request"]},
+        }],
+    )
+    import django
+    django.setup()
+
+
+def json_payload(size):
+    """
+    Returns a parsed document, shaped like an SWS search result, whose
+    serialized form is roughly size bytes.
+    """
+    entry = {
+        "Href": "/student/v5/course/2025,autumn,CSE,142/A.json",
+        "CourseTitle": "COMPUTER PROGRAMMING I",
+        "Curriculum": {"CurriculumAbbreviation": "CSE",
+                       "Href": "/student/v5/curriculum/2025,autumn,CSE.json"},
+        "Credits": 4.0,
+        "SectionID": "A",
+        "Instructors": [{"Name": "Bill Teacher & <Staff>", "RegID": None}],
+        "Active": True,
+    }
+    count = max(1, size // len(json.dumps(entry)))
+    return {"Current": {"Href": "/student/v5/section.json?page=1"},
+            "Sections": [dict(entry, Index=i) for i in range(count)]}
+
+
+def nested_json_payload(depth):
+    """
+    Returns a parsed document nested depth objects deep.
+    """
+    document = {"Href": "/student/v5/leaf.json"}
+    for level in range(depth):
+        document = {"Level": level, "Items": [document],
+                    "Href": "/student/v5/level/{}.json".format(level)}
+    return document
+
+
+def html_payload(size, links=1, styles=0):
+    """
+    Returns an HTML page of roughly size bytes, like a directory listing.
+    Each row has links root-relative links, and every row is followed by
+    styles <style> blocks.
+    """
+    row = "<tr><td>{0}</td><td>" + " ".join(
+        '<a href="/hfs/v1/path/{{0}}/{}">item</a>'.format(i)
+        for i in range(links)) + "</td></tr>" + "".join(
+        "<style>td.n{{0}}_{} {{{{ color: #333; }}}}</style>".format(i)
+        for i in range(styles))
+    rows = []
+    total = 0
+    while total < size:
+        rows.append(row.format(len(rows)))
+        total += len(rows[-1])
+    return ("<html><head><title>Listing</title></head><body><table>" +
+            "".join(rows) + "</table></body></html>")
+
+
+def payloads(size):
+    """
+    Returns the (name, body) payloads of a size, as served upstream.
+    """
+    return [
+        ("json", json.dumps(json_payload(size))),
+        ("html", html_payload(size)),
+        ("html_links", html_payload(size, links=20)),
+        ("html_styles", html_payload(size, links=0, styles=5)),
+    ]
+
+
+def measure(func, *args):
+    """
+    Returns the best wall time of rounds runs of func(*args), and its peak
+    allocation measured in a further, traced run.
+    """
+    elapsed = None
+    for _ in range(ROUNDS):
+        start = perf_counter()
+        func(*args)
+        took = perf_counter() - start
+        elapsed = took if elapsed is None else min(elapsed, took)
+
+    tracemalloc.start()
+    func(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def result(bench, case, size, ops, elapsed, peak):
+    """
+    A result for ops runs over size bytes of payload, taking elapsed
+    seconds in total.
+    """
+    return {
+        "benchmark": bench,
+        "case": case,
+        "size": size,
+        "ops": ops,
+        "seconds": elapsed,
+        "ops_per_second": ops / elapsed if elapsed else None,
+        "mb_per_second": (size * ops / elapsed / 1024 / 1024
+                          if size and elapsed else None),
+        "peak_bytes": peak,
+        "rounds": ROUNDS,
+    }
+
+
+def repeat(func, iterations):
+    def run(*args):
+        for _ in range(iterations):
+            func(*args)
+    return run
+
+
+def get_proxy(body):
+    """
+    Returns a RestProxy holding body as its response.
+    """
+    from rc_django.models import RestProxy
+    proxy = RestProxy(SERVICE)
+    proxy.response = MockHTTP()
+    proxy.response.status = 200
+    proxy.response.data = body
+    return proxy
+
+
+def bench_format_json(size, iterations):
+    document = json_payload(size)
+    formatter = JSONFormatter("/view/sws")
+    return [result("format_json", name, size, 1, *measure(func, *args))
+            for name, func, args in (
+                ("legacy", legacy_format_json, (document, "/view/sws")),
+                ("single_pass", formatter.render, (document,)))]
+
+
+def bench_codecs(size, iterations):
+    document = json_payload(size)
+    encoded = json.dumps(document)
+    results = []
+    for name, codec_class in CODECS.items():
+        if name == "orjson" and orjson is None:
+            continue
+        codec = codec_class()
+        results.append(result("codecs", "{}.loads".format(name), size, 1,
+                              *measure(codec.loads, encoded)))
+        results.append(result("codecs", "{}.dumps".format(name), size, 1,
+                              *measure(codec.dumps, document, True)))
+    return results
+
+
+def bench_proxy(size, iterations):
+    """
+    RestProxy's formatting of each payload, including the JSON parse.
+    """
+    results = []
+    for name, body in payloads(size):
+        if name == "json":
+            results.append(result("proxy", "format_json", size, 1, *measure(
+                lambda: get_proxy(body).format_json())))
+            results.append(result("proxy", "json", size, 1, *measure(
+                lambda: get_proxy(body).json)))
+        else:
+            results.append(result("proxy", "format_" + name, size, 1,
+                                  *measure(lambda: get_proxy(body).formatted)))
+    return results
+
+
+def bench_nesting(size, iterations):
+    """
+    RestProxy's formatting of a deeply nested document.
+    """
+    body = json.dumps(nested_json_payload(NESTING_DEPTH))
+    return [result("nesting", "format_json", len(body), 1,
+                   *measure(lambda: get_proxy(body).format_json())),
+            result("nesting", "json", len(body), 1,
+                   *measure(lambda: get_proxy(body).json))]
+
+
+def bench_dao(size, iterations):
+    """
+    Service DAO lookups, which every proxy request makes.
+    """
+    from rc_django.models import DAORegistry
+    return [result("dao", "lookup", 0, iterations, *measure(
+        repeat(DAORegistry.get_dao, iterations), SERVICE))]
+
+
+def bench_middleware(size, iterations):
+    """
+    EnableServiceDegradationMiddleware, for requests with and without
+    degradations in their session.
+    """
+    from django.contrib.sessions.backends.cache import SessionStore
+    from django.http import HttpResponse
+    from django.test import RequestFactory
+    from rc_django.middleware import (
+        EnableServiceDegradationMiddleware, DEGRADATION_COOKIE,
+        DEGRADATION_COOKIE_SALT)
+    from rc_django.models import DegradePerformance
+
+    session = SessionStore()
+    problems = DegradePerformance()
+    problems.set_status(SERVICE, "500")
+    session["RESTCLIENTS_ERRORS"] = problems.serialize()
+    session.save()
+    marker = HttpResponse()
+    marker.set_signed_cookie(DEGRADATION_COOKIE, "1",
+                             salt=DEGRADATION_COOKIE_SALT)
+
+    def get_request(marked):
+        request = RequestFactory().get("/")
+        if marked:
+            request.COOKIES[DEGRADATION_COOKIE] = (
+                marker.cookies[DEGRADATION_COOKIE].value)
+        return request
+
+    def call(requests):
+        for request in requests:
+            # Each run loads the session afresh
+            request.session = SessionStore(session.session_key)
+            middleware(request)
+
+    middleware = EnableServiceDegradationMiddleware(lambda r: HttpResponse())
+    results = []
+    for case, marked in (("unmarked", False), ("marked", True)):
+        requests = [get_request(marked) for _ in range(iterations)]
+        results.append(result("middleware", case, 0, iterations,
+                              *measure(call, requests)))
+    return results
+
+
+def bench_view(size, iterations):
+    """
+    The full RestProxyView: fetching from the mock DAO, formatting and
+    rendering the page.
+    """
+    from django.test import RequestFactory
+    from django.urls import reverse
+    from rc_django.views.rest_proxy import RestProxyView
+
+    class BenchmarkView(RestProxyView):
+        # Skips the UserService, which needs its middleware
+        def get_user_options(self, service, headers):
+            return service, False, None
+
+    def render(url):
+        request = RequestFactory().get(reverse(
+            "restclients_proxy", args=[SERVICE, url[1:]]))
+        view = BenchmarkView()
+        view.setup(request)
+        response = view.get(request, SERVICE, url[1:])
+        if response.status_code != 200:
+            raise RuntimeError("{} returned {}".format(
+                url, response.status_code))
+        if hasattr(response, "render"):
+            response.render()
+        else:
+            b"".join(response.streaming_content)
+
+    results = []
+    for name, body in payloads(size):
+        url = "/benchmark/{}/{}".format(name, size)
+        PAYLOADS[url] = body
+        try:
+            results.append(result("view", name, size, 1,
+                                  *measure(render, url)))
+        finally:
+            del PAYLOADS[url]
+    return results
+
+
+BENCHMARKS = (bench_format_json, bench_codecs, bench_proxy, bench_nesting,
+              bench_dao, bench_middleware, bench_view)
+
+# Benchmarks that don't depend on payload size
+SIZELESS = (bench_nesting, bench_dao, bench_middleware)
+
+
+def parse_size(value):
+    """
+    Parses 1024, 1k or 1m; numbers without a suffix are megabytes.
+    """
+    value = value.strip().lower()
+    if value.endswith("k"):
+        return int(float(value[:-1]) * 1024)
+    if value.endswith("m"):
+        return int(float(value[:-1]) * 1024 * 1024)
+    return int(float(value) * 1024 * 1024)
+
+
+def run(sizes, iterations=1000, only=None, rounds=3):
+    """
+    Runs the benchmarks, or those named in only, at each size.  Benchmarks
+    that don't depend on payload size run once.
+    """
+    global ROUNDS
+    ROUNDS = rounds
+    configure()
+    results = []
+    for bench in BENCHMARKS:
+        name = bench.__name__[6:]
+        if only and name not in only:
+            continue
+        for size in (sizes[:1] if bench in SIZELESS else sizes):
+            results.extend(bench(size, iterations))
+    return results
+
+
+def environment():
+    import django
+    with open(os.path.join(os.path.dirname(__file__), "..", "..",
+                           "VERSION")) as f:
+        version = f.read().strip()
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "django": django.get_version(),
+        "rc_django": version,
+        "orjson": orjson is not None,
+    }
+
+
+def print_results(results, out=sys.stdout):
+    for r in results:
+        rate = ("{:10.1f}MB/s".format(r["mb_per_second"])
+                if r["mb_per_second"] is not None else
+                "{:10.0f}op/s".format(r["ops_per_second"] or 0))
+        out.write("{:<12} {:<20} {:>10} {:8.3f}s {} {:10.1f}MB\n".format(
+            r["benchmark"], r["case"], r["size"], r["seconds"], rate,
+            r["peak_bytes"] / 1024 / 1024))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark the proxy hot paths.")
+    parser.add_argument("sizes", nargs="*", default=DEFAULT_SIZES,
+                        help="payload sizes, e.g. 1k 10m 50m")
+    parser.add_argument("--iterations", type=int, default=1000,
+                        help="runs of the per-request benchmarks")
+    parser.add_argument("--rounds", type=int, default=3,
+                        help="timed runs of each case, keeping the best")
+    parser.add_argument("--only", action="append", help=(
+        "run only the named benchmarks: " + ", ".join(
+            bench.__name__[6:] for bench in BENCHMARKS)))
+    parser.add_argument("--json", help="write results as JSON to a file, "
+                        "or - for stdout")
+    args = parser.parse_args(argv)
+
+    results = run([parse_size(s) for s in args.sizes], args.iterations,
+                  args.only, args.rounds)
+    if args.json == "-":
+        json.dump({"environment": environment(), "results": results},
+                  sys.stdout, indent=2)
+        return
+    print_results(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"environment": environment(), "results": results},
+                      f, indent=2)
+
+
+if __name__ == "__main__":
+    # The mock DAO serves PAYLOADS from the importable module, not __main__
+    from rc_django.tests.performance.benchmark import main
+    main()
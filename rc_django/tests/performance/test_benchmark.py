@@ -0,0 +1,35 @@
+# Copyright 2025 UW-IT, University of Washington
+# SPDX-License-Identifier: Apache-2.0
+
+
+from django.test import TestCase
+from rc_django.tests.performance.benchmark import (
+    BENCHMARKS, html_payload, nested_json_payload, parse_size, run)
+import json
+
+
+class BenchmarkTest(TestCase):
+    def test_payloads(self):
+        self.assertEqual(parse_size("1k"), 1024)
+        self.assertEqual(parse_size("50m"), 50 * 1024 * 1024)
+        self.assertEqual(parse_size("0.5"), 512 * 1024)
+
+        page = html_payload(4096, links=3, styles=2)
+        self.assertGreaterEqual(len(page), 4096)
+        self.assertEqual(page.count("<style>"), 2 * page.count("<tr>"))
+        self.assertEqual(page.count("<a href="), 3 * page.count("<tr>"))
+
+        self.assertEqual(json.dumps(nested_json_payload(10)).count(
+            '"Level"'), 10)
+
+    def test_run(self):
+        results = run([1024], iterations=5, rounds=1)
+        self.assertEqual(
+            {r["benchmark"] for r in results},
+            {bench.__name__[6:] for bench in BENCHMARKS})
+        for r in results:
+            self.assertGreater(r["seconds"], 0)
+            self.assertIsNotNone(r["ops_per_second"])
+
+        # Results are machine readable
+        self.assertEqual(json.loads(json.dumps(results)), results)
@@ -2,6 +2,7 @@
 # SPDX-License-Identifier: Apache-2.0
 
 
+from django.http import HttpResponse
 from django.test import TestCase, RequestFactory
 from django.test.utils import override_settings
 from django.urls import reverse
@@ -11,9 +12,15 @@ from django.contrib.auth.models import User
 from userservice.user import UserServiceMiddleware
 from restclients_core.dao import DAO, MockDAO
 from restclients_core.models import MockHTTP
+from restclients_core.exceptions import DataFailureException
+from restclients_core.util.performance import PerformanceDegradation
+from rc_django.models import DegradePerformance, RestProxy
 from rc_django.views.errors import DegradePerformanceView
 from rc_django.middleware import EnableServiceDegradationMiddleware
 from rc_django.tests.test_views import missing_url
+from threading import Event, Thread
+from urllib3.exceptions import (
+    EmptyPoolError, MaxRetryError, ReadTimeoutError)
 import time
 import mock
 
@@ -88,3 +95,128 @@ class DegradedTestCase(TestCase):
 
         response = client.getURL("/test", {})
         self.assertEqual(response.status, 200)
+
+    @override_settings(
+        RESTCLIENTS_ADMIN_AUTH_MODULE='rc_django.tests.can_proxy_restclient')
+    def test_url_rules(self):
+        User.objects.create_user(username='rule_user', password='pass')
+        self.client.login(username='rule_user', password='pass')
+        response = self.client.post(reverse("restclients_errors"), {
+            "new_rule_service": "delay",
+            "new_rule_pattern": "/slow/",
+            "new_rule_match": "prefix",
+            "new_rule_status": 503,
+        })
+        self.assertIn(b"/slow/", response.content)
+
+        request = RequestFactory().get("/")
+        request.session = self.client.session
+        request.COOKIES = {
+            k: v.value for k, v in self.client.cookies.items()}
+        EnableServiceDegradationMiddleware(mock.MagicMock()).process_request(
+            request)
+
+        client = DELAY_DAO()
+        self.assertEqual(client.getURL("/slow/test", {}).status, 503)
+        self.assertEqual(client.getURL("/fast/test", {}).status, 200)
+
+        # Invalid patterns are reported
+        response = self.client.post(reverse("restclients_errors"), {
+            "keep_delay": "on",
+            "keep_rule_delay_0": "on",
+            "new_rule_service": "delay",
+            "new_rule_pattern": "(",
+            "new_rule_match": "regex",
+        })
+        self.assertIn(b"Invalid pattern", response.content)
+
+        # So are invalid values, which are left unchanged
+        response = self.client.post(reverse("restclients_errors"), {
+            "keep_delay": "on",
+            "keep_rule_delay_0": "on",
+            "delay_load_time": "uniform 2 1",
+            "delay_error_rate": "0.5",
+        })
+        self.assertIn(b"delay: uniform min", response.content)
+        self.assertIn(b'name="delay_error_rate" value="0.5"',
+                      response.content)
+
+        response = self.client.post(reverse("restclients_errors"), {
+            "keep_delay": "on",
+        })
+        self.assertNotIn(b"/slow/", response.content)
+        EnableServiceDegradationMiddleware(mock.MagicMock()).process_response(
+            request, HttpResponse())
+
+
+class FaultTestCase(TestCase):
+    def tearDown(self):
+        PerformanceDegradation.clear_problems()
+
+    def degrade(self, **values):
+        problems = DegradePerformance()
+        problems.add_rule("delay", "/", **values)
+        PerformanceDegradation.set_problems(problems)
+        return problems
+
+    def test_timeout(self):
+        self.degrade(timeout="read", load_time=0.05)
+        t1 = time.time()
+        with self.assertRaises(DataFailureException) as cm:
+            DELAY_DAO().getURL("/test", {})
+        self.assertGreater(time.time() - t1, 0.04)
+        self.assertEqual(cm.exception.status, 0)
+        self.assertIsInstance(cm.exception.msg, MaxRetryError)
+        self.assertIsInstance(cm.exception.msg.reason, ReadTimeoutError)
+
+        proxy = RestProxy("delay")
+        self.assertEqual(proxy.get_api_response("/test").status, 0)
+        self.assertIn("Read timed out", proxy.formatted)
+
+    def test_truncate(self):
+        self.degrade(truncate="50%")
+        self.assertEqual(DELAY_DAO().getURL("/test", {}).data, "o")
+
+        self.degrade(truncate=0, error_rate=0)
+        self.assertEqual(DELAY_DAO().getURL("/test", {}).data, "ok")
+
+        self.degrade(content="[{}]", truncate=2)
+        response = DELAY_DAO().getURL("/test", {})
+        self.assertEqual(response.status, 200)
+        self.assertEqual(response.data, "[{")
+
+    def test_throughput(self):
+        self.degrade(throughput=20)
+        t1 = time.time()
+        self.assertEqual(DELAY_DAO().getURL("/test", {}).data, "ok")
+        self.assertGreater(time.time() - t1, 0.09)
+
+    @override_settings(RESTCLIENTS_DELAY_CONNECT_TIMEOUT=0.05)
+    def test_pool_size(self):
+        self.degrade(pool_size=0)
+        with self.assertRaises(DataFailureException) as cm:
+            DELAY_DAO().getURL("/test", {})
+        self.assertEqual(cm.exception.status, 0)
+        self.assertIsInstance(cm.exception.msg, EmptyPoolError)
+
+        problems = self.degrade(pool_size=1)
+        loading, release = Event(), Event()
+
+        def load(*args):
+            loading.set()
+            release.wait(5)
+            return MockHTTP()
+
+        def request():
+            PerformanceDegradation.set_problems(problems)
+            DELAY_DAO().getURL("/test", {})
+
+        with mock.patch.object(Backend, "load", side_effect=load):
+            thread = Thread(target=request)
+            thread.start()
+            loading.wait(5)
+            self.assertRaises(DataFailureException,
+                              DELAY_DAO().getURL, "/test", {})
+            release.set()
+            thread.join()
+            DELAY_DAO().getURL("/test", {})
@@ -0,0 +1,92 @@
+# Copyright 2025 UW-IT, University of Washington
+# SPDX-License-Identifier: Apache-2.0
+
+
+from django.test import TestCase
+from django.test.utils import override_settings
+from django.core.exceptions import ImproperlyConfigured
+from rc_django.codec import get_codec, JSONCodec, ORJSONCodec
+from rc_django.models import RestProxy
+from restclients_core.models import MockHTTP
+import json
+import mock
+import unittest
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class CodecTest(TestCase):
+    documents = [
+        '{"b": [1, 2.5, -0.0, true, null], "a": {"z": "\\u00e9", "y": "/x"}}',
+        '[12345678901234567890123456789, NaN, "\\ud83d\\ude00"]',
+        '"string"',
+    ]
+
+    def assertCodec(self, codec):
+        for document in self.documents:
+            parsed = json.loads(document)
+            self.assertEqual(codec.loads(document), parsed)
+            self.assertEqual(codec.loads(document.encode("utf-8")), parsed)
+
+            # Same keys, same order, same values
+            encoded = codec.dumps(parsed, sort_keys=True)
+            self.assertEqual(
+                json.dumps(json.loads(encoded), sort_keys=True),
+                json.dumps(parsed, sort_keys=True))
+
+        self.assertRaises(ValueError, codec.loads, "<html>")
+
+    def test_json(self):
+        self.assertCodec(JSONCodec())
+
+    @unittest.skipIf(orjson is None, "orjson is not installed")
+    def test_orjson(self):
+        self.assertCodec(ORJSONCodec())
+
+    def test_get_codec(self):
+        with override_settings(RESTCLIENTS_JSON_CODEC="json"):
+            self.assertEqual(get_codec().name, "json")
+
+        with override_settings(RESTCLIENTS_JSON_CODEC="orjson"), mock.patch(
+                "rc_django.codec.orjson", None), self.assertLogs(
+                    "rc_django.codec", "WARNING"):
+            self.assertEqual(get_codec().name, "json")
+
+        with override_settings(RESTCLIENTS_JSON_CODEC="fast"):
+            self.assertRaises(ImproperlyConfigured, get_codec)
+
+        with override_settings(RESTCLIENTS_JSON_CODEC=None):
+            self.assertEqual(get_codec().name,
+                             "json" if orjson is None else "orjson")
+
+    def test_proxy_json(self):
+        response = MockHTTP()
+        response.data = '{"b": "\\u00e9", "a": [1, 2]}'
+        proxy = RestProxy("pws")
+        proxy.response = response
+
+        for name in ("json", "orjson"):
+            with override_settings(RESTCLIENTS_JSON_CODEC=name):
+                self.assertEqual(json.loads(proxy.json),
+                                 {"a": [1, 2], "b": "é"})
+                self.assertTrue(proxy.json.startswith('{"a":'))
+
+    def test_same_output(self):
+        response = MockHTTP()
+        response.data = ('{"a": "\\u00e9", "b": NaN, "c": [1, 2.5, 1e16], '
+                         '"d": "/x"}')
+        proxy = RestProxy("pws")
+        proxy.response = response
+
+        outputs = []
+        for name in ("json", "orjson"):
+            with override_settings(RESTCLIENTS_JSON_CODEC=name):
+                proxy._document_source = None
+                outputs.append(proxy.json)
+                self.assertEqual(proxy.json, "".join(proxy.iter_json()))
+        self.assertEqual(outputs, [
+            '{"a": "\\u00e9", "b": NaN, "c": [1, 2.5, 1e+16], "d": "/x"}'
+        ] * 2)
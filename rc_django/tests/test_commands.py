@@ -0,0 +1,124 @@
+# Copyright 2025 UW-IT, University of Washington
+# SPDX-License-Identifier: Apache-2.0
+
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import override_settings
+from rc_django.management.commands.restclients_replay import (
+    Schedule, parse_line)
+from rc_django.tests.test_views import get_user
+from io import StringIO
+from tempfile import NamedTemporaryFile
+import json
+import time
+
+
+class ReplayMixin(object):
+    def replay(self, lines, *args):
+        with NamedTemporaryFile("w", suffix=".log") as f:
+            f.write("\n".join(lines))
+            f.flush()
+            out = StringIO()
+            call_command("restclients_replay", f.name, "--json", *args,
+                         stdout=out)
+        return json.loads(out.getvalue())
+
+
+class ReplayCommandTest(ReplayMixin, TestCase):
+    def test_parse_line(self):
+        self.assertEqual(parse_line("sws/student/v5/term/current.json\n"),
+                         ("sws", "/student/v5/term/current.json"))
+        self.assertEqual(parse_line(
+            '10.0.0.1 - - [01/Sep/2025:08:00:00 -0700] "GET /restclients/'
+            'view/pws/identity/v2/person%201.json?a=b HTTP/1.1" 200 512 '
+            '"-" "Mozilla/5.0"'),
+            ("pws", "/identity/v2/person 1.json?a=b"))
+        self.assertIsNone(parse_line(
+            '10.0.0.1 - - [01/Sep/2025:08:00:00 -0700] "GET /static/a.css '
+            'HTTP/1.1" 200 512'))
+        self.assertIsNone(parse_line("# comment"))
+        self.assertIsNone(parse_line("   "))
+
+    def test_schedule(self):
+        schedule = Schedule(["a", "b"])
+        self.assertEqual([schedule.next()[0] for _ in range(2)], ["a", "b"])
+        self.assertIsNone(schedule.next())
+
+        # Requests repeat for the duration, paced to the rate
+        schedule = Schedule(["a", "b"], rate=100, duration=0.05)
+        tasks = []
+        task = schedule.next()
+        while task is not None:
+            tasks.append(task)
+            task = schedule.next()
+        self.assertEqual(len(tasks), 5)
+        self.assertEqual(tasks[4][0], "a")
+        self.assertAlmostEqual(tasks[4][1], 0.04, delta=0.01)
+
+    def test_proxy(self):
+        lines = ["test/v1/a", "test_json/v1/b", "fake/v1/c", "# comment"]
+        for args in ([], ["--asyncio"]):
+            report = self.replay(lines, "--concurrency", "2", *args)
+            self.assertEqual(report["requests"], 3)
+            self.assertEqual(report["errors"], {"Missing service": 1})
+            self.assertEqual(report["services"]["test"]["requests"], 1)
+            self.assertIsNotNone(report["latency"]["p99"])
+            self.assertGreater(report["throughput"], 0)
+
+    def test_profile(self):
+        for args in ([], ["--asyncio"]):
+            report = self.replay(
+                ["test/v1/a", "test_json/v1/b"], "--profile",
+                '{"test": {"status": "500", "content": "down"}}', *args)
+            self.assertEqual(report["errors"], {"HTTP 500": 1})
+            self.assertEqual(report["services"]["test"]["errors"],
+                             {"HTTP 500": 1})
+
+        with self.assertRaises(CommandError):
+            self.replay(["test/v1/a"], "--profile", "missing")
+
+    def test_rate(self):
+        start = time.monotonic()
+        report = self.replay(["test/v1/a"], "--rate", "50",
+                             "--duration", "0.2", "--concurrency", "4")
+        self.assertGreaterEqual(time.monotonic() - start, 0.18)
+        self.assertEqual(report["target_rate"], 50)
+        self.assertAlmostEqual(report["requests"], 10, delta=1)
+
+    def test_invalid(self):
+        with self.assertRaises(CommandError):
+            self.replay(["# nothing"])
+        with self.assertRaises(CommandError):
+            self.replay(["test/v1/a"], "--concurrency", "0")
+
+
+# Workers' database connections only see committed users and sessions
+class ReplayViewTest(ReplayMixin, TransactionTestCase):
+    @override_settings(
+        RESTCLIENTS_ADMIN_AUTH_MODULE='rc_django.tests.can_proxy_restclient',
+        ALLOWED_HOSTS=[".example.edu"])
+    def test_view(self):
+        lines = ["test/v1/a", "secret/v1/b", "fake/v1/c"]
+        with self.assertRaises(CommandError):
+            self.replay(lines, "--view")
+        self.assertFalse(User.objects.exists())
+
+        get_user("restclients_replay")
+        for args in ([], ["--asyncio"]):
+            report = self.replay(lines, "--view", *args)
+            self.assertEqual(report["requests"], 3)
+            self.assertEqual(report["errors"], {
+                "HTTP 401": 1, "HTTP 404": 1})
+
+        # The host reaches the view from threads and asyncio tasks alike
+        for args in ([], ["--asyncio"]):
+            report = self.replay(lines, "--view", "--host", "other.edu",
+                                 *args)
+            self.assertEqual(report["errors"], {"HTTP 400": 3})
+            report = self.replay(lines, "--view", "--host", "a.example.edu",
+                                 *args)
+            self.assertEqual(report["errors"], {
+                "HTTP 401": 1, "HTTP 404": 1})
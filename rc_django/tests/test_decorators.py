@@ -0,0 +1,87 @@
+# Copyright 2025 UW-IT, University of Washington
+# SPDX-License-Identifier: Apache-2.0
+
+
+from django.test import TestCase
+from django.test.utils import override_settings
+from django.urls import reverse
+from rc_django.decorators import (
+    get_auth_func, get_auth_cache, clear_auth_cache, AuthDecisionCache,
+    DjangoAuthDecisionCache)
+from rc_django.tests.test_views import get_user, get_user_pass
+import mock
+
+AUTH_MODULE = 'rc_django.tests.can_proxy_restclient'
+
+
+@override_settings(RESTCLIENTS_ADMIN_AUTH_MODULE=AUTH_MODULE)
+class AdminRequiredTest(TestCase):
+    def setUp(self):
+        self.user = get_user('test_view')
+        self.client.login(username='test_view',
+                          password=get_user_pass('test_view'))
+
+    def patch_auth(self, allowed):
+        return mock.patch("rc_django.decorators.get_auth_func",
+                          return_value=mock.Mock(return_value=allowed))
+
+    def get(self, service):
+        return self.client.get(
+            reverse("restclients_proxy", args=[service, "test/v1"]))
+
+    def test_auth_func(self):
+        func = get_auth_func()
+        with mock.patch("rc_django.decorators.import_string") as imp:
+            self.assertIs(get_auth_func(), func)
+            self.assertEqual(imp.call_count, 0)
+
+        with self.settings(RESTCLIENTS_ADMIN_AUTH_MODULE=(
+                'rc_django.tests.test_decorators.deny')):
+            self.assertEqual(get_auth_func(), deny)
+            self.assertEqual(self.get("test").status_code, 401)
+
+    def test_uncached(self):
+        self.assertIsNone(get_auth_cache())
+        with self.patch_auth(True) as auth:
+            self.get("test")
+            self.get("test")
+            self.assertEqual(auth.return_value.call_count, 2)
+
+    @override_settings(RESTCLIENTS_ADMIN_AUTH_CACHE_TTL=60)
+    def test_memory_cache(self):
+        self.assertIsInstance(get_auth_cache(), AuthDecisionCache)
+        self.assertDecisionsCached()
+
+    @override_settings(RESTCLIENTS_ADMIN_AUTH_CACHE_TTL=60,
+                       RESTCLIENTS_ADMIN_AUTH_CACHE_ALIAS="default")
+    def test_django_cache(self):
+        self.assertIsInstance(get_auth_cache(), DjangoAuthDecisionCache)
+        self.assertDecisionsCached()
+
+    def assertDecisionsCached(self):
+        clear_auth_cache()
+        with self.patch_auth(False) as auth:
+            self.assertEqual(self.get("test").status_code, 401)
+            self.assertEqual(self.get("test").status_code, 401)
+            self.assertEqual(auth.return_value.call_count, 1)
+
+            # Decisions are per service
+            self.get("test_sub")
+            self.assertEqual(auth.return_value.call_count, 2)
+
+            clear_auth_cache(self.user)
+            auth.return_value.return_value = True
+            self.assertEqual(self.get("test").status_code, 200)
+            self.assertEqual(auth.return_value.call_count, 3)
+
+            clear_auth_cache(get_user('other').pk)
+            self.get("test")
+            self.assertEqual(auth.return_value.call_count, 3)
+
+            clear_auth_cache()
+            self.get("test")
+            self.assertEqual(auth.return_value.call_count, 4)
+
+
+def deny(request, service, url):
+    return False
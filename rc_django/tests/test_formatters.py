@@ -0,0 +1,207 @@
+# Copyright 2025 UW-IT, University of Washington
+# SPDX-License-Identifier: Apache-2.0
+
+
+from django.test import TestCase
+from rc_django.formatters import (
+    JSONFormatter, JSONTreeFormatter, HTMLFormatter, resolve_pointer)
+from time import perf_counter
+import json
+import mock
+import random
+import re
+
+
+def legacy_format_json(document, link_prefix):
+    """
+    The multi-pass implementation JSONFormatter replaces.
+    """
+    formatted = json.dumps(document, sort_keys=True, indent=4)
+    formatted = formatted.replace("&", "&amp;")
+    formatted = formatted.replace("<", "&lt;")
+    formatted = formatted.replace(">", "&gt;")
+    formatted = formatted.replace(" ", "&nbsp;")
+    formatted = formatted.replace("\n", "<br/>\n")
+    return re.sub(r"\"/(.*?)\"",
+                  r'"<a href="{}/\1">/\1</a>"'.format(link_prefix),
+                  formatted)
+
+
+def random_document(rng, depth=0):
+    pieces = ['/', '"', '\\', ' ', '&', '<', '>', 'a', 'Z', 'é',
+              '\n', '&nbsp;', '/api/v1', '☃']
+    kind = rng.randint(0, 9 if depth < 4 else 6)
+    if kind == 0:
+        return None
+    if kind == 1:
+        return rng.choice([True, False])
+    if kind == 2:
+        return rng.randint(-10 ** 6, 10 ** 20)
+    if kind == 3:
+        return rng.choice([rng.random() * 10 ** rng.randint(-5, 30), -0.0])
+    if kind <= 6:
+        return "".join(rng.choice(pieces) for i in range(rng.randint(0, 8)))
+    if kind <= 8:
+        return {str(random_document(rng, 5)): random_document(rng, depth + 1)
+                for i in range(rng.randint(0, 4))}
+    return [random_document(rng, depth + 1) for i in range(rng.randint(0, 4))]
+
+
+class JSONFormatterTest(TestCase):
+    def setUp(self):
+        self.formatter = JSONFormatter("/view/pws")
+
+    def assertLegacy(self, document):
+        self.assertEqual(self.formatter.render(document),
+                         legacy_format_json(document, "/view/pws"))
+
+    def test_render(self):
+        self.assertEqual(
+            self.formatter.render({"Href": "/identity/v2/entity.json"}),
+            ('{<br/>\n&nbsp;&nbsp;&nbsp;&nbsp;"Href":&nbsp;'
+             '"<a href="/view/pws/identity/v2/entity.json">'
+             '/identity/v2/entity.json</a>"<br/>\n}'))
+
+    def test_legacy_equivalence(self):
+        self.assertLegacy({})
+        self.assertLegacy([])
+        self.assertLegacy({"a": [], "b": {}, "c": [1, {"x": None}]})
+        self.assertLegacy([1.5, -0.0, 1e100, float("nan"), float("inf"),
+                           -float("inf"), True, False, None, 10 ** 30])
+        self.assertLegacy({"/key": "/value", "b": "<b>&nbsp;</b>"})
+        self.assertLegacy(['a"/b"c', '/a"b"/c', '"/', '/', 'x /y', 'é'])
+        self.assertLegacy("/top/level")
+        self.assertLegacy(7)
+
+    def test_random_documents(self):
+        rng = random.Random(5)
+        for i in range(500):
+            self.assertLegacy(random_document(rng))
+
+    def test_iterrender(self):
+        document = {"a": [1, 2, {"b": "/c"}], "d": "e"}
+        self.assertEqual("".join(self.formatter.iterrender(document)),
+                         self.formatter.render(document))
+        self.assertEqual(
+            len(list(self.formatter.iterrender(document, chunk_parts=2))), 5)
+
+        # Wide containers of scalars are split too
+        for document in (list(range(20000)),
+                         {str(i): i for i in range(20000)}):
+            chunks = list(self.formatter.iterrender(document,
+                                                    chunk_parts=1000))
+            self.assertEqual(len(chunks), 21)
+            self.assertLess(max(len(chunk) for chunk in chunks), 60000)
+            self.assertEqual("".join(chunks), self.formatter.render(document))
+
+        # Nesting deeper than the recursion limit
+        document = []
+        for i in range(5000):
+            document = [document]
+        self.assertTrue(self.formatter.render(document).endswith("]"))
+
+    def test_unserializable(self):
+        self.assertRaises(TypeError, self.formatter.render, {"a": object()})
+
+
+class JSONTreeFormatterTest(TestCase):
+    def test_resolve_pointer(self):
+        document = {"a/b": {"m~n": [1, {"c": None}]}, "": 2}
+        self.assertIs(resolve_pointer(document, ""), document)
+        self.assertEqual(resolve_pointer(document, "/"), 2)
+        self.assertEqual(resolve_pointer(document, "/a~1b/m~0n/0"), 1)
+        self.assertIsNone(resolve_pointer(document, "/a~1b/m~0n/1/c"))
+        for pointer in ("a~1b", "/a", "/a~1b/m~0n/2", "/a~1b/m~0n/01",
+                        "/a~1b/m~0n/-1", "/a~1b/m~0n/0/x"):
+            with self.assertRaises(KeyError):
+                resolve_pointer(document, pointer)
+
+    def test_render(self):
+        formatter = JSONTreeFormatter("/view/pws", depth=1, max_children=2)
+        document = {"Href": "/v1/a.json", "List": [{"x": 1}, 2, "<b>"],
+                    "Empty": {}, "a/b": {"c": True}}
+        tree = formatter.render(document)
+        self.assertTrue(tree.startswith('<ul class="restclients-tree">'))
+        self.assertIn('"Empty":&nbsp;{}', tree)
+        self.assertIn('"<a href="/view/pws/v1/a.json">/v1/a.json</a>"', tree)
+
+        # Only two children are shown, and the deeper level is left to load
+        self.assertNotIn("List", tree)
+        self.assertIn('data-pointer="" data-start="2">2 more', tree)
+
+        formatter.max_children = 10
+        tree = formatter.render(document)
+        self.assertIn('<details class="restclients-lazy" '
+                      'data-pointer="/List">', tree)
+        self.assertIn('data-pointer="/a~1b">', tree)
+        self.assertIn("[&hellip;] 3 items", tree)
+        self.assertNotIn("&lt;b&gt;", tree)
+
+        items = formatter.render_children(document["List"], "/List", 1)
+        self.assertEqual(items.count("<li>"), 2)
+        self.assertIn('"&lt;b&gt;"', items)
+
+    def test_pages(self):
+        sorted_keys = {}
+        formatter = JSONTreeFormatter("/view/pws", depth=1, max_children=2,
+                                      sorted_keys=sorted_keys)
+        document = {"c": 3, "a": 1, "b": 2, "List": list(range(5))}
+        tree = formatter.render(document)
+        self.assertEqual(sorted_keys, {"": ["List", "a", "b", "c"]})
+        self.assertIn('data-start="2">2 more', tree)
+
+        # Later pages reuse the sorted keys, from any formatter
+        formatter = JSONTreeFormatter("/view/pws", depth=1, max_children=2,
+                                      sorted_keys=sorted_keys)
+        with mock.patch("rc_django.formatters.sorted", create=True) as sort:
+            items = formatter.render_children(document, "", 2)
+        self.assertFalse(sort.called)
+        self.assertIn('"b":&nbsp;2', items)
+        self.assertIn('"c":&nbsp;3', items)
+        self.assertNotIn("more", items)
+
+        items = formatter.render_children(document["List"], "/List", 2)
+        self.assertEqual(items.count("<li>"), 3)
+        self.assertIn('data-start="4">1 more', items)
+        self.assertNotIn("/List", sorted_keys)
+
+
+class HTMLFormatterTest(TestCase):
+    def setUp(self):
+        self.formatter = HTMLFormatter("/view/pws")
+
+    def test_render(self):
+        render = self.formatter.render
+        self.assertEqual(render('<a href="/api/v1/test">x</a>'),
+                         '<a href="/view/pws/api/v1/test">x</a>')
+        self.assertEqual(render("<A Href = '/api'>x</A>"),
+                         '<A href="/view/pws/api">x</A>')
+        self.assertEqual(render('<a href="http://x.edu/api">'),
+                         '<a href="http://x.edu/api">')
+        self.assertEqual(render('<a href="/api\n">'), '<a href="/api\n">')
+
+        # Each style block is dropped on its own
+        self.assertEqual(render('<style>a</style>b<STYLE>c</Style>d'), 'bd')
+        self.assertEqual(render('a<style>b'), 'a<style>b')
+
+        self.assertEqual(render('<div/><div id="1"/><div></div>'), (
+            '<!-- <div/> --><div></div>'
+            '<!-- <div id="1"/> --><div id="1"></div><div></div>'))
+        self.assertEqual(render('<div href="/a"/>'), (
+            '<!-- <div href="/view/pws/a"/> -->'
+            '<div href="/view/pws/a"></div>'))
+        self.assertEqual(render('<DIV/>'), '<DIV/>')
+
+    def test_pathological(self):
+        content = "".join([
+            "<style>" * 100000,
+            "<div " * 100000, ">",
+            "href='/" * 100000,
+            '<p class="x">' * 50000,
+        ])
+        self.assertGreater(len(content), 2 * 1024 * 1024)
+
+        start = perf_counter()
+        rendered = self.formatter.render(content)
+        self.assertLess(perf_counter() - start, 5)
+        self.assertTrue(rendered.startswith("<style><style>"))
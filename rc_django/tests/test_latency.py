@@ -0,0 +1,63 @@
+# Copyright 2025 UW-IT, University of Washington
+# SPDX-License-Identifier: Apache-2.0
+
+
+from django.test import TestCase
+from rc_django.latency import parse_latency, parse_probability
+from random import Random
+
+
+class LatencyTest(TestCase):
+    def test_parse(self):
+        self.assertIsNone(parse_latency(None))
+        self.assertIsNone(parse_latency(""))
+        self.assertIsNone(parse_latency("  "))
+
+        self.assertEqual(str(parse_latency(2.5)), "2.5")
+        self.assertEqual(str(parse_latency("2")), "2")
+        self.assertEqual(str(parse_latency("fixed 2")), "2")
+        self.assertEqual(str(parse_latency("uniform  0.1 2")),
+                         "uniform 0.1 2")
+        self.assertEqual(str(parse_latency("normal 1 0.2")), "normal 1 0.2")
+        self.assertEqual(str(parse_latency("lognormal 0.5 0.8")),
+                         "lognormal 0.5 0.8")
+        self.assertEqual(str(parse_latency("percentiles 95:0.8 50:0.1")),
+                         "percentiles 50:0.1 95:0.8")
+
+    def test_invalid(self):
+        for value in ("slow", "-1", "nan", "inf", "uniform 1",
+                      "uniform 2 1", "normal -1 1", "lognormal 0 1",
+                      "gamma 1 2", "percentiles", "percentiles 50",
+                      "percentiles 150:1", "percentiles 50:2 90:1"):
+            self.assertRaises(ValueError, parse_latency, value)
+
+    def test_sample(self):
+        for spec in ("2", "uniform 0.1 2", "normal 0.1 1",
+                     "lognormal 0.5 0.8", "percentiles 10:0.1 90:2"):
+            latency = parse_latency(spec)
+            samples = [latency.sample(Random(1)) for i in range(3)]
+            self.assertEqual(len(set(samples)), 1, spec)
+
+            rng = Random(1)
+            for i in range(200):
+                self.assertGreaterEqual(latency.sample(rng), 0, spec)
+
+        rng = Random(2)
+        samples = [parse_latency("uniform 0.1 2").sample(rng)
+                   for i in range(200)]
+        self.assertTrue(all(0.1 <= s <= 2 for s in samples))
+
+        rng = Random(3)
+        samples = sorted(parse_latency("percentiles 10:0.1 90:2").sample(rng)
+                         for i in range(1000))
+        self.assertEqual(samples[0], 0.1)
+        self.assertEqual(samples[-1], 2)
+        self.assertAlmostEqual(samples[500], 1.05, delta=0.15)
+
+    def test_probability(self):
+        self.assertIsNone(parse_probability(None))
+        self.assertIsNone(parse_probability(""))
+        self.assertEqual(parse_probability("0.25"), 0.25)
+        self.assertEqual(parse_probability(1), 1)
+        for value in ("often", "-0.1", "1.5", "nan"):
+            self.assertRaises(ValueError, parse_probability, value)
@@ -0,0 +1,149 @@
+# Copyright 2025 UW-IT, University of Washington
+# SPDX-License-Identifier: Apache-2.0
+
+
+from django.test import TestCase
+from django.test.utils import override_settings
+from django.urls import reverse
+from rc_django.metrics import (
+    ProxyMetrics, endpoint_template, percentile, get_metrics)
+from rc_django.tests.test_views import get_user, get_user_pass
+import mock
+
+
+class ProxyMetricsTest(TestCase):
+    def test_endpoint_template(self):
+        self.assertEqual(endpoint_template("/student/v5/term/current.json"),
+                         "/student/v5/term/current.json")
+        self.assertEqual(
+            endpoint_template("/student/v5/person/9136CCB8F66711D5BE060004"
+                              "AC494FFE.json?a=1"),
+            "/student/v5/person/{id}.json")
+        self.assertEqual(
+            endpoint_template("/student/v5/course/2013,spring,TRAIN,100/A"),
+            "/student/v5/course/{id}/A")
+        self.assertEqual(endpoint_template("/idcard/v1/photo/12345"),
+                         "/idcard/v1/photo/{id}")
+
+        # Ids without digits follow a known collection
+        url = "/identity/v2/person/javerage/full.json"
+        self.assertEqual(endpoint_template(url), url)
+        self.assertEqual(endpoint_template(url, ("person",)),
+                         "/identity/v2/person/{id}/full.json")
+        self.assertEqual(
+            endpoint_template("/identity/v2/entity/javerage.json",
+                              ("entity",)),
+            "/identity/v2/entity/{id}.json")
+        self.assertEqual(get_metrics().collections,
+                         frozenset(["person", "entity"]))
+
+    def test_percentile(self):
+        self.assertIsNone(percentile([], 0.5))
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 0.5), 50)
+        self.assertEqual(percentile(values, 0.95), 95)
+        self.assertEqual(percentile(values, 0.99), 99)
+        self.assertEqual(percentile([3], 0.99), 3)
+
+    def test_stats(self):
+        metrics = ProxyMetrics(samples=10, max_endpoints=2)
+        for i in range(20):
+            metrics.record("pws", "/identity/v2/person/{}.json".format(i),
+                           i / 100.0, 200, 100)
+        metrics.record("pws", "/identity/v2/entity.json", 1.0, 500, 10)
+        metrics.record("pws", "/identity/v2/other.json", 2.0, 0, 0)
+        metrics.record("sws", "/student/v5/term/current.json", 0.5, 200, 50)
+
+        pws, sws = metrics.get_stats()
+        self.assertEqual(pws["service"], "pws")
+        self.assertEqual(pws["count"], 22)
+        self.assertEqual(pws["size"], 2010)
+        self.assertEqual(pws["statuses"], [(0, 1), (200, 20), (500, 1)])
+        self.assertEqual(sws["p99"], 0.5)
+
+        # Percentiles only cover the recent samples
+        entity, person, other = pws["endpoints"]
+        self.assertEqual(entity["endpoint"], "/identity/v2/entity.json")
+        self.assertEqual(person["endpoint"], "/identity/v2/person/{id}.json")
+        self.assertEqual(person["count"], 20)
+        self.assertEqual(person["p50"], 0.14)
+        self.assertEqual(person["p99"], 0.19)
+
+        # Endpoints beyond the limit are counted together
+        self.assertEqual(other["endpoint"], "{other}")
+        self.assertEqual(other["count"], 1)
+        self.assertEqual(other["statuses"], [(0, 1)])
+
+        # Once a service is full, unseen endpoints skip the lock
+        with mock.patch.object(metrics, "_add_series") as add_series:
+            metrics.record("pws", "/identity/v2/another.json", 1.0, 200, 0)
+            add_series.assert_not_called()
+        self.assertEqual(metrics.get_stats()[0]["endpoints"][2]["count"], 2)
+
+        metrics.clear()
+        self.assertEqual(metrics.get_stats(), [])
+        metrics.record("pws", "/identity/v2/other.json", 2.0, 0, 0)
+        self.assertEqual(metrics.get_stats()[0]["endpoints"][0]["endpoint"],
+                         "/identity/v2/other.json")
+
+    def test_prometheus(self):
+        metrics = ProxyMetrics(samples=10, max_endpoints=10)
+        metrics.record("pws", '/a"b.json', 0.25, 200, 100)
+        text = metrics.prometheus()
+        self.assertIn("# TYPE restclients_request_duration_seconds summary",
+                      text)
+        self.assertIn('restclients_request_duration_seconds{'
+                      'endpoint="/a\\"b.json",service="pws",quantile="0.5"} '
+                      '0.25\n', text)
+        self.assertIn('restclients_request_duration_seconds_count{'
+                      'endpoint="/a\\"b.json",service="pws"} 1\n', text)
+        self.assertIn('restclients_responses_total{endpoint="/a\\"b.json",'
+                      'service="pws",status="200"} 1\n', text)
+        self.assertIn('restclients_response_bytes_total{'
+                      'endpoint="/a\\"b.json",service="pws"} 100\n', text)
+
+    @override_settings(RESTCLIENTS_PROXY_METRICS_SAMPLES=0)
+    def test_disabled(self):
+        self.assertIsNone(get_metrics())
+
+
+@override_settings(
+    RESTCLIENTS_ADMIN_AUTH_MODULE='rc_django.tests.can_proxy_restclient')
+class ProxyMetricsViewTest(TestCase):
+    def setUp(self):
+        get_metrics().clear()
+        get_user('test_view')
+        self.client.login(username='test_view',
+                          password=get_user_pass('test_view'))
+
+    def test_view(self):
+        self.client.get(reverse("restclients_proxy",
+                                args=["test", "test/v1/1234"]))
+        self.client.get(reverse("restclients_proxy",
+                                args=["test", "test/v1/5678"]), {"_raw": 1})
+
+        stats = get_metrics().get_stats()
+        self.assertEqual(stats[0]["service"], "test")
+        self.assertEqual(stats[0]["endpoints"][0]["endpoint"],
+                         "/test/v1/{id}")
+        self.assertEqual(stats[0]["count"], 2)
+
+        response = self.client.get(reverse("restclients_metrics"))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"/test/v1/{id}", response.content)
+
+        response = self.client.get(reverse("restclients_metrics_prometheus"))
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+        self.assertIn(b'restclients_responses_total{endpoint="/test/v1/{id}",'
+                      b'service="test",status="200"} 2', response.content)
+
+        response = self.client.post(reverse("restclients_metrics"))
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(get_metrics().get_stats(), [])
+
+    @override_settings(RESTCLIENTS_PROXY_METRICS_SAMPLES=0)
+    def test_disabled_view(self):
+        response = self.client.get(reverse("restclients_metrics"))
+        self.assertIn(b"Metrics are disabled", response.content)
+        response = self.client.get(reverse("restclients_metrics_prometheus"))
+        self.assertEqual(response.status_code, 404)
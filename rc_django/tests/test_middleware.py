@@ -0,0 +1,252 @@
+# Copyright 2025 UW-IT, University of Washington
+# SPDX-License-Identifier: Apache-2.0
+
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.test import TestCase, RequestFactory
+from django.test.utils import override_settings
+from django.http import HttpResponse
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.urls import reverse
+from restclients_core.dao import DAO
+from restclients_core.thread import Thread
+from restclients_core.util.performance import PerformanceDegradation
+from rc_django.middleware import (
+    EnableServiceDegradationMiddleware, DEGRADATION_COOKIE,
+    DEGRADATION_COOKIE_SALT, load_problems)
+from rc_django.degradation import (
+    check_restclients_core, install_degradation_hook, _originals)
+from rc_django.models import DegradePerformance
+from rc_django.tests.test_views import get_user, get_user_pass
+from asgiref.sync import iscoroutinefunction
+from concurrent.futures import ThreadPoolExecutor
+from threading import Barrier
+import asyncio
+import mock
+
+
+class RequestProblemsMiddleware(EnableServiceDegradationMiddleware):
+    def get_problems(self, request):
+        return request.problems
+
+    async def aget_problems(self, request):
+        return request.problems
+
+
+def problem_request(index):
+    request = RequestFactory().get("/")
+    request.problems = DegradePerformance()
+    request.problems.set_status("pws", str(500 + index))
+    return request
+
+
+class DegradationMiddlewareTest(TestCase):
+    def get_request(self, cookie=None):
+        request = RequestFactory().get("/")
+        SessionMiddleware(mock.MagicMock()).process_request(request)
+        request.session["RESTCLIENTS_ERRORS"] = DegradePerformance(
+            '{"pws": {"status": "500"}}').serialize()
+        request.session.save()
+
+        # A fresh session for the same key, not yet loaded
+        request.session = request.session.__class__(
+            request.session.session_key)
+        if cookie is not None:
+            response = HttpResponse()
+            response.set_signed_cookie(
+                DEGRADATION_COOKIE, "1", salt=DEGRADATION_COOKIE_SALT)
+            request.COOKIES[DEGRADATION_COOKIE] = (
+                response.cookies[DEGRADATION_COOKIE].value if cookie else
+                "forged")
+        return request
+
+    def test_unmarked(self):
+        middleware = EnableServiceDegradationMiddleware(mock.MagicMock())
+        request = self.get_request()
+        middleware.process_request(request)
+        self.assertFalse(request.session.accessed)
+        self.assertIsNone(PerformanceDegradation.get_problems())
+
+        request = self.get_request(cookie=False)
+        middleware.process_request(request)
+        self.assertFalse(request.session.accessed)
+        self.assertIsNone(PerformanceDegradation.get_problems())
+
+    def test_marked(self):
+        middleware = EnableServiceDegradationMiddleware(mock.MagicMock())
+        request = self.get_request(cookie=True)
+        middleware.process_request(request)
+        problems = PerformanceDegradation.get_problems()
+        self.assertEqual(problems.get_status("pws"), "500")
+
+        # Parsed problem sets are shared between requests
+        middleware.process_request(self.get_request(cookie=True))
+        self.assertIs(PerformanceDegradation.get_problems(), problems)
+        self.assertIs(load_problems(request.session["RESTCLIENTS_ERRORS"]),
+                      problems)
+
+        middleware.process_response(request, HttpResponse())
+        self.assertIsNone(PerformanceDegradation.get_problems())
+
+    @override_settings(
+        RESTCLIENTS_ADMIN_AUTH_MODULE='rc_django.tests.can_proxy_restclient')
+    def test_marker_cookie(self):
+        get_user('test_view')
+        self.client.login(username='test_view',
+                          password=get_user_pass('test_view'))
+        url = reverse("restclients_errors")
+
+        response = self.client.post(url, {
+            "new_service_name": "pws", "new_service_status": 500})
+        self.assertIn(DEGRADATION_COOKIE, response.cookies)
+        self.assertTrue(response.cookies[DEGRADATION_COOKIE].value)
+        self.assertEqual(response.cookies[DEGRADATION_COOKIE]["max-age"],
+                         settings.SESSION_COOKIE_AGE)
+
+        with self.settings(SESSION_EXPIRE_AT_BROWSER_CLOSE=True):
+            response = self.client.post(url, {
+                "new_service_name": "pws", "new_service_status": 500})
+            self.assertEqual(
+                response.cookies[DEGRADATION_COOKIE]["max-age"], "")
+
+        response = self.client.post(url, {})
+        self.assertEqual(response.cookies[DEGRADATION_COOKIE].value, "")
+
+    def test_unmarked_session_upgrade(self):
+        # A session saved before the marker cookie existed
+        def view(request):
+            request.session.get("_auth_user_id")
+            return HttpResponse(str(PerformanceDegradation.get_problems()))
+
+        middleware = EnableServiceDegradationMiddleware(view)
+        request = self.get_request()
+        response = middleware(request)
+        self.assertEqual(response.content, b"None")
+        self.assertIn(DEGRADATION_COOKIE, response.cookies)
+
+        request = self.get_request()
+        request.COOKIES[DEGRADATION_COOKIE] = (
+            response.cookies[DEGRADATION_COOKIE].value)
+        middleware.process_request(request)
+        self.assertEqual(
+            PerformanceDegradation.get_problems().get_status("pws"), "500")
+        middleware.process_response(request, HttpResponse())
+
+        # Sessions the view never loads are left alone
+        middleware = EnableServiceDegradationMiddleware(
+            lambda request: HttpResponse())
+        response = middleware(self.get_request())
+        self.assertNotIn(DEGRADATION_COOKIE, response.cookies)
+
+        # As are sessions that are already marked
+        response = middleware(self.get_request(cookie=True))
+        self.assertNotIn(DEGRADATION_COOKIE, response.cookies)
+
+
+class DegradationIsolationTest(TestCase):
+    requests = 8
+
+    def test_threads(self):
+        barrier = Barrier(self.requests)
+
+        def view(request):
+            # Every request has set its problems before any reads them
+            barrier.wait(5)
+            problems = PerformanceDegradation.get_problems()
+            barrier.wait(5)
+            return HttpResponse(problems.get_status("pws"))
+
+        middleware = RequestProblemsMiddleware(view)
+        with ThreadPoolExecutor(self.requests) as executor:
+            responses = list(executor.map(
+                lambda i: middleware(problem_request(i)),
+                range(self.requests)))
+
+        self.assertEqual([r.content for r in responses], [
+            str(500 + i).encode() for i in range(self.requests)])
+        self.assertIsNone(PerformanceDegradation.get_problems())
+
+    def test_async(self):
+        async def view(request):
+            await asyncio.sleep(0.01)
+            status = PerformanceDegradation.get_problems().get_status("pws")
+            await asyncio.sleep(0.01)
+            return HttpResponse(status)
+
+        middleware = RequestProblemsMiddleware(view)
+        self.assertTrue(iscoroutinefunction(middleware))
+
+        async def run():
+            responses = await asyncio.gather(*[
+                middleware(problem_request(i))
+                for i in range(self.requests)])
+            return responses, PerformanceDegradation.get_problems()
+
+        responses, problems = asyncio.run(run())
+        self.assertEqual([r.content for r in responses], [
+            str(500 + i).encode() for i in range(self.requests)])
+        self.assertIsNone(problems)
+
+    @override_settings(RESTCLIENTS_USE_THREADING=True)
+    def test_restclients_threads(self):
+        statuses = []
+
+        class StatusThread(Thread):
+            def run(self):
+                statuses.append(
+                    PerformanceDegradation.get_problems().get_status("pws"))
+                if len(statuses) < 2:
+                    # Threads started by threads see the same problems
+                    child = StatusThread()
+                    child.start()
+                    child.join()
+                self.final()
+
+        def view(request):
+            thread = StatusThread()
+            self.assertTrue(thread._use_thread)
+            thread.start()
+            thread.join()
+            return HttpResponse()
+
+        RequestProblemsMiddleware(view)(problem_request(3))
+        self.assertEqual(statuses, ["503", "503"])
+
+    @override_settings(
+        SESSION_ENGINE="django.contrib.sessions.backends.cache")
+    def test_async_session(self):
+        async def view(request):
+            return HttpResponse(
+                PerformanceDegradation.get_problems().get_status("pws"))
+
+        # The session is loaded in a worker thread
+        request = DegradationMiddlewareTest.get_request(None, cookie=True)
+        middleware = EnableServiceDegradationMiddleware(view)
+        response = asyncio.run(middleware(request))
+        self.assertEqual(response.content, b"500")
+
+
+class DegradationHookTest(TestCase):
+    def test_check_restclients_core(self):
+        check_restclients_core()
+
+        key = (DAO, "_load_resource")
+        with mock.patch.dict(_originals, {key: None}):
+            self.assertRaisesRegex(
+                ImproperlyConfigured, "DAO._load_resource is missing",
+                check_restclients_core)
+
+        with mock.patch.dict(_originals, {key: lambda self, url: None}):
+            self.assertRaisesRegex(
+                ImproperlyConfigured, "should take self, method",
+                check_restclients_core)
+
+        # Nothing is replaced when the check fails
+        hook = DAO._load_resource
+        with mock.patch.dict(_originals, {key: None}):
+            with mock.patch.object(DAO, "_load_resource", None):
+                self.assertRaises(ImproperlyConfigured,
+                                  install_degradation_hook)
+                self.assertIsNone(DAO._load_resource)
+        self.assertIs(DAO._load_resource, hook)
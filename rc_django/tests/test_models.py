@@ -3,9 +3,13 @@
 
 
 from django.test import TestCase
-from rc_django.models import RestProxy
+from django.test.utils import override_settings
+from rc_django.models import RestProxy, DAORegistry, DegradePerformance
 from rc_django.tests.test_views import TEST_DAO, SUB_DAO
 from restclients_core.models import MockHTTP
+from restclients_core.util.performance import PerformanceDegradation
+import json
+import mock
 
 
 class RestProxyTest(TestCase):
@@ -25,6 +29,42 @@ class RestProxyTest(TestCase):
         proxy = RestProxy("fake")
         self.assertRaises(ImportError, getattr, proxy, "dao")
 
+    def test_dao_registry(self):
+        DAORegistry.clear()
+        dao = RestProxy("test").dao
+        self.assertIs(RestProxy("test").dao, dao)
+
+        # Subclasses defined after the first scan are picked up on a miss
+        class LATE_DAO(TEST_DAO):
+            def service_name(self):
+                return "test_late"
+
+        self.assertEqual(type(RestProxy("test_late").dao), LATE_DAO)
+        self.assertIs(RestProxy("test").dao, dao)
+
+        DAORegistry.clear()
+        self.assertIsNot(RestProxy("test").dao, dao)
+
+    def test_dao_registry_misses(self):
+        DAORegistry.clear()
+        self.assertRaises(ImportError, DAORegistry.get_dao, "fake")
+
+        # Unknown services don't rescan until a subclass is defined
+        with mock.patch.object(DAORegistry, "_scan",
+                               wraps=DAORegistry._scan) as scan:
+            for i in range(3):
+                self.assertRaises(ImportError, DAORegistry.get_dao, "fake")
+            scan.assert_not_called()
+
+            class LATE_SUB_DAO(SUB_DAO):
+                def service_name(self):
+                    return "test_late_sub"
+
+            self.assertEqual(type(DAORegistry.get_dao("test_late_sub")),
+                             LATE_SUB_DAO)
+            self.assertRaises(ImportError, DAORegistry.get_dao, "fake")
+            self.assertEqual(scan.call_count, 1)
+
     def test_get_mock_response(self):
         proxy = RestProxy("test_sub")
         response = proxy.get_api_response("/foo")
@@ -53,6 +93,18 @@ class RestProxyTest(TestCase):
         valid = "<div id='test_id'></div><br/>"
         self.assertEqual(valid, self.proxy.clean_self_closing_divs(valid))
 
+    def test_binary_content_type(self):
+        self.assertIsNone(self.proxy.binary_content_type)
+
+        self.proxy.response.data = b"\xff\xd8\xff\xe0"
+        self.assertEqual(self.proxy.binary_content_type, "image/jpeg")
+
+        self.proxy.response.headers = {"content-type": "text/plain"}
+        self.assertIsNone(self.proxy.binary_content_type)
+
+        self.proxy.response.headers = {"Content-Type": "application/pdf"}
+        self.assertEqual(self.proxy.binary_content_type, "application/pdf")
+
     def test_json(self):
         content = '{"Href": "/identity/v2/entity.json"}'
         self.proxy.response.data = content
@@ -62,6 +114,33 @@ class RestProxyTest(TestCase):
         self.proxy.response.data = content
         self.assertEqual(self.proxy.json, content)
 
+    def test_document(self):
+        self.proxy.response.data = b'{"Href": "/identity/v2/entity.json"}'
+        with mock.patch("rc_django.codec.JSONCodec.loads",
+                        side_effect=json.loads) as loads, override_settings(
+                            RESTCLIENTS_JSON_CODEC="json"):
+            self.proxy.format_json()
+            self.proxy.json
+            self.assertEqual(self.proxy.document, {
+                "Href": "/identity/v2/entity.json"})
+            self.assertEqual(loads.call_count, 1)
+
+            # Non-JSON bodies are rejected without a parse
+            self.proxy.response.data = "<html></html>"
+            self.assertIsNone(self.proxy.json)
+            self.assertRaises(ValueError, self.proxy.format_json)
+            self.assertEqual(loads.call_count, 1)
+
+        self.proxy.response.data = '{"b": [1, "/c"], "a": 2}'
+        self.assertEqual("".join(self.proxy.iter_formatted_json()),
+                         self.proxy.format_json())
+        self.assertEqual("".join(self.proxy.iter_json()),
+                         '{"a": 2, "b": [1, "/c"]}')
+
+        self.proxy.response.data = "null"
+        self.assertIsNone(self.proxy.document)
+        self.assertEqual(self.proxy.json, "null")
+
     def test_format_json(self):
         json_data = '{"Href": "/identity/v2/entity.json"}'
         formatted = (u'{<br/>\n&nbsp;&nbsp;&nbsp;&nbsp;"Href":&nbsp;'
@@ -104,3 +183,211 @@ class RestProxyTest(TestCase):
         self.proxy.response.data = (
             b'<STYLE>h1 {color:red;}</STYLE><a href="/api/v1/test"></a>')
         self.assertEqual(self.proxy.format_html(), output)
+
+
+@override_settings(RESTCLIENTS_PROXY_CACHE_TTL={"test": 60})
+class ResponseCacheTest(TestCase):
+    def setUp(self):
+        PerformanceDegradation.clear_problems()
+        self.dao = mock.MagicMock()
+        self.dao.getURL.side_effect = self.get_url
+        patcher = mock.patch.object(
+            RestProxy, "dao", new_callable=mock.PropertyMock,
+            return_value=self.dao)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.etag = "v1"
+
+    def get_url(self, url, headers):
+        response = MockHTTP()
+        if headers.get("If-None-Match") == self.etag:
+            response.status = 304
+            return response
+        response.status = 200
+        response.data = "{} {}".format(url, self.etag)
+        response.headers = {"ETag": self.etag}
+        return response
+
+    def fetch(self, url, headers={}, service="test", **kwargs):
+        proxy = RestProxy(service)
+        response = proxy.get_api_response(url, dict(headers), **kwargs)
+        return proxy.cache_status, response.data
+
+    def test_cache(self):
+        self.assertEqual(self.fetch("/a"), ("miss", "/a v1"))
+        self.assertEqual(self.fetch("/a"), ("hit", "/a v1"))
+        self.assertEqual(self.dao.getURL.call_count, 1)
+
+        # Headers are part of the key
+        self.assertEqual(self.fetch("/a", {"X-UW-Act-as": "javerage"}),
+                         ("miss", "/a v1"))
+        self.assertEqual(self.fetch("/a", {"x-uw-act-as": "javerage"}),
+                         ("hit", "/a v1"))
+        self.assertEqual(self.fetch("/a", {"X-UW-Act-as": "bill"}),
+                         ("miss", "/a v1"))
+
+        self.etag = "v2"
+        self.assertEqual(self.fetch("/a"), ("hit", "/a v1"))
+        self.assertEqual(self.fetch("/a", bypass_cache=True),
+                         ("bypass", "/a v2"))
+        self.assertEqual(self.fetch("/a"), ("hit", "/a v2"))
+
+        # Services without a TTL aren't cached
+        self.assertEqual(self.fetch("/a", service="other"), (None, "/a v2"))
+
+        # Nor are degraded requests
+        PerformanceDegradation.set_problems(DegradePerformance())
+        self.assertEqual(self.fetch("/a"), (None, "/a v2"))
+        PerformanceDegradation.clear_problems()
+
+    def test_revalidate(self):
+        clock = [0]
+        with mock.patch("rc_django.response_cache.monotonic",
+                        side_effect=lambda: clock[0]):
+            self.fetch("/a")
+            clock[0] = 100
+            self.assertEqual(self.fetch("/a"), ("revalidated", "/a v1"))
+            self.assertEqual(self.dao.getURL.call_args[0][1],
+                             {"If-None-Match": "v1"})
+            self.assertEqual(self.fetch("/a"), ("hit", "/a v1"))
+
+            clock[0] = 200
+            self.etag = "v2"
+            self.assertEqual(self.fetch("/a"), ("miss", "/a v2"))
+
+    @override_settings(RESTCLIENTS_PROXY_CACHE_SIZE=2)
+    def test_eviction(self):
+        self.fetch("/a")
+        self.fetch("/b")
+        self.fetch("/a")
+        self.fetch("/c")
+        self.assertEqual(self.fetch("/a")[0], "hit")
+        self.assertEqual(self.fetch("/b")[0], "miss")
+
+
+class DegradePerformanceTest(TestCase):
+    def test_service(self):
+        problems = DegradePerformance()
+        problems.set_status("pws", "500")
+        problems = DegradePerformance(problems.serialize())
+        self.assertEqual(problems.get_status("pws"), "500")
+        self.assertEqual(problems.get_status("pws", "/any"), "500")
+        self.assertIsNone(problems.get_content("pws"))
+        self.assertIsNone(problems.get_status("sws"))
+        self.assertEqual(problems.get_response("pws", "/any").status, 500)
+        self.assertIsNone(problems.get_response("sws", "/any"))
+
+    def test_rules(self):
+        problems = DegradePerformance()
+        problems.add_rule("sws", "/student/v5/registration", status="503")
+        problems.add_rule("sws", r"/student/v5/section/\d+", match="regex",
+                          content="[oops")
+        problems.add_rule("sws", "/student/v5/", status="404")
+        problems = DegradePerformance(problems.serialize())
+
+        self.assertEqual(
+            problems.get_status("sws", "/student/v5/registration.json"),
+            "503")
+        self.assertEqual(problems.get_status("sws", "/student/v5/term"), "404")
+        self.assertIsNone(problems.get_status("sws", "/student/v4/term"))
+        self.assertIsNone(problems.get_status("sws"))
+
+        response = problems.get_response("sws", "/student/v5/section/12")
+        self.assertEqual(response.status, 200)
+        self.assertEqual(response.data, "[oops")
+        self.assertIsNone(problems.get_response("sws", "/student/v4/term"))
+
+        problems.remove_rule("sws", 0)
+        self.assertEqual(
+            problems.get_status("sws", "/student/v5/registration.json"),
+            "404")
+
+        # Service-wide values apply when no rule matches
+        problems.set_status("sws", "500")
+        self.assertEqual(problems.get_status("sws", "/other"), "500")
+
+    def test_error_rate(self):
+        problems = DegradePerformance()
+        problems.set_status("pws", "500")
+        problems.set_error_rate("pws", "0.3")
+        problems.set_seed("pws", "7")
+        problems.set_load_time("pws", "uniform 0 0.001")
+        problems = DegradePerformance(problems.serialize())
+        self.assertEqual(problems.get_load_time("pws"), "uniform 0 0.001")
+
+        def failures():
+            problems.set_seed("pws", 7)
+            return [problems.get_response("pws", "/") is not None
+                    for i in range(500)]
+
+        first = failures()
+        self.assertEqual(first, failures())
+        self.assertAlmostEqual(sum(first) / 500, 0.3, delta=0.06)
+
+        # Each URL's requests repeat, however they're interleaved, and in
+        # another copy of the problem set
+        problems.set_seed("pws", 7)
+        first = [(problems.get_response("pws", "/a") is not None,
+                  problems.get_response("pws", "/b") is not None)
+                 for i in range(50)]
+        copy = DegradePerformance(problems.serialize())
+        b = [copy.get_response("pws", "/b") is not None for i in range(50)]
+        a = [copy.get_response("pws", "/a") is not None for i in range(50)]
+        self.assertEqual(list(zip(a, b)), first)
+
+        # Rules can fail every request
+        problems.add_rule("pws", "/down", error_rate=1)
+        self.assertEqual(problems.get_response("pws", "/down").status, 500)
+
+        self.assertRaises(ValueError, problems.set_error_rate, "pws", "2")
+        self.assertRaises(ValueError, problems.set_seed, "pws", "abc")
+        self.assertRaises(ValueError, problems.set_load_time, "pws", "slow")
+        self.assertRaises(ValueError, problems.add_rule, "pws", "/",
+                          load_time="uniform 2 1")
+        self.assertEqual(problems.get_error_rate("pws"), 0.3)
+
+    def test_invalid_faults(self):
+        problems = DegradePerformance()
+        for setter, value in ((problems.set_throughput, "0"),
+                              (problems.set_throughput, "fast"),
+                              (problems.set_truncate, "-1"),
+                              (problems.set_truncate, "150%"),
+                              (problems.set_timeout, "write"),
+                              (problems.set_pool_size, "-1")):
+            self.assertRaises(ValueError, setter, "pws", value)
+
+        problems.set_throughput("pws", "1024")
+        problems.set_truncate("pws", " 10% ")
+        problems.set_pool_size("pws", "0")
+        problems.set_timeout("pws", "")
+        self.assertEqual(problems.get_throughput("pws"), 1024)
+        self.assertEqual(problems.get_truncate("pws"), "10%")
+        self.assertEqual(problems.get_pool_size("pws"), 0)
+        self.assertIsNone(problems.get_timeout("pws"))
+
+    def test_invalid_rules(self):
+        problems = DegradePerformance()
+        self.assertRaises(ValueError, problems.add_rule, "sws", "(",
+                          match="regex")
+        self.assertRaises(ValueError, problems.add_rule, "sws", "/",
+                          match="glob")
+
+        # Rules that can't share one regex are matched separately
+        problems.add_rule("sws", "(?P<r1>a)", match="regex", status="500")
+        problems.add_rule("sws", "b", match="regex", status="501")
+        self.assertEqual(problems.get_status("sws", "b"), "501")
+        self.assertEqual(problems.get_status("sws", "a"), "500")
+
+    def test_backreference_rules(self):
+        problems = DegradePerformance()
+        problems.add_rule("sws", "/person/(a)", match="regex", status="500")
+        problems.add_rule("sws", r"/term/(\d+)/\1", match="regex",
+                          status="501")
+        problems.add_rule("sws", r"/course/(x)?(?(1)y|z)", match="regex",
+                          status="502")
+        self.assertEqual(problems.get_status("sws", "/person/a"), "500")
+        self.assertEqual(problems.get_status("sws", "/term/2025/2025"),
+                         "501")
+        self.assertIsNone(problems.get_status("sws", "/term/2025/2026"))
+        self.assertEqual(problems.get_status("sws", "/course/xy"), "502")
+        self.assertEqual(problems.get_status("sws", "/course/z"), "502")
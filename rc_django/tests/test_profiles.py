@@ -0,0 +1,177 @@
+# Copyright 2025 UW-IT, University of Washington
+# SPDX-License-Identifier: Apache-2.0
+
+
+from django.conf import settings
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.core.cache import cache
+from django.test import TestCase, RequestFactory
+from django.test.utils import override_settings
+from django.urls import reverse
+from restclients_core.util.performance import PerformanceDegradation
+from rc_django.middleware import EnableServiceDegradationMiddleware
+from rc_django.models import DegradePerformance
+from rc_django.profiles import DegradationProfiles, get_profiles
+from rc_django.checks import check_degradation_cache
+from threading import Barrier, Thread
+from rc_django.tests.test_views import get_user, get_user_pass
+import mock
+
+
+@override_settings(RESTCLIENTS_DEGRADATION_CACHE_ALIAS='default',
+                   RESTCLIENTS_DEGRADATION_POLL_INTERVAL=0)
+class DegradationProfilesTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        PerformanceDegradation.clear_problems()
+        cache.clear()
+
+    def test_profiles(self):
+        profiles = get_profiles()
+        self.assertIsNone(profiles.get_active())
+
+        problems = DegradePerformance()
+        problems.set_status("pws", "500")
+        profiles.save("pws_down", problems)
+        self.assertIsNone(profiles.get_active())
+
+        problems = DegradePerformance()
+        problems.set_status("pws", "503")
+        problems.set_status("sws", "500")
+        profiles.save("campus_down", problems, active=True)
+        profiles.activate("pws_down")
+
+        active = DegradePerformance(profiles.get_active())
+        self.assertEqual(active.get_status("pws"), "500")
+        self.assertEqual(active.get_status("sws"), "500")
+
+        profiles.deactivate("campus_down")
+        active = DegradePerformance(profiles.get_active())
+        self.assertIsNone(active.get_status("sws"))
+
+        profiles.delete("pws_down")
+        self.assertIsNone(profiles.get_active())
+        self.assertEqual(list(profiles.get_profiles()), ["campus_down"])
+
+        self.assertRaises(ValueError, profiles.activate, "missing")
+        self.assertRaises(ValueError, profiles.save, "bad name", problems)
+
+        with override_settings(RESTCLIENTS_DEGRADATION_CACHE_ALIAS=None):
+            self.assertIsNone(get_profiles())
+
+        # Profiles are off unless a cache is named
+        with override_settings():
+            del settings.RESTCLIENTS_DEGRADATION_CACHE_ALIAS
+            self.assertIsNone(get_profiles())
+
+    def test_nodes(self):
+        admin = DegradationProfiles("default", 0)
+        node = DegradationProfiles("default", 0)
+        problems = DegradePerformance()
+        problems.set_status("pws", "500")
+        admin.save("pws_down", problems, active=True)
+
+        active = node.get_active()
+        self.assertEqual(DegradePerformance(active).get_status("pws"), "500")
+
+        # Profiles are only reloaded when their version changes
+        with mock.patch.object(node, "get_profiles") as get:
+            self.assertIs(node.get_active(), active)
+            self.assertFalse(get.called)
+
+        admin.deactivate("pws_down")
+        self.assertIsNone(node.get_active())
+
+        # ... and checked at most once per poll interval
+        node.poll_interval = 60
+        admin.activate("pws_down")
+        self.assertIsNone(node.get_active())
+
+    def test_concurrent_nodes(self):
+        nodes = [DegradationProfiles("default", 0) for i in range(4)]
+        barrier = Barrier(len(nodes))
+        problems = DegradePerformance()
+        problems.set_status("pws", "500")
+
+        def save(node, index):
+            barrier.wait()
+            for i in range(10):
+                node.save("p{}_{}".format(index, i), problems)
+
+        threads = [Thread(target=save, args=(node, index))
+                   for index, node in enumerate(nodes)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(nodes[0].get_profiles()), 40)
+        self.assertIsNone(cache.get("restclients_degradation:lock"))
+
+        # A lock held by another node is waited for
+        cache.add("restclients_degradation:lock", "other", 1)
+        nodes[0].delete("p0_0")
+        self.assertNotIn("p0_0", nodes[1].get_profiles())
+
+    def test_local_memory_check(self):
+        self.assertEqual([w.id for w in check_degradation_cache(None)],
+                         ["rc_django.W001"])
+        with override_settings(RESTCLIENTS_DEGRADATION_CACHE_ALIAS=None):
+            self.assertEqual(check_degradation_cache(None), [])
+        with override_settings():
+            del settings.RESTCLIENTS_DEGRADATION_CACHE_ALIAS
+            self.assertEqual(check_degradation_cache(None), [])
+
+    def test_middleware(self):
+        middleware = EnableServiceDegradationMiddleware(mock.MagicMock())
+        problems = DegradePerformance()
+        problems.set_status("pws", "500")
+        problems.set_status("sws", "500")
+        get_profiles().save("down", problems, active=True)
+
+        # Applied to requests without a session
+        request = RequestFactory().get("/")
+        middleware.process_request(request)
+        problems = PerformanceDegradation.get_problems()
+        self.assertEqual(problems.get_status("pws"), "500")
+
+        # A session's own settings take precedence
+        SessionMiddleware(mock.MagicMock()).process_request(request)
+        request.session["RESTCLIENTS_ERRORS"] = '{"pws": {"status": "404"}}'
+        middleware.process_request(request)
+        problems = PerformanceDegradation.get_problems()
+        self.assertEqual(problems.get_status("pws"), "404")
+        self.assertEqual(problems.get_status("sws"), "500")
+
+    @override_settings(
+        RESTCLIENTS_ADMIN_AUTH_MODULE='rc_django.tests.can_proxy_restclient')
+    def test_view(self):
+        get_user('test_view')
+        self.client.login(username='test_view',
+                          password=get_user_pass('test_view'))
+        url = reverse("restclients_errors")
+
+        response = self.client.post(url, {
+            "new_service_name": "pws", "new_service_status": 500,
+            "update_profiles": "1", "new_profile_name": "pws_down",
+            "new_profile_active": "on"})
+        self.assertIn(b'name="active_profile_pws_down" checked',
+                      response.content)
+        self.assertEqual(list(get_profiles().get_profiles()), ["pws_down"])
+        self.assertIsNotNone(get_profiles().get_active())
+
+        # Deactivate
+        response = self.client.post(url, {
+            "update_profiles": "1", "keep_profile_pws_down": "on"})
+        self.assertIn(b'name="active_profile_pws_down">', response.content)
+        self.assertIsNone(get_profiles().get_active())
+
+        # Posts without the profile form leave profiles alone
+        self.client.post(url, {})
+        self.assertEqual(list(get_profiles().get_profiles()), ["pws_down"])
+
+        response = self.client.post(url, {
+            "update_profiles": "1", "new_profile_name": "bad name"})
+        self.assertIn(b"Invalid profile name", response.content)
+        self.assertEqual(get_profiles().get_profiles(), {})
@@ -0,0 +1,123 @@
+# Copyright 2025 UW-IT, University of Washington
+# SPDX-License-Identifier: Apache-2.0
+
+
+from django.test import TestCase
+from django.test.utils import override_settings
+from restclients_core.models import MockHTTP
+from restclients_core.util.mock import load_resource_from_path
+from restclients_core.util.performance import PerformanceDegradation
+from rc_django.models import RestProxy, DegradePerformance
+from rc_django.recorder import ResponseRecorder, get_recorder
+from tempfile import TemporaryDirectory
+import json
+import os
+
+
+def get_response(data, status=200, headers=None):
+    response = MockHTTP()
+    response.status = status
+    response.data = data
+    response.headers = headers or {}
+    return response
+
+
+class ResponseRecorderTest(TestCase):
+    def setUp(self):
+        self.tempdir = TemporaryDirectory()
+        self.path = self.tempdir.name
+
+    def tearDown(self):
+        PerformanceDegradation.clear_problems()
+        self.tempdir.cleanup()
+
+    def test_mock_layout(self):
+        recorder = ResponseRecorder(self.path, 1024, 4096)
+        url = "/student/v5/course/2025,autumn,CSE,142/A.json?a=b"
+        path = recorder.record("sws", url, get_response(
+            '{"a": 1}', headers={"Content-Type": "application/json",
+                                 "Set-Cookie": "secret",
+                                 "Content-Encoding": "gzip"}))
+        self.assertTrue(path.startswith(
+            os.path.join(self.path, "sws", "file", "student")))
+
+        # restclients_core's MockDAO reads it back
+        response = load_resource_from_path(self.path, "sws", "file", url, {})
+        self.assertEqual(response.status, 200)
+        self.assertEqual(response.data, b'{"a": 1}')
+        self.assertEqual(response.headers["Content-Type"],
+                         "application/json")
+        self.assertNotIn("Set-Cookie", response.headers)
+        self.assertNotIn("Content-Encoding", response.headers)
+
+        # A path already holding resources gets an index file
+        recorder.record("sws", "/student", get_response("index"))
+        response = load_resource_from_path(
+            self.path, "sws", "file", "/student", {})
+        self.assertEqual(response.data, b"index")
+
+    def test_dedupe(self):
+        recorder = ResponseRecorder(self.path, 1024, 4096)
+        first = recorder.record("pws", "/v1/a", get_response("same"))
+        second = recorder.record("pws", "/v1/b", get_response("same"))
+        self.assertTrue(os.path.samefile(first, second))
+        self.assertEqual(recorder.total, 4)
+
+        # Changed bodies replace the link, not the linked file
+        recorder.record("pws", "/v1/b", get_response("changed"))
+        with open(first) as f:
+            self.assertEqual(f.read(), "same")
+        with open(second) as f:
+            self.assertEqual(f.read(), "changed")
+        self.assertEqual(recorder.total, 11)
+
+        # Unchanged bodies aren't rewritten
+        mtime = os.stat(second).st_mtime_ns
+        self.assertEqual(recorder.record(
+            "pws", "/v1/b", get_response("changed")), second)
+        self.assertEqual(os.stat(second).st_mtime_ns, mtime)
+        self.assertEqual(recorder.total, 11)
+
+        # Nor are files recorded by a previous run
+        recorder = ResponseRecorder(self.path, 1024, 4096)
+        self.assertEqual(recorder.record(
+            "pws", "/v1/b", get_response("changed")), second)
+        self.assertEqual(recorder.total, 0)
+
+    def test_limits(self):
+        recorder = ResponseRecorder(self.path, 10, 15)
+        self.assertIsNone(recorder.record(
+            "pws", "/v1/big", get_response("x" * 11)))
+        self.assertIsNotNone(recorder.record(
+            "pws", "/v1/a", get_response("x" * 10)))
+        self.assertIsNone(recorder.record(
+            "pws", "/v1/b", get_response("y" * 10)))
+        # Links to recorded bodies don't count
+        self.assertIsNotNone(recorder.record(
+            "pws", "/v1/c", get_response("x" * 10)))
+
+        self.assertIsNone(recorder.record(
+            "pws", "/v1/missing", get_response("", status=404)))
+        with self.assertLogs("rc_django.recorder", "WARNING"):
+            self.assertIsNone(recorder.record(
+                "pws", "/v1/../../../escape", get_response("x")))
+        self.assertFalse(os.path.exists(
+            os.path.join(self.path, "escape")))
+
+    def test_proxy(self):
+        with override_settings(RESTCLIENTS_RECORD_PATH=self.path):
+            RestProxy("test_json").get_api_response("/v1/recorded")
+            with open(os.path.join(self.path, "test_json", "file", "v1",
+                                   "recorded")) as f:
+                self.assertEqual(json.loads(f.read())["Href"],
+                                 "/v1/recorded")
+
+            # Degraded responses aren't recorded
+            problems = DegradePerformance()
+            problems.set_content("test_json", '{"degraded": true}')
+            PerformanceDegradation.set_problems(problems)
+            RestProxy("test_json").get_api_response("/v1/degraded")
+            self.assertFalse(os.path.exists(os.path.join(
+                self.path, "test_json", "file", "v1", "degraded")))
+
+        self.assertIsNone(get_recorder())
@@ -0,0 +1,62 @@
+# Copyright 2025 UW-IT, University of Washington
+# SPDX-License-Identifier: Apache-2.0
+
+
+from django.test import TestCase
+from django.test.utils import override_settings
+from rc_django.template_index import TemplateIndex
+import mock
+
+LOCMEM_TEMPLATES = [{
+    "BACKEND": "django.template.backends.django.DjangoTemplates",
+    "APP_DIRS": False,
+    "OPTIONS": {
+        "loaders": [
+            ("django.template.loaders.locmem.Loader", {
+                "restclients/extra_info.html": "extra",
+            }),
+            "rc_django.tests.test_template_index.UnlistedLoader",
+        ],
+    },
+}]
+
+
+class UnlistedLoader(object):
+    def __init__(self, engine):
+        pass
+
+    def get_template(self, *args, **kwargs):
+        from django.template import TemplateDoesNotExist
+        raise TemplateDoesNotExist(args[0])
+
+
+class TemplateIndexTest(TestCase):
+    def test_exists(self):
+        index = TemplateIndex()
+        with mock.patch("rc_django.template_index.loader.get_template") as get:
+            self.assertTrue(index.exists("proxy/sws/student/v5/course.html"))
+            self.assertTrue(index.exists("customform/libraries/index.html"))
+            self.assertFalse(index.exists("restclients/extra_info.html"))
+            self.assertFalse(index.exists("proxy/sws/student/v5/fake.html"))
+            self.assertEqual(get.call_count, 0)
+
+            # Outside the indexed prefixes, lookups are probed once
+            self.assertTrue(index.exists("proxy.html"))
+            self.assertTrue(index.exists("proxy.html"))
+            self.assertEqual(get.call_count, 1)
+
+    def test_probed(self):
+        with override_settings(TEMPLATES=LOCMEM_TEMPLATES):
+            index = TemplateIndex()
+            self.assertTrue(index.exists("restclients/extra_info.html"))
+
+            with mock.patch("rc_django.template_index.loader.get_template",
+                            side_effect=UnlistedLoader(None).get_template
+                            ) as get:
+                self.assertFalse(index.exists("proxy/fake.html"))
+                self.assertFalse(index.exists("proxy/fake.html"))
+                self.assertEqual(get.call_count, 1)
+
+                index.reload()
+                self.assertFalse(index.exists("proxy/fake.html"))
+                self.assertEqual(get.call_count, 2)
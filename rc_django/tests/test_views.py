@@ -11,6 +11,16 @@ from django.urls import reverse
 from restclients_core.dao import DAO, MockDAO
 from restclients_core.models import MockHTTP
 from rc_django.views.rest_proxy import RestSearchView, RestProxyView
+from rc_django.models import RestProxy, DegradePerformance
+from rc_django.formatters import JSONFormatter
+from restclients_core.util.performance import PerformanceDegradation
+from asgiref.sync import async_to_sync, sync_to_async
+import asyncio
+import json
+import re
+import mock
+import threading
+import time
 
 
 class TEST_DAO(DAO):
@@ -33,6 +43,24 @@ class SUB_DAO(TEST_DAO):
         return "test_sub"
 
 
+class JSON_DAO(TEST_DAO):
+    def service_name(self):
+        return "test_json"
+
+    def get_default_service_setting(self, key):
+        if "DAO_CLASS" == key:
+            return "rc_django.tests.test_views.JSONBackend"
+
+
+class IMAGE_DAO(TEST_DAO):
+    def service_name(self):
+        return "test_image"
+
+    def get_default_service_setting(self, key):
+        if "DAO_CLASS" == key:
+            return "rc_django.tests.test_views.ImageBackend"
+
+
 class Backend(MockDAO):
     def load(self, method, url, headers, body):
         response = MockHTTP()
@@ -41,6 +69,26 @@ class Backend(MockDAO):
         return response
 
 
+class JSONBackend(MockDAO):
+    def load(self, method, url, headers, body):
+        response = MockHTTP()
+        response.status = 200
+        response.data = json.dumps({
+            "Href": url, "Items": [{"Name": "<b>{}</b>".format(i)}
+                                   for i in range(100)]})
+        return response
+
+
+class ImageBackend(MockDAO):
+    def load(self, method, url, headers, body):
+        response = MockHTTP()
+        response.status = 200
+        response.data = b"\x89PNG\r\n\x1a\n" + b"\x00" * 100000
+        if url.startswith("/typed"):
+            response.headers = {"content-type": "image/gif", "ETag": "abc"}
+        return response
+
+
 def missing_url(name, *args, **kwargs):
     try:
         url = reverse(name, *args, **kwargs)
@@ -117,6 +165,224 @@ class RestProxyViewTest(TestCase):
         response = self.client.get(url)
         self.assertEqual(response.status_code, 200)
 
+    def test_streaming(self):
+        get_user('test_view')
+        self.client.login(username='test_view',
+                          password=get_user_pass('test_view'))
+        url = reverse("restclients_proxy", args=["test_json", "test/v1"])
+
+        response = self.client.get(url)
+        self.assertFalse(response.streaming)
+        proxy = RestProxy("test_json")
+        proxy.get_api_response("/test/v1")
+        formatted = proxy.format_json().encode("utf-8")
+        self.assertIn(formatted, response.content)
+
+        with self.settings(RESTCLIENTS_PROXY_STREAM_THRESHOLD=1024):
+            response = self.client.get(url)
+            self.assertTrue(response.streaming)
+            content = b"".join(response.streaming_content)
+            self.assertIn(formatted, content)
+            self.assertTrue(content.rstrip().endswith(b"</html>"))
+
+            # Small and non-JSON responses are rendered as usual
+            response = self.client.get(reverse(
+                "restclients_proxy", args=["test", "test/v1"]))
+            self.assertFalse(response.streaming)
+
+        with self.settings(RESTCLIENTS_PROXY_STREAM_THRESHOLD=10 ** 6):
+            response = self.client.get(url)
+            self.assertFalse(response.streaming)
+
+    def test_raw(self):
+        get_user('test_view')
+        self.client.login(username='test_view',
+                          password=get_user_pass('test_view'))
+
+        url = reverse("restclients_proxy", args=["test", "test/v1"])
+        response = self.client.get(url, {"_raw": 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b"ok")
+        self.assertEqual(response["Content-Type"], "text/plain; charset=utf-8")
+        self.assertIn('fetch;desc="Upstream fetch";dur=',
+                      response["Server-Timing"])
+
+        # The raw flag isn't passed upstream
+        url = reverse("restclients_proxy", args=["test_json", "test/v1"])
+        response = self.client.get(url, {"a": "b", "_raw": ""})
+        self.assertEqual(json.loads(response.content)["Href"],
+                         "/test/v1?a=b")
+
+        response = self.client.get(url, HTTP_ACCEPT="application/json")
+        self.assertEqual(json.loads(response.content)["Href"], "/test/v1")
+
+        response = self.client.get(url, HTTP_ACCEPT="text/html,*/*")
+        self.assertIn(b"<html", response.content)
+
+        # Authorization still applies
+        url = reverse("restclients_proxy", args=["secret", "test/v1"])
+        response = self.client.get(url, {"_raw": 1})
+        self.assertEqual(response.status_code, 401)
+
+        url = reverse("restclients_proxy", args=["fake", "test/v1"])
+        response = self.client.get(url, {"_raw": 1})
+        self.assertEqual(response.status_code, 404)
+
+    def test_server_timing(self):
+        get_user('test_view')
+        self.client.login(username='test_view',
+                          password=get_user_pass('test_view'))
+
+        url = reverse("restclients_proxy", args=["test_json", "test/v1"])
+        response = self.client.get(url)
+        phases = [timing.split(";")[0] for timing in
+                  response["Server-Timing"].split(", ")]
+        self.assertEqual(phases, [
+            "dao", "fetch", "parse", "format", "template", "render"])
+        for timing in response["Server-Timing"].split(", "):
+            self.assertRegex(timing, r'^\w+;desc="[\w ]+";dur=\d+\.\d{3}$')
+
+        # The page shows the phases before rendering
+        self.assertIn(b"restclients-timings", response.content)
+        self.assertIn(b"UPSTREAM FETCH", response.content)
+        self.assertIn(b"TEMPLATE RESOLUTION", response.content)
+
+    def test_tree(self):
+        get_user('test_view')
+        self.client.login(username='test_view',
+                          password=get_user_pass('test_view'))
+        url = reverse("restclients_proxy", args=["test_json", "tree/v1"])
+
+        response = self.client.get(url, {"a": "b"})
+        self.assertIn(b"/tree/v1?a=b&amp;_tree=1", response.content)
+        self.assertNotIn(b"restclients-tree", response.content)
+
+        with self.settings(RESTCLIENTS_PROXY_TREE_DEPTH=2,
+                           RESTCLIENTS_PROXY_TREE_CHILDREN=40):
+            response = self.client.get(url, {"a": "b", "_tree": 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'<ul class="restclients-tree">', response.content)
+        self.assertIn(b'data-pointer="/Items/39"', response.content)
+        self.assertNotIn(b'data-pointer="/Items/40"', response.content)
+        self.assertIn(b'data-start="40">60 more', response.content)
+        self.assertNotIn(b"restclients_json_data", response.content)
+
+        # Subtrees come from the cached document
+        with mock.patch.object(JSONBackend, "load") as load:
+            response = self.client.get(
+                url, {"a": "b", "_pointer": "/Items/2"})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.content,
+                             b'<li>"Name":&nbsp;"&lt;b&gt;2&lt;/b&gt;"</li>')
+            response = self.client.get(
+                url, {"a": "b", "_pointer": "/Items", "_start": 98})
+            self.assertEqual(response.content.count(b"<details open>"), 2)
+            self.assertIn(b"99", response.content)
+            load.assert_not_called()
+
+        # Or from the upstream response, when it isn't cached
+        response = self.client.get(url, {"c": "d", "_pointer": ""})
+        self.assertIn(b'>/tree/v1?c=d</a>', response.content)
+        self.assertIn(b'data-pointer="/Items/0"', response.content)
+
+        for params, status in (({"_pointer": "/Nothing"}, 404),
+                               ({"_pointer": "/Href"}, 404),
+                               ({"_pointer": "/Items", "_start": "x"}, 400),
+                               ({"_pointer": "/Items", "_start": -1}, 400)):
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, status)
+
+        # Pointers are escaped in errors
+        for pointer in ("/<script>alert(1)</script>", "/Href/<b>"):
+            response = self.client.get(url, {"_pointer": pointer})
+            self.assertEqual(response.status_code, 404)
+            self.assertNotIn(b"<script>", response.content)
+            self.assertNotIn(b"<b>", response.content)
+            self.assertIn(b"&lt;", response.content)
+
+        # Non-JSON responses aren't trees
+        url = reverse("restclients_proxy", args=["test", "tree/v1"])
+        response = self.client.get(url, {"_tree": 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(b"restclients-tree", response.content)
+        self.assertNotIn(b"_tree=1", response.content)
+        response = self.client.get(url, {"_pointer": ""})
+        self.assertEqual(response.status_code, 404)
+
+        url = reverse("restclients_proxy", args=["secret", "tree/v1"])
+        response = self.client.get(url, {"_pointer": ""})
+        self.assertEqual(response.status_code, 401)
+
+    def test_tree_threshold(self):
+        get_user('test_view')
+        self.client.login(username='test_view',
+                          password=get_user_pass('test_view'))
+        url = reverse("restclients_proxy", args=["test_json", "tree/v1"])
+
+        with self.settings(RESTCLIENTS_PROXY_TREE_THRESHOLD=1024):
+            response = self.client.get(url)
+            self.assertIn(b"restclients-tree", response.content)
+            response = self.client.get(reverse(
+                "restclients_proxy", args=["test", "tree/v1"]))
+            self.assertNotIn(b"restclients-tree", response.content)
+
+        with self.settings(RESTCLIENTS_PROXY_TREE_THRESHOLD=10 ** 6):
+            response = self.client.get(url)
+            self.assertNotIn(b"restclients-tree", response.content)
+
+    @override_settings(RESTCLIENTS_PROXY_CACHE_TTL=60)
+    def test_response_cache(self):
+        get_user('test_view')
+        self.client.login(username='test_view',
+                          password=get_user_pass('test_view'))
+        url = reverse("restclients_proxy", args=["test_json", "cached/v1"])
+
+        response = self.client.get(url)
+        self.assertIn(b">MISS<", response.content)
+        self.assertIn(b"cached/v1?_nocache=1", response.content)
+
+        response = self.client.get(url)
+        self.assertIn(b">HIT<", response.content)
+
+        response = self.client.get(url, {"_nocache": 1})
+        self.assertIn(b">BYPASS<", response.content)
+        self.assertIn(b'value="/cached/v1"', response.content)
+
+        response = self.client.get(url, {"_raw": 1})
+        self.assertEqual(response["X-Restclients-Cache"], "hit")
+
+    def test_binary(self):
+        get_user('test_view')
+        self.client.login(username='test_view',
+                          password=get_user_pass('test_view'))
+
+        url = reverse("restclients_proxy", args=["test_image", "photo.png"])
+        response = self.client.get(url, {"size": "large"})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'<img src="/binary/test_image/photo.png?size=large"/>',
+                      response.content)
+        self.assertLess(len(response.content), 10000)
+
+        response = self.client.get("/binary/test_image/photo.png")
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "image/png")
+        self.assertEqual(response["Content-Length"], "100008")
+        self.assertIn("max-age=", response["Cache-Control"])
+        self.assertEqual(len(b"".join(response.streaming_content)), 100008)
+
+        response = self.client.get("/binary/test_image/typed")
+        self.assertEqual(response["Content-Type"], "image/gif")
+        self.assertEqual(response["ETag"], "abc")
+
+        response = self.client.get("/binary/test/v1")
+        self.assertEqual(response.status_code, 404)
+
+        response = self.client.get("/binary/fake/v1")
+        self.assertEqual(response.status_code, 404)
+
+        response = self.client.get("/binary/secret/v1")
+        self.assertEqual(response.status_code, 401)
+
     def test_service_errors(self):
         get_user('test_view')
         self.client.login(
@@ -134,6 +400,197 @@ class RestProxyViewTest(TestCase):
         self.assertIn(b"Missing service: fake", response.content)
 
 
+@override_settings(
+    RESTCLIENTS_ADMIN_AUTH_MODULE='rc_django.tests.can_proxy_restclient')
+class RestBatchViewTest(TestCase):
+    def setUp(self):
+        get_user('test_view')
+        self.client.login(username='test_view',
+                          password=get_user_pass('test_view'))
+
+    def get_batch(self, *items, **params):
+        params["r"] = list(items)
+        params["_raw"] = 1
+        return self.client.get(reverse("restclients_batch"), params).json()
+
+    def test_batch(self):
+        data = self.get_batch("test_json/a/v1?x=1", "secret/v1\nfake/v1",
+                              "test/b")
+        items = data["items"]
+        self.assertEqual([i["service"] for i in items],
+                         ["test_json", "secret", "fake", "test"])
+        self.assertEqual([i["status"] for i in items], [200, 401, 404, 200])
+        self.assertEqual(json.loads(items[0]["body"])["Href"], "/a/v1?x=1")
+        self.assertEqual(items[3]["body"], "ok")
+        self.assertEqual(items[1]["error"], "Unauthorized")
+        self.assertIsNone(items[1]["body"])
+        self.assertGreaterEqual(items[0]["duration"], 0)
+
+        response = self.client.get(reverse("restclients_batch"), {
+            "r": "test_json/a/v1?x=1&y=2\ntest/b"})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'href="{}?x=1&amp;y=2"'.format(
+            reverse("restclients_proxy", args=["test_json", "a/v1"])))
+        self.assertIn(b"ok", response.content)
+
+        response = self.client.get(reverse("restclients_batch"), {
+            "r": "<script>alert(1)</script>"})
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+
+        response = self.client.get(reverse("restclients_batch"), {
+            "r": "test/a", "timeout": "<b>1</b>"})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.content, b"Invalid timeout")
+
+        with override_settings(RESTCLIENTS_BATCH_MAX_ITEMS=1):
+            response = self.client.get(reverse("restclients_batch"), {
+                "r": ["test/a", "test/b"]})
+            self.assertEqual(response.status_code, 400)
+
+    def test_timeouts(self):
+        def slow_load(dao, method, url, headers, body):
+            time.sleep(float(url.split("/")[1]))
+            response = MockHTTP()
+            response.status = 200
+            response.data = url
+            return response
+
+        with mock.patch.object(Backend, "load", slow_load):
+            # Items are fetched in parallel
+            start = time.time()
+            data = self.get_batch("test/0.2", "test/0.2", "test/0.2")
+            self.assertLess(time.time() - start, 0.5)
+            self.assertEqual([i["status"] for i in data["items"]],
+                             [200, 200, 200])
+
+            data = self.get_batch("test/0.01", "test/1", item_timeout=0.1)
+            self.assertEqual([i["status"] for i in data["items"]], [200, 0])
+            self.assertEqual(data["items"][1]["error"], "Timed out")
+            self.assertLess(data["duration"], 0.5)
+
+            data = self.get_batch("test/1", "test/1", timeout=0.1)
+            self.assertEqual([i["error"] for i in data["items"]],
+                             ["Timed out", "Timed out"])
+
+    def test_degradation(self):
+        # Items see the request's degradations
+        problems = DegradePerformance()
+        problems.set_status("test", "503")
+        PerformanceDegradation.set_problems(problems)
+        try:
+            data = self.get_batch("test/a", "test_json/b")
+        finally:
+            PerformanceDegradation.clear_problems()
+        self.assertEqual([i["status"] for i in data["items"]], [503, 200])
+
+
+@override_settings(
+    RESTCLIENTS_ADMIN_AUTH_MODULE='rc_django.tests.can_proxy_restclient',
+    ROOT_URLCONF='rc_django.tests.async_urls')
+class AsyncRestProxyViewTest(TestCase):
+    def setUp(self):
+        self.user = get_user('test_view')
+
+    async def test_auth(self):
+        url = reverse("restclients_proxy", args=["test", "v1"])
+        response = await self.async_client.get(url)
+        self.assertEqual(response.status_code, 302)
+
+        await sync_to_async(self.async_client.force_login)(self.user)
+        url = reverse("restclients_proxy", args=["secret", "v1"])
+        response = await self.async_client.get(url)
+        self.assertEqual(response.status_code, 401)
+
+        url = reverse("restclients_proxy", args=["fake", "v1"])
+        response = await self.async_client.get(url)
+        self.assertEqual(response.status_code, 404)
+
+    def test_parity(self):
+        self.client.force_login(self.user)
+        self.async_client.force_login(self.user)
+        url = reverse("restclients_proxy", args=["test_json", "a/v1"])
+
+        sync_response = self.client.get(url)
+        async_response = async_to_sync(self.async_client.get)(url)
+        self.assertEqual(async_response.status_code, 200)
+        self.assertEqual(
+            re.sub(rb"[\d.]+ (seconds|ms)", b"", async_response.content),
+            re.sub(rb"[\d.]+ (seconds|ms)", b"", sync_response.content))
+
+        raw = async_to_sync(self.async_client.get)(url, {"_raw": 1})
+        self.assertEqual(json.loads(raw.content)["Href"], "/a/v1")
+
+        for params in ({"_tree": 1}, {"_pointer": "/Items/1"}):
+            sync_response = self.client.get(url, params)
+            async_response = async_to_sync(self.async_client.get)(url, params)
+            self.assertEqual(async_response.status_code, 200)
+            self.assertEqual(
+                re.sub(rb"[\d.]+ (seconds|ms)", b"", async_response.content),
+                re.sub(rb"[\d.]+ (seconds|ms)", b"", sync_response.content))
+
+    @override_settings(RESTCLIENTS_PROXY_STREAM_THRESHOLD=1024)
+    async def test_streaming(self):
+        await sync_to_async(self.async_client.force_login)(self.user)
+        url = reverse("restclients_proxy", args=["test_json", "a/v1"])
+        iter_formatted_json = RestProxy.iter_formatted_json
+        threads = []
+
+        def formatted_chunks(proxy):
+            for chunk in iter_formatted_json(proxy):
+                threads.append(threading.current_thread())
+                yield chunk
+
+        # Chunks are formatted on the thread pool as they're sent
+        with mock.patch.object(RestProxy, "iter_formatted_json",
+                               formatted_chunks), \
+                mock.patch.object(JSONFormatter.iterrender, "__defaults__",
+                                  (64,)):
+            response = await self.async_client.get(url)
+            self.assertTrue(response.streaming)
+            self.assertTrue(response.is_async)
+            chunks = [chunk async for chunk in response.streaming_content]
+
+        self.assertGreater(len(threads), 2)
+        self.assertNotIn(threading.current_thread(), threads)
+        content = b"".join(chunks)
+        proxy = RestProxy("test_json")
+        proxy.get_api_response("/a/v1")
+        self.assertIn(proxy.format_json().encode("utf-8"), content)
+        self.assertTrue(content.rstrip().endswith(b"</html>"))
+
+        # Binary responses stream without collecting their chunks
+        response = await self.async_client.get("/binary/test_image/photo.png")
+        self.assertTrue(response.is_async)
+        self.assertEqual(len(b"".join(
+            [chunk async for chunk in response.streaming_content])), 100008)
+
+    # Sync-only middleware, such as UserServiceMiddleware, would run each
+    # request's view on Django's single sync thread
+    @override_settings(MIDDLEWARE=[
+        "django.contrib.sessions.middleware.SessionMiddleware",
+        "django.contrib.auth.middleware.AuthenticationMiddleware"])
+    async def test_concurrency(self):
+        await sync_to_async(self.async_client.force_login)(self.user)
+
+        def slow_load(dao, method, url, headers, body):
+            time.sleep(0.2)
+            response = MockHTTP()
+            response.status = 200
+            response.data = url
+            return response
+
+        with mock.patch.object(Backend, "load", slow_load):
+            start = time.time()
+            responses = await asyncio.gather(*[
+                self.async_client.get(reverse(
+                    "restclients_proxy", args=["test", "slow/{}".format(i)]))
+                for i in range(5)])
+            self.assertLess(time.time() - start, 0.8)
+        for i, response in enumerate(responses):
+            self.assertIn("/slow/{}".format(i).encode(), response.content)
+
+
 @override_settings(
     RESTCLIENTS_ADMIN_AUTH_MODULE='rc_django.tests.can_proxy_restclient')
 class RestSearchViewTest(TestCase):
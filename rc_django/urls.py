@@ -1,15 +1,30 @@
 # Copyright 2025 UW-IT, University of Washington
 # SPDX-License-Identifier: Apache-2.0
 
+from django.conf import settings
 from django.urls import re_path
 from rc_django.views.errors import DegradePerformanceView
-from rc_django.views.rest_proxy import RestSearchView, RestProxyView
+from rc_django.views.batch import RestBatchView
+from rc_django.views.metrics import ProxyMetricsView, PrometheusMetricsView
+from rc_django.views.rest_proxy import (
+    RestSearchView, RestProxyView, AsyncRestProxyView, RestBinaryView)
+
+# ASGI deployments can serve the proxy view asynchronously
+proxy_view = (AsyncRestProxyView if getattr(
+    settings, "RESTCLIENTS_PROXY_ASYNC", False) else RestProxyView)
 
 urlpatterns = [
     re_path(r'^errors',
             DegradePerformanceView.as_view(), name="restclients_errors"),
+    re_path(r'^metrics$',
+            ProxyMetricsView.as_view(), name="restclients_metrics"),
+    re_path(r'^metrics/prometheus$', PrometheusMetricsView.as_view(),
+            name="restclients_metrics_prometheus"),
     re_path(r'^search/(\w+)/(.*)$',
             RestSearchView.as_view(), name="restclients_customform"),
     re_path(r'^view/(\w+)/(.*)$',
-            RestProxyView.as_view(), name="restclients_proxy"),
+            proxy_view.as_view(), name="restclients_proxy"),
+    re_path(r'^binary/(\w+)/(.*)$',
+            RestBinaryView.as_view(), name="restclients_binary"),
+    re_path(r'^batch$', RestBatchView.as_view(), name="restclients_batch"),
 ]
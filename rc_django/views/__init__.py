@@ -5,8 +5,8 @@
 from django.views.generic.base import TemplateView
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_protect
-from django.template import loader, TemplateDoesNotExist
 from rc_django.decorators import restclient_admin_required
+from rc_django.template_index import template_index
 
 
 @method_decorator(csrf_protect, name='dispatch')
@@ -14,9 +14,8 @@ from rc_django.decorators import restclient_admin_required
 class RestView(TemplateView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        try:
-            loader.get_template("restclients/proxy_wrapper.html")
+        if template_index.exists("restclients/proxy_wrapper.html"):
             context["wrapper_template"] = "restclients/proxy_wrapper.html"
-        except TemplateDoesNotExist:
+        else:
             context["wrapper_template"] = "proxy_wrapper.html"
         return context
@@ -0,0 +1,220 @@
+# Copyright 2025 UW-IT, University of Washington
+# SPDX-License-Identifier: Apache-2.0
+
+
+from rc_django.views import RestView
+from rc_django.views.rest_proxy import RestProxyView
+from rc_django.models import RestProxy
+from rc_django.decorators import is_authorized
+from rc_django.executors import get_executor
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
+from concurrent.futures import wait, FIRST_COMPLETED
+from contextvars import copy_context
+from time import monotonic
+from urllib.parse import unquote
+import re
+
+# A batch item is a service name and a URL on it, e.g. sws/student/v5/term
+BATCH_ITEM_RE = re.compile(r"^/?(\w+)(/.*)$")
+
+
+def get_batch_executor():
+    """
+    Returns the thread pool shared by all batches, sized by
+    RESTCLIENTS_BATCH_WORKERS.
+    """
+    return get_executor(
+        "batch", getattr(settings, "RESTCLIENTS_BATCH_WORKERS", 8))
+
+
+class BatchItem(object):
+    def __init__(self, service, url):
+        self.service = service
+        self.url = url
+        self.service_name = service
+        self.use_pre = False
+        self.proxy = None
+        self.status = None
+        self.error = None
+        self.started = None
+        self.duration = None
+
+    def fetch(self, headers):
+        self.started = monotonic()
+        self.proxy = RestProxy(self.service_name)
+        self.proxy.get_api_response(self.url, headers)
+        self.duration = self.proxy.duration
+
+    def fail(self, status, error):
+        self.status = status
+        self.error = error
+
+    @property
+    def response(self):
+        return self.proxy.response if self.proxy else None
+
+    def as_dict(self):
+        data = {"service": self.service, "url": self.url,
+                "status": self.status, "duration": self.duration,
+                "error": self.error, "body": None}
+        if self.error is None and self.proxy is not None:
+            binary_type = self.proxy.binary_content_type
+            if binary_type:
+                data["content_type"] = binary_type
+            else:
+                body = self.response.data
+                data["body"] = body.decode("utf-8", "replace") if isinstance(
+                    body, bytes) else body
+        return data
+
+
+class RestBatchView(RestView):
+    """
+    Fetches several resources in parallel, on a bounded thread pool.
+    Items are given as "service/url" values of the r parameter (or as
+    lines of one), and are returned as JSON for raw requests, or rendered
+    together on one page.
+    """
+    template_name = "batch.html"
+    poll_interval = 0.05
+
+    def get_items(self, request):
+        items = []
+        for value in request.GET.getlist("r"):
+            for line in value.splitlines():
+                line = line.strip()
+                if not line:
+                    continue
+                match = BATCH_ITEM_RE.match(line)
+                if match is None:
+                    raise ValueError("Not a service/url: {}".format(line))
+                items.append(BatchItem(*match.groups()))
+
+        max_items = getattr(settings, "RESTCLIENTS_BATCH_MAX_ITEMS", 20)
+        if len(items) > max_items:
+            raise ValueError("Batches are limited to {} items".format(
+                max_items))
+        return items
+
+    def get_timeouts(self, request):
+        """
+        Returns the batch and item timeouts, in seconds.  Requests can
+        lower the configured values with the timeout and item_timeout
+        parameters.
+        """
+        timeouts = []
+        for param, name, default in (
+                ("timeout", "RESTCLIENTS_BATCH_TIMEOUT", 30),
+                ("item_timeout", "RESTCLIENTS_BATCH_ITEM_TIMEOUT", 10)):
+            timeout = float(getattr(settings, name, default))
+            if param in request.GET:
+                try:
+                    timeout = min(timeout, float(request.GET[param]))
+                except ValueError:
+                    raise ValueError("Invalid {}".format(param))
+            timeouts.append(timeout)
+        return timeouts
+
+    def fetch_items(self, items, batch_timeout, item_timeout):
+        """
+        Fetches the items in parallel.  Items still running after
+        item_timeout seconds, or when the batch times out, are reported as
+        timed out; their threads finish in the background.
+        """
+        deadline = monotonic() + batch_timeout
+        executor = get_batch_executor()
+        futures = {}
+        for item in items:
+            if not is_authorized(self.request, item.service, item.url):
+                item.fail(401, "Unauthorized")
+                continue
+            headers = {}
+            item.service_name, item.use_pre = (
+                RestProxyView.get_proxy_options(item.service, headers))
+            # Each item sees the request's degradations
+            futures[executor.submit(
+                copy_context().run, item.fetch, headers)] = item
+
+        pending = set(futures)
+        while pending:
+            now = monotonic()
+            timeout = deadline - now
+            for future in pending:
+                started = futures[future].started
+                if started is None:
+                    # Queued items start when a worker is free
+                    timeout = min(timeout, self.poll_interval)
+                else:
+                    timeout = min(timeout, started + item_timeout - now)
+            if timeout > 0:
+                done, pending = wait(
+                    pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    self._complete(futures[future], future)
+
+            now = monotonic()
+            expired = {future for future in pending if now >= deadline or (
+                futures[future].started is not None and
+                now - futures[future].started >= item_timeout)}
+            for future in expired:
+                future.cancel()
+                futures[future].fail(0, "Timed out")
+            pending -= expired
+
+    @staticmethod
+    def _complete(item, future):
+        try:
+            future.result()
+        except (AttributeError, ImportError):
+            item.fail(404, "Missing service: {}".format(item.service))
+            return
+        item.status = item.response.status
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        items = kwargs["items"]
+        for item in items:
+            item.url_display = unquote(item.url)
+            item.proxy_url = RestProxyView.get_proxy_url(
+                item.service, item.url)
+            if item.error is None and item.proxy is not None:
+                if item.proxy.binary_content_type:
+                    item.content = ""
+                    item.binary_url = RestProxyView.get_binary_url(
+                        item.service, item.url)
+                elif item.use_pre:
+                    item.content = item.response.data
+                else:
+                    item.content = item.proxy.formatted
+        context.update({
+            "items": items,
+            "batch": "\n".join("{}{}".format(i.service, i.url)
+                               for i in items),
+            "time_taken": "{:f} seconds".format(kwargs["duration"]),
+        })
+        return context
+
+    def get(self, request, *args, **kwargs):
+        """
+        Fetch the requested resources, and render them together.
+        """
+        try:
+            items = self.get_items(request)
+            batch_timeout, item_timeout = self.get_timeouts(request)
+        except ValueError as ex:
+            # Messages can quote the request, so they aren't sent as HTML
+            return HttpResponse(str(ex), status=400,
+                                content_type="text/plain; charset=utf-8")
+
+        start = monotonic()
+        self.fetch_items(items, batch_timeout, item_timeout)
+        duration = monotonic() - start
+
+        if RestProxyView.is_raw_request(request):
+            return JsonResponse({
+                "duration": duration,
+                "items": [item.as_dict() for item in items]})
+
+        context = self.get_context_data(items=items, duration=duration)
+        return self.render_to_response(context)
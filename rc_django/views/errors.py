@@ -4,6 +4,8 @@
 
 from rc_django.views import RestView
 from rc_django.models import DegradePerformance
+from rc_django.profiles import get_profiles
+from rc_django.middleware import DEGRADATION_COOKIE, set_marker_cookie
 
 
 class DegradePerformanceView(RestView):
@@ -22,7 +24,24 @@ class DegradePerformanceView(RestView):
                 "status": problems.get_status(service),
                 "content": problems.get_content(service),
                 "load_time": problems.get_load_time(service),
+                "error_rate": problems.get_error_rate(service),
+                "seed": problems.get_seed(service),
+                "throughput": problems.get_throughput(service),
+                "truncate": problems.get_truncate(service),
+                "timeout": problems.get_timeout(service),
+                "pool_size": problems.get_pool_size(service),
+                "rules": problems.get_rules(service),
             })
+
+        profiles = get_profiles()
+        context["profiles"] = None
+        if profiles is not None:
+            context["profiles"] = [{
+                "name": name,
+                "active": profile["active"],
+                "services": sorted(DegradePerformance(
+                    profile["problems"]).services()),
+            } for name, profile in sorted(profiles.get_profiles().items())]
         return context
 
     def get(self, request, *args, **kwargs):
@@ -34,30 +53,104 @@ class DegradePerformanceView(RestView):
         problem_str = request.session.get("RESTCLIENTS_ERRORS")
         problems = DegradePerformance(serialized=problem_str)
 
-        for key in problems.services():
+        form_errors = []
+        for key in list(problems.services()):
             keepit = "keep_{}".format(key)
             if keepit not in request.POST:
                 problems.remove_service(key)
             else:
-                problems.set_status(
-                    key, request.POST.get("{}_status".format(key), None))
-                problems.set_content(
-                    key, request.POST.get("{}_content".format(key), None))
-                problems.set_load_time(
-                    key, request.POST.get("{}_load_time".format(key), None))
+                self.update_service(problems, key, "{}_".format(key),
+                                    request.POST, form_errors)
+
+                rules = problems.get_rules(key)
+                for index in reversed(range(len(rules))):
+                    if "keep_rule_{}_{}".format(
+                            key, index) not in request.POST:
+                        problems.remove_rule(key, index)
 
         new_service = request.POST.get("new_service_name", None)
         if new_service:
             key = request.POST["new_service_name"]
-            problems.set_status(
-                key, request.POST.get("new_service_status", None))
-            problems.set_content(
-                key, request.POST.get("new_service_content", None))
-            problems.set_load_time(
-                key, request.POST.get("new_service_load_time", None))
+            self.update_service(problems, key, "new_service_",
+                                request.POST, form_errors)
+
+        rule_service = request.POST.get("new_rule_service", None)
+        rule_pattern = request.POST.get("new_rule_pattern", None)
+        if rule_service and rule_pattern:
+            try:
+                problems.add_rule(
+                    rule_service, rule_pattern,
+                    match=request.POST.get("new_rule_match", "prefix"),
+                    **{key: request.POST.get("new_rule_" + key, None)
+                       for key in problems.rule_keys})
+            except ValueError as ex:
+                form_errors.append(str(ex))
+
+        if "update_profiles" in request.POST:
+            self.update_profiles(problems, request.POST, form_errors)
 
         request.session["RESTCLIENTS_ERRORS"] = problems.serialize()
         kwargs["problem"] = request.session["RESTCLIENTS_ERRORS"]
 
         context = self.get_context_data(**kwargs)
+        context["form_errors"] = form_errors
         return self.render_to_response(context)
+
+    @staticmethod
+    def update_service(problems, service, prefix, data, form_errors):
+        """
+        Sets a service's values from form fields named with prefix.
+        Invalid values are reported in form_errors, and left unchanged.
+        """
+        problems.set_status(service, data.get(prefix + "status", None))
+        problems.set_content(service, data.get(prefix + "content", None))
+        for name, setter in (("load_time", problems.set_load_time),
+                             ("error_rate", problems.set_error_rate),
+                             ("seed", problems.set_seed),
+                             ("throughput", problems.set_throughput),
+                             ("truncate", problems.set_truncate),
+                             ("timeout", problems.set_timeout),
+                             ("pool_size", problems.set_pool_size)):
+            try:
+                setter(service, data.get(prefix + name, None))
+            except ValueError as ex:
+                form_errors.append("{}: {}".format(service, ex))
+
+    @staticmethod
+    def update_profiles(problems, data, form_errors):
+        """
+        Activates, deactivates and deletes shared profiles, and saves the
+        submitted settings as a new profile if one is named.
+        """
+        profiles = get_profiles()
+        if profiles is None:
+            return
+
+        for name, profile in profiles.get_profiles().items():
+            if "keep_profile_{}".format(name) not in data:
+                profiles.delete(name)
+            elif "active_profile_{}".format(name) in data:
+                if not profile["active"]:
+                    profiles.activate(name)
+            elif profile["active"]:
+                profiles.deactivate(name)
+
+        name = data.get("new_profile_name", None)
+        if name:
+            try:
+                profiles.save(name, problems,
+                              active="new_profile_active" in data)
+            except ValueError as ex:
+                form_errors.append(str(ex))
+
+    def render_to_response(self, context, **response_kwargs):
+        """
+        Keeps the degradation marker cookie in step with the session, so
+        the middleware only loads sessions that may hold degradations.
+        """
+        response = super().render_to_response(context, **response_kwargs)
+        if context["errors"]:
+            set_marker_cookie(response, self.request.session)
+        elif DEGRADATION_COOKIE in self.request.COOKIES:
+            response.delete_cookie(DEGRADATION_COOKIE)
+        return response
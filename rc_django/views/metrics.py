@@ -0,0 +1,46 @@
+# Copyright 2025 UW-IT, University of Washington
+# SPDX-License-Identifier: Apache-2.0
+
+
+from rc_django.views import RestView
+from rc_django.metrics import get_metrics
+from django.http import HttpResponse, HttpResponseRedirect
+from django.urls import reverse
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class ProxyMetricsView(RestView):
+    """
+    Shows the latency percentiles, status counts and response sizes of
+    proxied requests, by service and endpoint.
+    """
+    template_name = "metrics.html"
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        metrics = get_metrics()
+        context["enabled"] = metrics is not None
+        context["services"] = metrics.get_stats() if metrics else []
+        return context
+
+    def post(self, request, *args, **kwargs):
+        """
+        Clears the collected metrics.
+        """
+        metrics = get_metrics()
+        if metrics is not None:
+            metrics.clear()
+        return HttpResponseRedirect(reverse("restclients_metrics"))
+
+
+class PrometheusMetricsView(RestView):
+    def get(self, request, *args, **kwargs):
+        """
+        Exports the metrics in the Prometheus text format.
+        """
+        metrics = get_metrics()
+        if metrics is None:
+            return HttpResponse("Metrics are disabled", status=404)
+        return HttpResponse(metrics.prometheus(),
+                            content_type=PROMETHEUS_CONTENT_TYPE)
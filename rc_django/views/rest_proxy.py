@@ -3,21 +3,84 @@
 
 
 from rc_django.views import RestView
-from rc_django.models import RestProxy
+from rc_django.models import RestProxy, get_header
+from rc_django.formatters import resolve_pointer
+from rc_django.response_cache import get_document_cache
+from rc_django.template_index import template_index
+from rc_django.decorators import restclient_admin_required
+from rc_django.executors import get_executor
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
 from django.template import loader, TemplateDoesNotExist
+from django.template.response import TemplateResponse
 from django.urls import reverse
-from django.http import HttpResponse, HttpResponseRedirect
-from userservice.user import UserService
+from django.utils.decorators import method_decorator
+from django.utils.html import escape
+from django.views.generic.base import View
+from asgiref.sync import sync_to_async
+from django.http import (
+    HttpResponse, HttpResponseRedirect, StreamingHttpResponse)
+from userservice.user import (
+    UserService, get_original_user, get_override_user)
 from urllib.parse import quote, unquote, urlencode, urlparse, parse_qs
-from base64 import b64encode
+from itertools import chain
+from contextvars import copy_context
+from functools import partial
+import asyncio
 from logging import getLogger
 import re
 
 logger = getLogger(__name__)
 
+# Placeholders for streamed sections of the rendered page
+STREAM_CONTENT = "<!-- restclients:stream-content -->"
+STREAM_JSON_DATA = "/* restclients:stream-json-data */"
+
+# Marks the end of a stream iterated on the thread pool
+STREAM_END = object()
+
+# Query parameter requesting the unformatted upstream response
+RAW_PARAM = "_raw"
+
+# Query parameter forcing a fresh fetch, skipping the response cache
+CACHE_BYPASS_PARAM = "_nocache"
+
+# Query parameters requesting a collapsible tree of a JSON response, and
+# a subtree of it, by JSON pointer, for expanding the tree
+TREE_PARAM = "_tree"
+POINTER_PARAM = "_pointer"
+START_PARAM = "_start"
+
+# Upstream headers copied to raw responses
+RAW_HEADERS = ("content-type", "cache-control", "etag", "expires",
+               "last-modified")
+
+
+class TimedTemplateResponse(TemplateResponse):
+    """
+    Adds the time taken to resolve and render its template to the proxy's
+    timings, and reports them all in a Server-Timing header.
+    """
+    proxy = None
+
+    @property
+    def rendered_content(self):
+        if self.proxy is None:
+            return super().rendered_content
+
+        with self.proxy.timing("template"):
+            template = self.resolve_template(self.template_name)
+        context = self.resolve_context(self.context_data)
+        with self.proxy.timing("render"):
+            content = template.render(context, self._request)
+        self["Server-Timing"] = self.proxy.server_timing()
+        return content
+
 
 class RestProxyView(RestView):
     template_name = "proxy.html"
+    response_class = TimedTemplateResponse
+    proxy = None
 
     @staticmethod
     def format_search_params(url):
@@ -32,89 +95,488 @@ class RestProxyView(RestView):
         service = kwargs.get("service")
         url = kwargs.get("url")
         headers = kwargs.get("headers", {})
-        service_name = service
-        use_pre = False
         is_image = False
-        user_service = UserService()
-
-        if service == "iasystem":
-            headers["Accept"] = "application/vnd.collection+json"
-            service_name = 'iasystem_uw'
-        elif service == "sws" or service == "gws":
-            headers["X-UW-Act-as"] = user_service.get_original_user()
-        elif service == "calendar":
-            use_pre = True
-
-        proxy = RestProxy(service_name)
-        response = proxy.get_api_response(url, headers)
-
-        if (response.status == 200 and
-                re.match(r"/idcard/v1/photo/[0-9A-F]{32}", url)):
-            # Handle known images
-            is_image = True
-            content = b64encode(response.data).decode("utf-8")
+        binary_url = None
+        service_name, use_pre, override_user = (
+            kwargs.get("proxy_options") or
+            self.get_user_options(service, headers))
+
+        proxy = self.proxy = RestProxy(service_name)
+        response = proxy.get_api_response(
+            url, headers, bypass_cache=kwargs.get("bypass_cache", False))
+        json_data = None
+        tree = False
+        binary_type = proxy.binary_content_type
+
+        if response.status == 200 and binary_type:
+            # The browser fetches binary content separately
+            is_image = binary_type.startswith("image/")
+            binary_url = self.get_binary_url(service, url)
+            content = ""
         elif use_pre:
             content = response.data
+        elif self.should_render_tree(proxy, kwargs.get("tree", False)):
+            # The browser loads deeper levels from the cached document,
+            # cached with the sorted keys of its paged objects
+            tree = True
+            sorted_keys = {}
+            cache = get_document_cache()
+            cache.set(cache.key(service_name, url, headers),
+                      (proxy.document, sorted_keys),
+                      cache.get_ttl(service_name))
+            with proxy.timing("format"):
+                content = proxy.format_tree(sorted_keys)
+        elif self.should_stream(proxy):
+            content = STREAM_CONTENT
+            json_data = STREAM_JSON_DATA
+            context["stream_proxy"] = proxy
         else:
             content = proxy.formatted
 
         context.update({
             "url": unquote(url),
             "content": content,
-            "json_data": proxy.json,
+            "json_data": None if binary_url or tree else (
+                json_data or proxy.json),
             "response_code": response.status,
             "time_taken": "{:f} seconds".format(proxy.duration),
             "headers": response.headers,
-            "override_user": user_service.get_override_user(),
+            "override_user": override_user,
             "use_pre": use_pre,
             "is_image": is_image,
+            "binary_url": binary_url,
+            "cache_status": proxy.cache_status,
+            "tree": tree,
         })
+        if proxy.cache_status is not None:
+            context["refresh_url"] = self.get_refresh_url(self.request)
+        if not (tree or use_pre or binary_url) and response.status == 200:
+            try:
+                proxy.document
+                context["tree_url"] = self.get_tree_url(self.request)
+            except ValueError:
+                pass
 
-        try:
-            loader.get_template("restclients/extra_info.html")
-            context["has_extra_template"] = True
-            context["extra_template"] = "restclients/extra_info.html"
-        except TemplateDoesNotExist:
-            pass
+        with proxy.timing("template"):
+            if template_index.exists("restclients/extra_info.html"):
+                context["has_extra_template"] = True
+                context["extra_template"] = "restclients/extra_info.html"
 
-        try:
             search_template_path = re.sub(r"[.?].*$", "", url)
             search_template = "proxy/{}{}.html".format(service,
                                                        search_template_path)
-            loader.get_template(search_template)
-            context["search_template"] = search_template
-            context["search"] = self.format_search_params(url)
-        except TemplateDoesNotExist:
-            context["search_template"] = None
-
+            if template_index.exists(search_template):
+                context["search_template"] = search_template
+                context["search"] = self.format_search_params(url)
+            else:
+                context["search_template"] = None
+
+        # Rendering is still to come, and is only in the Server-Timing header
+        context["timings"] = proxy.get_timings()
         return context
 
-    def get(self, request, *args, **kwargs):
+    @staticmethod
+    def get_binary_url(service, url):
+        path, _, query = url.partition("?")
+        binary_url = reverse("restclients_binary", args=[
+            service, unquote(path[1:])])
+        if query:
+            binary_url += "?" + query
+        return binary_url
+
+    @staticmethod
+    def get_proxy_url(service, url):
+        path, _, query = url.partition("?")
+        proxy_url = reverse("restclients_proxy", args=[
+            service, unquote(path[1:])])
+        if query:
+            proxy_url += "?" + query
+        return proxy_url
+
+    @staticmethod
+    def get_refresh_url(request):
+        params = request.GET.copy()
+        params[CACHE_BYPASS_PARAM] = "1"
+        return "{}?{}".format(request.path, params.urlencode())
+
+    @staticmethod
+    def get_tree_url(request):
+        params = request.GET.copy()
+        params[TREE_PARAM] = "1"
+        return "{}?{}".format(request.path, params.urlencode())
+
+    def get_user_options(self, service, headers):
         """
-        Fetch an API resource and render it, formatted for a browser.
+        Returns get_proxy_options() and the override user.
         """
-        # Using args for these URLs for backwards-compatibility
-        kwargs["service"] = args[0]
-        kwargs["url"] = "/" + (args[1] if len(args) > 1 else "")
+        service_name, use_pre = self.get_proxy_options(service, headers)
+        return service_name, use_pre, UserService().get_override_user()
+
+    @staticmethod
+    def get_proxy_options(service, headers, request=None):
+        """
+        Adds any service-specific request headers, and returns the DAO
+        service name and whether the response is preformatted text.  The
+        acting user is read from request if given, otherwise from the
+        UserService.
+        """
+        service_name = service
+        use_pre = False
+        if service == "iasystem":
+            headers["Accept"] = "application/vnd.collection+json"
+            service_name = 'iasystem_uw'
+        elif service == "sws" or service == "gws":
+            headers["X-UW-Act-as"] = (
+                get_original_user(request) if request is not None else
+                UserService().get_original_user())
+        elif service == "calendar":
+            use_pre = True
+        return service_name, use_pre
 
-        if request.GET:
-            kwargs["url"] += "?" + urlencode(request.GET)
+    @staticmethod
+    def is_raw_request(request):
+        """
+        Raw responses are requested with the _raw query parameter, or an
+        Accept header that excludes HTML.
+        """
+        return RAW_PARAM in request.GET or (
+            "HTTP_ACCEPT" in request.META and not request.accepts("text/html"))
+
+    def get_raw_response(self, **kwargs):
+        """
+        Returns the upstream status, body and selected headers, skipping
+        all formatting and page rendering.
+        """
+        headers = kwargs.get("headers", {})
+        if kwargs.get("proxy_options"):
+            service_name = kwargs["proxy_options"][0]
         else:
+            service_name, use_pre = self.get_proxy_options(
+                kwargs["service"], headers)
+
+        proxy = RestProxy(service_name)
+        response = proxy.get_api_response(
+            kwargs["url"], headers,
+            bypass_cache=kwargs.get("bypass_cache", False))
+
+        try:
+            status = int(response.status)
+        except (TypeError, ValueError):
+            status = 0
+        if not 100 <= status <= 599:
+            # Connection failures have no upstream status
+            status = 502
+
+        data = response.data
+        raw = HttpResponse(data, status=status, content_type=(
+            "text/plain; charset=utf-8" if isinstance(data, str) else
+            "application/octet-stream"))
+        for key, value in (response.headers or {}).items():
+            if key.lower() in RAW_HEADERS:
+                raw[key] = value
+        server_timing = proxy.server_timing()
+        if server_timing:
+            raw["Server-Timing"] = server_timing
+        if proxy.cache_status is not None:
+            raw["X-Restclients-Cache"] = proxy.cache_status
+        return raw
+
+    @staticmethod
+    def should_render_tree(proxy, requested):
+        """
+        JSON responses are shown as collapsible trees when requested with
+        the _tree parameter, or when larger than
+        RESTCLIENTS_PROXY_TREE_THRESHOLD (in bytes), if set.
+        """
+        threshold = getattr(
+            settings, "RESTCLIENTS_PROXY_TREE_THRESHOLD", None)
+        if not requested and (threshold is None or
+                              len(proxy.response.data or "") < threshold):
+            return False
+        try:
+            proxy.document
+            return True
+        except ValueError:
+            return False
+
+    def get_subtree_response(self, **kwargs):
+        """
+        Returns the tree items for the children of the container at a
+        JSON pointer in the response, from the start index.  The parsed
+        response, and the sorted keys of its paged objects, are reused from
+        the document cache while it's fresh.
+        """
+        headers = kwargs.get("headers", {})
+        if kwargs.get("proxy_options"):
+            service_name = kwargs["proxy_options"][0]
+        else:
+            service_name, use_pre = self.get_proxy_options(
+                kwargs["service"], headers)
+
+        proxy = RestProxy(service_name)
+        cache = get_document_cache()
+        key = cache.key(service_name, kwargs["url"], headers)
+        cached = cache.get(key)
+        if cached is not None and cached[1]:
+            document, sorted_keys = cached[0]
+        else:
+            proxy.get_api_response(kwargs["url"], headers)
             try:
-                path, qs = kwargs["url"].split("?")
-                kwargs["url"] = "?".join([quote(path), qs])
+                document = proxy.document
+            except ValueError:
+                return HttpResponse("Not a JSON response", status=404)
+            sorted_keys = {}
+            cache.set(key, (document, sorted_keys),
+                      cache.get_ttl(service_name))
+
+        try:
+            start = int(kwargs.get("start") or 0)
+            if start < 0:
+                raise ValueError()
+        except ValueError:
+            return HttpResponse("Invalid start", status=400)
+
+        pointer = kwargs["pointer"]
+        try:
+            value = resolve_pointer(document, pointer)
+        except KeyError:
+            return HttpResponse("No value at {}".format(escape(pointer)),
+                                status=404)
+        if not isinstance(value, (dict, list)):
+            return HttpResponse("Not a container: {}".format(
+                escape(pointer)), status=404)
+
+        return HttpResponse(proxy.tree_formatter(
+            sorted_keys).render_children(value, pointer, start))
+
+    @staticmethod
+    def should_stream(proxy):
+        """
+        Large JSON responses are streamed when
+        RESTCLIENTS_PROXY_STREAM_THRESHOLD (in bytes) is set.
+        """
+        threshold = getattr(
+            settings, "RESTCLIENTS_PROXY_STREAM_THRESHOLD", None)
+        if threshold is None or len(proxy.response.data or "") < threshold:
+            return False
+        try:
+            proxy.document
+            return True
+        except ValueError:
+            return False
+
+    def render_to_streaming_response(self, context):
+        """
+        Renders the page around placeholders, then streams the formatted
+        document in place of them, so the full formatted body is never
+        held in memory.
+        """
+        proxy = context["stream_proxy"]
+        with proxy.timing("render"):
+            page = loader.render_to_string(
+                self.get_template_names(), context, request=self.request)
+
+        head, tail = page.split(STREAM_CONTENT, 1)
+        sections = [[head], proxy.iter_formatted_json()]
+        if STREAM_JSON_DATA in tail:
+            middle, tail = tail.split(STREAM_JSON_DATA, 1)
+            sections.extend([[middle], proxy.iter_json()])
+        sections.append([tail])
+
+        response = StreamingHttpResponse(chain.from_iterable(sections))
+        # Formatting happens while streaming, after the headers are sent
+        response["Server-Timing"] = proxy.server_timing()
+        return response
+
+    def render_to_response(self, context, **response_kwargs):
+        response = super().render_to_response(context, **response_kwargs)
+        response.proxy = self.proxy
+        return response
+
+    @staticmethod
+    def get_upstream_url(request, *args):
+        """
+        Builds the upstream API URL from the proxy URL's path arguments and
+        query string.
+        """
+        url = "/" + (args[1] if len(args) > 1 else "")
+
+        params = request.GET.copy()
+        for param in (RAW_PARAM, CACHE_BYPASS_PARAM, TREE_PARAM,
+                      POINTER_PARAM, START_PARAM):
+            params.pop(param, None)
+        if params:
+            url += "?" + urlencode(params)
+        else:
+            try:
+                path, qs = url.split("?")
+                url = "?".join([quote(path), qs])
             except ValueError:
                 pass
+        return url
+
+    def get(self, request, *args, **kwargs):
+        """
+        Fetch an API resource and render it, formatted for a browser.
+        """
+        # Using args for these URLs for backwards-compatibility
+        kwargs["service"] = args[0]
+        kwargs["url"] = self.get_upstream_url(request, *args)
+        kwargs["bypass_cache"] = CACHE_BYPASS_PARAM in request.GET
+        kwargs["tree"] = TREE_PARAM in request.GET
 
         try:
+            if POINTER_PARAM in request.GET:
+                return self.get_subtree_response(
+                    pointer=request.GET[POINTER_PARAM],
+                    start=request.GET.get(START_PARAM), **kwargs)
+            if self.is_raw_request(request):
+                return self.get_raw_response(**kwargs)
             context = self.get_context_data(**kwargs)
         except (AttributeError, ImportError):
             return HttpResponse(
                 "Missing service: {}".format(kwargs["service"]), status=404)
 
+        if context.get("stream_proxy"):
+            return self.render_to_streaming_response(context)
         return self.render_to_response(context)
 
 
+@method_decorator(restclient_admin_required, name="dispatch")
+class AsyncRestProxyView(RestProxyView):
+    """
+    RestProxyView for ASGI deployments.  Fetching and formatting run on a
+    shared thread pool, sized by RESTCLIENTS_ASYNC_PROXY_WORKERS, so slow
+    or degraded upstreams don't hold a worker for each request.
+
+    Users are read from the request rather than the UserService, as the
+    thread pool doesn't share its per-thread data.
+    """
+    async def dispatch(self, request, *args, **kwargs):
+        # Skips RestView's decorators, which only handle sync views
+        return await View.dispatch(self, request, *args, **kwargs)
+
+    def get_user_options(self, service, headers):
+        service_name, use_pre = self.get_proxy_options(
+            service, headers, self.request)
+        return service_name, use_pre, get_override_user(self.request)
+
+    @staticmethod
+    def get_executor():
+        return get_executor("async-proxy", getattr(
+            settings, "RESTCLIENTS_ASYNC_PROXY_WORKERS", 32))
+
+    async def run_in_executor(self, func, *args, **kwargs):
+        """
+        Runs func on the proxy thread pool, in a copy of the request's
+        context, so it sees the request's degradations.
+        """
+        return await asyncio.get_running_loop().run_in_executor(
+            self.get_executor(), copy_context().run,
+            partial(func, *args, **kwargs))
+
+    def stream_in_executor(self, iterable):
+        """
+        Returns an async iterator over iterable, which produces each item
+        on the proxy thread pool, in a copy of the request's context.
+        Chunks are formatted as they're sent, rather than all at once by
+        Django's fallback for sync iterators.
+        """
+        context = copy_context()
+        executor = self.get_executor()
+
+        async def stream():
+            iterator = iter(iterable)
+            loop = asyncio.get_running_loop()
+            while True:
+                chunk = await loop.run_in_executor(
+                    executor, context.run, next, iterator, STREAM_END)
+                if chunk is STREAM_END:
+                    return
+                yield chunk
+        return stream()
+
+    async def get(self, request, *args, **kwargs):
+        """
+        Fetch an API resource and render it, formatted for a browser.
+        """
+        kwargs["service"] = args[0]
+        kwargs["url"] = self.get_upstream_url(request, *args)
+        kwargs["bypass_cache"] = CACHE_BYPASS_PARAM in request.GET
+        kwargs["tree"] = TREE_PARAM in request.GET
+        kwargs["headers"] = {}
+        kwargs["proxy_options"] = await sync_to_async(self.get_user_options)(
+            kwargs["service"], kwargs["headers"])
+
+        try:
+            if POINTER_PARAM in request.GET:
+                return await self.run_in_executor(
+                    self.get_subtree_response,
+                    pointer=request.GET[POINTER_PARAM],
+                    start=request.GET.get(START_PARAM), **kwargs)
+            if self.is_raw_request(request):
+                return await self.run_in_executor(
+                    self.get_raw_response, **kwargs)
+            context = await self.run_in_executor(
+                self.get_context_data, **kwargs)
+        except (AttributeError, ImportError):
+            return HttpResponse(
+                "Missing service: {}".format(kwargs["service"]), status=404)
+
+        if context.get("stream_proxy"):
+            response = await self.run_in_executor(
+                self.render_to_streaming_response, context)
+            response.streaming_content = self.stream_in_executor(
+                response.streaming_content)
+            return response
+        return self.render_to_response(context)
+
+
+class RestBinaryView(RestProxyView):
+    chunk_size = 64 * 1024
+
+    def get(self, request, *args, **kwargs):
+        """
+        Stream a binary API resource, such as an image, with its own
+        content type and cache headers.
+        """
+        headers = {}
+        service_name, use_pre = self.get_proxy_options(args[0], headers)
+        proxy = RestProxy(service_name)
+        try:
+            response = proxy.get_api_response(
+                self.get_upstream_url(request, *args), headers,
+                bypass_cache=CACHE_BYPASS_PARAM in request.GET)
+        except (AttributeError, ImportError):
+            return HttpResponse(
+                "Missing service: {}".format(args[0]), status=404)
+
+        content_type = proxy.binary_content_type
+        if response.status != 200 or content_type is None:
+            return HttpResponse("Not a binary resource", status=404)
+
+        data = response.data
+        chunks = (data[i:i + self.chunk_size]
+                  for i in range(0, len(data), self.chunk_size))
+        if isinstance(request, ASGIRequest):
+            # Django would otherwise collect sync iterators into a list
+            chunks = iterate_async(chunks)
+        binary = StreamingHttpResponse(chunks, content_type=content_type)
+        binary["Content-Length"] = len(data)
+        binary["Cache-Control"] = "private, max-age={}".format(getattr(
+            settings, "RESTCLIENTS_PROXY_BINARY_MAX_AGE", 300))
+        for header in ("ETag", "Last-Modified"):
+            value = get_header(response, header)
+            if value:
+                binary[header] = value
+        return binary
+
+
+async def iterate_async(iterable):
+    for item in iterable:
+        yield item
+
+
 class RestSearchView(RestView):
     template_name = "customform.html"
     form_action_url = "restclients_customform"
@@ -126,12 +588,12 @@ class RestSearchView(RestView):
         context = super().get_context_data(**kwargs)
 
         form_path = "customform/{}/{}".format(service, path)
-        try:
-            loader.get_template("restclients/{}".format(form_path))
+        if template_index.exists("restclients/{}".format(form_path)):
             context["form_template"] = "restclients/{}".format(form_path)
-        except TemplateDoesNotExist:
-            loader.get_template(form_path)
+        elif template_index.exists(form_path):
             context["form_template"] = form_path
+        else:
+            raise TemplateDoesNotExist(form_path)
 
         context["form_action"] = reverse(self.form_action_url, args=[
             service, path.replace(".html", "")])
@@ -23,7 +23,7 @@ setup(
     include_package_data=True,
     install_requires=[
         'django',
-        'uw-restclients-core',
+        'uw-restclients-core>=1.4.4,<1.5',
         'django-userservice',
     ],
     license='Apache License, Version 2.0',